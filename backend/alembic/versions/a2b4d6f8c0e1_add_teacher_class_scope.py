@@ -0,0 +1,46 @@
+"""add teacher_class_scope
+
+Revision ID: a2b4d6f8c0e1
+Revises: f1a3c5e7b9d2
+Create Date: 2026-10-19
+
+Materialized teacher visibility (see app.services.teacher_scope). Rows are
+built lazily on first access, so no data migration is needed.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2b4d6f8c0e1'
+down_revision: Union[str, Sequence[str], None] = 'f1a3c5e7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'teacher_class_scope',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('grade_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['grade_id'], ['grades.id']),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_teacher_class_scope_id', 'teacher_class_scope', ['id'], unique=False)
+    op.create_index('ix_teacher_class_scope_teacher_class', 'teacher_class_scope', ['teacher_id', 'class_id'], unique=False)
+    op.create_index('ix_teacher_class_scope_class_id', 'teacher_class_scope', ['class_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_teacher_class_scope_class_id', table_name='teacher_class_scope')
+    op.drop_index('ix_teacher_class_scope_teacher_class', table_name='teacher_class_scope')
+    op.drop_index('ix_teacher_class_scope_id', table_name='teacher_class_scope')
+    op.drop_table('teacher_class_scope')
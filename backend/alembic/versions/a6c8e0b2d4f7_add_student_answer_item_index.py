@@ -0,0 +1,32 @@
+"""add student_answers (question_id, selected_option_id, ...) covering index
+
+Revision ID: a6c8e0b2d4f7
+Revises: f3a5c7e9b1d4
+Create Date: 2026-10-19
+
+Lets item analysis read an assignment's answers grouped by question and
+option from the index alone instead of scanning student_answers.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c8e0b2d4f7'
+down_revision: Union[str, Sequence[str], None] = 'f3a5c7e9b1d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_student_answers_question_option', 'student_answers',
+        ['question_id', 'selected_option_id', 'submission_id', 'is_correct', 'points_awarded'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_student_answers_question_option', table_name='student_answers')
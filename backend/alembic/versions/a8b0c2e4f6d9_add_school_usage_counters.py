@@ -0,0 +1,40 @@
+"""add school usage counters
+
+Revision ID: a8b0c2e4f6d9
+Revises: f7a9b1d3e5c8
+Create Date: 2026-10-19
+
+Teacher, student and class counts on schools, checked against max_teachers,
+max_students and max_classes by app.services.school_quota. Backfilled here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8b0c2e4f6d9'
+down_revision: Union[str, Sequence[str], None] = 'f7a9b1d3e5c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('schools', sa.Column('teacher_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('schools', sa.Column('student_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('schools', sa.Column('class_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE schools SET "
+        "teacher_count = (SELECT COUNT(*) FROM users WHERE users.school_id = schools.id AND users.role = 'TEACHER'), "
+        "student_count = (SELECT COUNT(*) FROM students WHERE students.school_id = schools.id), "
+        "class_count = (SELECT COUNT(*) FROM classes WHERE classes.school_id = schools.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('schools', 'class_count')
+    op.drop_column('schools', 'student_count')
+    op.drop_column('schools', 'teacher_count')
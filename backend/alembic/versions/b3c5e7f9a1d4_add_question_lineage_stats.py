@@ -0,0 +1,43 @@
+"""add question_lineage_stats
+
+Revision ID: b3c5e7f9a1d4
+Revises: a2b4d6f8c0e1
+Create Date: 2026-10-19
+
+Running per-lineage answer statistics (see app.services.question_stats).
+Counts can be backfilled from student_answers with
+scripts/rebuild_question_stats.py (or POST /super-admin/stats/reconcile);
+answer times were never stored, so time statistics start empty.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c5e7f9a1d4'
+down_revision: Union[str, Sequence[str], None] = 'a2b4d6f8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'question_lineage_stats',
+        sa.Column('root_question_id', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('correct_count', sa.Integer(), nullable=False),
+        sa.Column('points_sum', sa.Float(), nullable=False),
+        sa.Column('time_count', sa.Integer(), nullable=False),
+        sa.Column('time_mean', sa.Float(), nullable=False),
+        sa.Column('time_m2', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['root_question_id'], ['questions.id']),
+        sa.PrimaryKeyConstraint('root_question_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('question_lineage_stats')
@@ -0,0 +1,31 @@
+"""add student listing indexes
+
+Revision ID: b9c1d3e5f7a0
+Revises: a8b0c2e4f6d9
+Create Date: 2026-10-19
+
+Keyset pagination of a school's students and name-prefix filtering
+(see app.services.student_directory).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c1d3e5f7a0'
+down_revision: Union[str, Sequence[str], None] = 'a8b0c2e4f6d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_students_school_id_id', 'students', ['school_id', 'id'], unique=False)
+    op.create_index('ix_students_school_name', 'students', ['school_id', 'name'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_students_school_name', table_name='students')
+    op.drop_index('ix_students_school_id_id', table_name='students')
@@ -0,0 +1,33 @@
+"""add name search indexes
+
+Revision ID: c0d2e4f6a8b1
+Revises: b9c1d3e5f7a0
+Create Date: 2026-10-19
+
+Case-insensitive name prefix ranges per school for the typeahead search
+(see app.services.name_search). The trigram indexes (FTS5 / pg_trgm) are
+created at startup by name_search.ensure_name_search_index.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0d2e4f6a8b1'
+down_revision: Union[str, Sequence[str], None] = 'b9c1d3e5f7a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_students_school_name_lower', 'students', ['school_id', sa.text('lower(name)')], unique=False)
+    op.create_index('ix_users_school_username_lower', 'users', ['school_id', sa.text('lower(username)')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_school_username_lower', table_name='users')
+    op.drop_index('ix_students_school_name_lower', table_name='students')
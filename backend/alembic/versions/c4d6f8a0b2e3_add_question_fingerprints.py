@@ -0,0 +1,62 @@
+"""add question fingerprints and LSH buckets
+
+Revision ID: c4d6f8a0b2e3
+Revises: b3c5e7f9a1d4
+Create Date: 2026-10-19
+
+MinHash near-duplicate index (see app.services.question_dedup). Existing
+banks are fingerprinted lazily per teacher, so no data migration is needed.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d6f8a0b2e3'
+down_revision: Union[str, Sequence[str], None] = 'b3c5e7f9a1d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'question_fingerprints',
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('subject_id', sa.Integer(), nullable=True),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('duplicate_of_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['subject_id'], ['subjects.id']),
+        sa.ForeignKeyConstraint(['duplicate_of_id'], ['questions.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('question_id'),
+    )
+    op.create_index('ix_question_fingerprints_teacher_id', 'question_fingerprints', ['teacher_id'], unique=False)
+    op.create_index('ix_question_fingerprints_duplicate_of_id', 'question_fingerprints', ['duplicate_of_id'], unique=False)
+    op.create_table(
+        'question_lsh_buckets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('band', sa.Integer(), nullable=False),
+        sa.Column('bucket_hash', sa.BigInteger(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_question_lsh_buckets_lookup', 'question_lsh_buckets', ['teacher_id', 'bucket_hash'], unique=False)
+    op.create_index('ix_question_lsh_buckets_question_id', 'question_lsh_buckets', ['question_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_question_lsh_buckets_question_id', table_name='question_lsh_buckets')
+    op.drop_index('ix_question_lsh_buckets_lookup', table_name='question_lsh_buckets')
+    op.drop_table('question_lsh_buckets')
+    op.drop_index('ix_question_fingerprints_duplicate_of_id', table_name='question_fingerprints')
+    op.drop_index('ix_question_fingerprints_teacher_id', table_name='question_fingerprints')
+    op.drop_table('question_fingerprints')
@@ -0,0 +1,32 @@
+"""add file artifact content hash
+
+Revision ID: d1e3f5a7b9c2
+Revises: c0d2e4f6a8b1
+Create Date: 2026-10-19
+
+SHA-256 of each uploaded file, computed while the upload streams to disk (see
+app.services.file_storage). Files uploaded before this revision keep NULL.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e3f5a7b9c2'
+down_revision: Union[str, Sequence[str], None] = 'c0d2e4f6a8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file_artifacts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_file_artifacts_content_hash'), 'file_artifacts', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_file_artifacts_content_hash'), table_name='file_artifacts')
+    op.drop_column('file_artifacts', 'content_hash')
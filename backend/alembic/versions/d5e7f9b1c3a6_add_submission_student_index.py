@@ -0,0 +1,29 @@
+"""add submissions (student_id, assignment_id) index
+
+Revision ID: d5e7f9b1c3a6
+Revises: c4d6f8a0b2e3
+Create Date: 2026-10-19
+
+Lets the gradebook export stream students in id order and fetch each
+student's submissions by index instead of sorting the submissions table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e7f9b1c3a6'
+down_revision: Union[str, Sequence[str], None] = 'c4d6f8a0b2e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_submissions_student_assignment', 'submissions', ['student_id', 'assignment_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_submissions_student_assignment', table_name='submissions')
@@ -0,0 +1,41 @@
+"""add file blobs
+
+Revision ID: e2f4a6b8c0d3
+Revises: d1e3f5a7b9c2
+Create Date: 2026-10-19
+
+Content-addressed blob store for training material (see
+app.services.blob_store). Existing files are moved into it by the background
+migration started with the application, not by this revision.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f4a6b8c0d3'
+down_revision: Union[str, Sequence[str], None] = 'd1e3f5a7b9c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'file_blobs',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('relative_path', sa.String(length=500), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash'),
+    )
+    op.create_index(op.f('ix_file_blobs_size'), 'file_blobs', ['size'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_file_blobs_size'), table_name='file_blobs')
+    op.drop_table('file_blobs')
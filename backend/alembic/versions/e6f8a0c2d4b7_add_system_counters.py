@@ -0,0 +1,42 @@
+"""add system_counters
+
+Revision ID: e6f8a0c2d4b7
+Revises: d5e7f9b1c3a6
+Create Date: 2026-10-19
+
+Incrementally maintained dashboard totals (see app.services.system_counters).
+The table starts empty; the first dashboard read or reconciler run fills it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f8a0c2d4b7'
+down_revision: Union[str, Sequence[str], None] = 'd5e7f9b1c3a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'system_counters',
+        sa.Column('school_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('schools', sa.Integer(), nullable=False),
+        sa.Column('active_students', sa.Integer(), nullable=False),
+        sa.Column('active_users', sa.Integer(), nullable=False),
+        sa.Column('teachers', sa.Integer(), nullable=False),
+        sa.Column('classes', sa.Integer(), nullable=False),
+        sa.Column('assignments', sa.Integer(), nullable=False),
+        sa.Column('quizzes', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('school_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('system_counters')
@@ -0,0 +1,49 @@
+"""backfill student user_id
+
+Revision ID: f1a3c5e7b9d2
+Revises: 49db749eab61
+Create Date: 2026-10-19
+
+Links legacy Student rows to their login User by (name == username, school_id)
+so the name-matching fallback in student profile resolution can be turned off
+with STUDENT_PROFILE_LEGACY_FALLBACK=false.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a3c5e7b9d2'
+down_revision: Union[str, Sequence[str], None] = '49db749eab61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE INDEX IF NOT EXISTS ix_students_user_id ON students (user_id)")
+    op.execute(
+        """
+        UPDATE students
+        SET user_id = (
+            SELECT MIN(u.id) FROM users u
+            WHERE u.username = students.name
+              AND u.school_id = students.school_id
+              AND u.role = 'STUDENT'
+        )
+        WHERE user_id IS NULL
+          AND EXISTS (
+            SELECT 1 FROM users u
+            WHERE u.username = students.name
+              AND u.school_id = students.school_id
+              AND u.role = 'STUDENT'
+          )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The backfilled links are kept; only the index is removed.
+    op.execute("DROP INDEX IF EXISTS ix_students_user_id")
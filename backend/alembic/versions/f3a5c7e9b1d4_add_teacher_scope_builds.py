@@ -0,0 +1,54 @@
+"""add teacher scope builds
+
+Revision ID: f3a5c7e9b1d4
+Revises: e2f4a6b8c0d3
+Create Date: 2026-10-19
+
+Marks teachers whose teacher_class_scope rows are materialized, so empty scopes
+are not rebuilt on every read, and makes scope rows unique per (teacher, grade,
+class). Duplicates left by concurrent lazy builds are removed first.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a5c7e9b1d4'
+down_revision: Union[str, Sequence[str], None] = 'e2f4a6b8c0d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'teacher_scope_builds',
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('teacher_id'),
+    )
+    # The derived table lets MySQL delete from the table it selects from
+    op.execute("""
+        DELETE FROM teacher_class_scope WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM teacher_class_scope GROUP BY teacher_id, grade_id, class_id
+            ) AS keep
+        )
+    """)
+    op.execute("""
+        INSERT INTO teacher_scope_builds (teacher_id, built_at)
+        SELECT DISTINCT teacher_id, CURRENT_TIMESTAMP FROM teacher_class_scope
+    """)
+    op.create_index(
+        'uq_teacher_class_scope_teacher_grade_class', 'teacher_class_scope',
+        ['teacher_id', 'grade_id', 'class_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_teacher_class_scope_teacher_grade_class', table_name='teacher_class_scope')
+    op.drop_table('teacher_scope_builds')
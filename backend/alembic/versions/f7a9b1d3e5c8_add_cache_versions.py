@@ -0,0 +1,36 @@
+"""add cache_versions
+
+Revision ID: f7a9b1d3e5c8
+Revises: e6f8a0c2d4b7
+Create Date: 2026-10-19
+
+Version stamps for process-wide caches (see app.services.master_data).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a9b1d3e5c8'
+down_revision: Union[str, Sequence[str], None] = 'e6f8a0c2d4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cache_versions = op.create_table(
+        'cache_versions',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(cache_versions, [{'name': 'master_data', 'version': 1}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('cache_versions')
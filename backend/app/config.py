@@ -12,9 +12,30 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: Optional[str] = None
     
+    # Student profile resolution: match Student.name to the login username when
+    # Student.user_id is not set. Disable once the user_id backfill migration has run.
+    STUDENT_PROFILE_LEGACY_FALLBACK: bool = True
+    
+    # Near-duplicate detection for new bank questions: "off", "flag" (hide from
+    # bank listings) or "merge" (attach the new question to the existing lineage).
+    # Existing banks are fingerprinted in the background once a mode is enabled.
+    QUESTION_DEDUP_MODE: str = "off"
+    QUESTION_DEDUP_THRESHOLD: float = 0.8
+    
     # API Keys
     OPENAI_API_KEY: Optional[str] = None
     
+    # Vector store: a Qdrant server URL; unset uses the embedded local store in ./qdrant_db
+    # (exact search, fine for development; the server builds HNSW indexes)
+    QDRANT_URL: Optional[str] = None
+    QDRANT_API_KEY: Optional[str] = None
+    
+    # Embeddings for "similar questions" lookups
+    QUESTION_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    
+    # Largest accepted training-material upload, enforced while the file streams to disk
+    MAX_UPLOAD_SIZE_MB: int = 200
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
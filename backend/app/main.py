@@ -11,6 +11,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from . import database, models, schemas, auth
 from .routers import super_admin, school_admin, teacher, student, upload, auth_routes, ws_generation, individual
+from .config import settings
+from .utils.upload_limit import UploadSizeLimitMiddleware
 from datetime import timedelta
 
 logger = logging.getLogger(__name__)
@@ -18,6 +20,14 @@ logger = logging.getLogger(__name__)
 # Create tables
 models.Base.metadata.create_all(bind=database.engine)
 
+# Full-text index for question bank search (FTS5 / tsvector)
+from .services import question_search
+question_search.ensure_search_index(database.engine)
+
+# Trigram index for student/user typeahead (FTS5 trigram / pg_trgm)
+from .services import name_search
+name_search.ensure_name_search_index(database.engine)
+
 # Seed database (optional - comment out if not needed)
 # try:
 #     import sys
@@ -44,12 +54,22 @@ origins = [
     "http://127.0.0.1:3000",
 ]
 
+# Reject oversized uploads before Starlette spools the multipart body to disk
+# (added before CORS, which wraps it, so 413 responses still carry CORS headers)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+    path_prefixes=["/upload/training-material"],
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor of the next page on paginated list endpoints
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(super_admin.router)
@@ -61,6 +81,36 @@ app.include_router(auth_routes.router)
 app.include_router(ws_generation.router)
 app.include_router(individual.router)
 
+@app.on_event("startup")
+def start_system_counter_reconciler():
+    # Periodically repair drift in the incrementally maintained dashboard counters
+    from .services import system_counters
+    system_counters.start_reconciler(database.engine)
+
+@app.on_event("startup")
+def start_blob_store_migration():
+    # Move training material stored before the content-addressed blob store into it
+    from .services import blob_store
+    blob_store.start_migration(database.engine, upload.STORAGE_ROOT_ABS)
+
+@app.on_event("startup")
+def start_question_fingerprint_backfill():
+    # Fingerprint bank questions that predate near-duplicate detection (no-op when it is off)
+    from .services import question_dedup
+    question_dedup.start_backfill(database.engine)
+
+@app.on_event("shutdown")
+def flush_question_stats():
+    # Write buffered per-question answer statistics before the worker exits
+    from .services import question_stats
+    db = database.SessionLocal()
+    try:
+        question_stats.flush(db)
+    except Exception as e:
+        logger.error(f"Could not flush question stats on shutdown: {e}")
+    finally:
+        db.close()
+
 # Serve Frontend Static Files
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
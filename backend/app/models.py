@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Index, Integer, String, Boolean, ForeignKey, Enum, DateTime, Text, Table
+from sqlalchemy import Column, Index, Integer, String, Boolean, ForeignKey, Enum, DateTime, Text, Table, Float, BigInteger, LargeBinary
 from sqlalchemy.orm import relationship
 from .database import Base
 import enum
@@ -70,6 +70,10 @@ class School(Base):
     max_teachers = Column(Integer, default=100)
     max_students = Column(Integer, default=1000)
     max_classes = Column(Integer, default=50)
+    # Usage against the limits above, kept in step by app.services.school_quota
+    teacher_count = Column(Integer, default=0, nullable=False, server_default="0")
+    student_count = Column(Integer, default=0, nullable=False, server_default="0")
+    class_count = Column(Integer, default=0, nullable=False, server_default="0")
 
     # New FKs
     country_id = Column(Integer, ForeignKey("countries.id"), nullable=True)
@@ -105,6 +109,7 @@ class User(Base):
     __table_args__ = (
         Index('ix_users_username_lower', func.lower(username), unique=True),
         Index('ix_users_email_lower', func.lower(email), unique=True),
+        Index('ix_users_school_username_lower', school_id, func.lower(username)),
     )
 
 class Subject(Base):
@@ -162,7 +167,7 @@ class Student(Base):
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=True) # Nullable for Individual
     grade_id = Column(Integer, ForeignKey("grades.id"), nullable=True)   # Nullable for Individual
     class_id = Column(Integer, ForeignKey("classes.id"), nullable=True) # Link to specific class/section
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Link to login user
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True) # Link to login user
 
     user = relationship("User", foreign_keys=[user_id])
 
@@ -171,6 +176,14 @@ class Student(Base):
     class_ = relationship("Class", back_populates="students")
     submissions = relationship("Submission", back_populates="student")
 
+    __table_args__ = (
+        # Keyset pages of a school's students and name-prefix lookups (see student_directory)
+        Index('ix_students_school_id_id', school_id, id),
+        Index('ix_students_school_name', school_id, name),
+        # Case-insensitive name prefix ranges (see name_search)
+        Index('ix_students_school_name_lower', school_id, func.lower(name)),
+    )
+
     @property
     def username(self):
         return self.user.username if self.user else None
@@ -193,6 +206,36 @@ class TeacherAssignment(Base):
     grade = relationship("Grade", back_populates="assignments")
     class_ = relationship("Class")
 
+class TeacherClassScope(Base):
+    """
+    Materialized view of what a teacher can see, derived from TeacherAssignment.
+    One row per visible class (class_id set) and one per assigned grade (class_id NULL).
+    Maintained by app.services.teacher_scope.
+    """
+    __tablename__ = "teacher_class_scope"
+
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    grade_id = Column(Integer, ForeignKey("grades.id"), nullable=False)
+    class_id = Column(Integer, ForeignKey("classes.id"), nullable=True)
+
+    __table_args__ = (
+        Index('ix_teacher_class_scope_teacher_class', teacher_id, class_id),
+        Index('ix_teacher_class_scope_class_id', class_id),
+        Index('uq_teacher_class_scope_teacher_grade_class', teacher_id, grade_id, class_id, unique=True),
+    )
+
+class TeacherScopeBuild(Base):
+    """
+    Marks a teacher whose teacher_class_scope rows are materialized, including
+    teachers who see nothing, so an empty scope is not rebuilt on every read.
+    The primary key also lets only one of two concurrent lazy builds proceed.
+    """
+    __tablename__ = "teacher_scope_builds"
+
+    teacher_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    built_at = Column(DateTime, default=datetime.utcnow)
+
 class Assignment(Base):
     __tablename__ = "assignments"
 
@@ -238,6 +281,11 @@ class Submission(Base):
     student = relationship("Student", back_populates="submissions")
     answers = relationship("StudentAnswer", back_populates="submission", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Per-student submission lookups (gradebook export streams students in id order)
+        Index('ix_submissions_student_assignment', student_id, assignment_id),
+    )
+
 class FileArtifact(Base):
     __tablename__ = "file_artifacts"
 
@@ -246,10 +294,11 @@ class FileArtifact(Base):
     # File Details
     original_filename = Column(String(255))
     stored_filename = Column(String(255))
-    relative_path = Column(String(500))  # storage/school_id/grade_id/subject_id/filename
+    relative_path = Column(String(500))  # under storage/: blobs/ab/cd/<hash>.<ext> (legacy: school_id/grade_id/subject_id/filename)
     mime_type = Column(String(100))
     file_extension = Column(String(20))
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 hex of the stored bytes
     file_status = Column(String(50), default="Uploaded")
     description = Column(String(500), nullable=True)
     
@@ -275,6 +324,20 @@ class FileArtifact(Base):
     grade = relationship("Grade")
     subject = relationship("Subject")
 
+class FileBlob(Base):
+    """
+    One stored file of the content-addressed blob store (see
+    app.services.blob_store), shared by every FileArtifact with the same bytes.
+    ref_count is the number of artifacts pointing at it.
+    """
+    __tablename__ = "file_blobs"
+
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 hex
+    relative_path = Column(String(500), nullable=False)  # blobs/ab/cd/<content_hash>.<ext>
+    size = Column(BigInteger, nullable=False, index=True)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class QuestionType(str, enum.Enum):
     MULTIPLE_CHOICE = "MULTIPLE_CHOICE"
     TRUE_FALSE = "TRUE_FALSE"
@@ -331,5 +394,85 @@ class StudentAnswer(Base):
     question = relationship("Question")
     selected_option = relationship("QuestionOption")
 
+    __table_args__ = (
+        # Covers item analysis: answers read per question and option, without the table rows
+        Index('ix_student_answers_question_option', question_id, selected_option_id, submission_id, is_correct, points_awarded),
+    )
+
+class QuestionLineageStats(Base):
+    """
+    Running answer statistics per question lineage: a bank question together
+    with every clone of it (parent_question_id). Maintained incrementally by
+    app.services.question_stats; time_* hold Welford mean/M2 of answer times.
+    """
+    __tablename__ = "question_lineage_stats"
+
+    root_question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    correct_count = Column(Integer, default=0, nullable=False)
+    points_sum = Column(Float, default=0, nullable=False)
+    time_count = Column(Integer, default=0, nullable=False)
+    time_mean = Column(Float, default=0, nullable=False)
+    time_m2 = Column(Float, default=0, nullable=False)
+
+class QuestionFingerprint(Base):
+    """
+    MinHash signature of a bank question's normalized text (see
+    app.services.question_dedup). duplicate_of_id points at the earlier
+    question it near-duplicates, if any.
+    """
+    __tablename__ = "question_fingerprints"
+
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=True)
+    signature = Column(LargeBinary, nullable=False)
+    duplicate_of_id = Column(Integer, ForeignKey("questions.id", ondelete="SET NULL"), nullable=True, index=True)
+
+class QuestionLSHBucket(Base):
+    """LSH band buckets of canonical (non-duplicate) bank questions, per teacher."""
+    __tablename__ = "question_lsh_buckets"
+
+    id = Column(Integer, primary_key=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    band = Column(Integer, nullable=False)
+    bucket_hash = Column(BigInteger, nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    __table_args__ = (
+        Index('ix_question_lsh_buckets_lookup', teacher_id, bucket_hash),
+    )
+
 # Update Submission relationship
 Submission.answers = relationship("StudentAnswer", back_populates="submission", cascade="all, delete-orphan")
+
+class SystemCounter(Base):
+    """
+    Dashboard totals maintained incrementally by app.services.system_counters
+    and periodically reconciled. One row per school plus the system-wide row
+    (school_id 0, see system_counters.SYSTEM_SCOPE).
+    """
+    __tablename__ = "system_counters"
+
+    school_id = Column(Integer, primary_key=True, autoincrement=False)
+    schools = Column(Integer, default=0, nullable=False)
+    active_students = Column(Integer, default=0, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)
+    teachers = Column(Integer, default=0, nullable=False)
+    classes = Column(Integer, default=0, nullable=False)
+    assignments = Column(Integer, default=0, nullable=False)
+    # Assignments with at least one question (the rest are projects)
+    quizzes = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+
+class CacheVersion(Base):
+    """
+    Version stamps of process-wide caches (see app.services.master_data). Writers
+    bump the stamp in their own transaction; every worker compares it on read, so
+    an invalidation reaches all of them without a message bus.
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=True)
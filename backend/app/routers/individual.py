@@ -4,6 +4,7 @@ from typing import List, Optional
 from datetime import datetime
 import logging
 from .. import database, models, schemas, auth
+from ..services import school_quota
 from pydantic import BaseModel
 logger = logging.getLogger(__name__)
 
@@ -48,9 +49,10 @@ def register_individual(user_data: schemas.UserCreate, name: str, db: Session =
         active=True,
         school_id=individual_school_id # Link User to specific school
     )
+    # Self sign-ups are not capped, but still show up in the school's usage
+    school_quota.reserve(db, individual_school_id, school_quota.STUDENTS, enforce=False)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush()
     
     # 3. Create Linked Student Profile (Essential for taking quizzes)
     # School/Grade/Class are None initially
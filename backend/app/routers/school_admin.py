@@ -1,7 +1,10 @@
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from .. import database, models, schemas, auth
+from ..services import student_profile, teacher_scope, teacher_stats, quiz_store, gradebook_export, grade_stats, school_reference, school_quota, roster_promotion, student_directory, name_search
 
 router = APIRouter(
     prefix="/school-admin",
@@ -40,6 +43,40 @@ def get_dashboard_stats(db: Session = Depends(database.get_db), current_user: mo
     }
 
 
+
+@router.get("/gradebook/export")
+def export_school_gradebook(
+    format: str = "csv",
+    grade_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_school_admin)
+):
+    """
+    Stream the school gradebook (students x published assignments) as csv, xlsx
+    or parquet, optionally narrowed to a grade, class or subject.
+    """
+    if not current_user.school_id:
+        raise HTTPException(status_code=400, detail="Admin must belong to a school")
+    if class_id is not None and not db.query(models.Class.id).filter(
+        models.Class.id == class_id, models.Class.school_id == current_user.school_id
+    ).first():
+        raise HTTPException(status_code=404, detail="Class not found")
+    columns = gradebook_export.gradebook_columns(
+        db, current_user.school_id, class_id=class_id, grade_id=grade_id, subject_id=subject_id
+    )
+    try:
+        body, media_type = gradebook_export.export(
+            format, current_user.school_id, columns, class_id=class_id, grade_id=grade_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="gradebook-school-{current_user.school_id}.{format}"'
+    })
+
+
 @router.post("/teachers/", response_model=schemas.User)
 def create_teacher(user: schemas.UserCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
     if not current_user.school_id:
@@ -58,35 +95,61 @@ def create_teacher(user: schemas.UserCreate, db: Session = Depends(database.get_
         school_id=current_user.school_id,
         active=True
     )
+    try:
+        school_quota.reserve(db, current_user.school_id, school_quota.TEACHERS)
+    except school_quota.QuotaExceeded as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
     return new_user
 
+# Separator for aggregated grade names (not expected in a grade name)
+GRADE_NAME_SEPARATOR = "\x1f"
+
+
 @router.get("/teachers/", response_model=List[schemas.UserWithGrades])
-def read_teachers(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
-    teachers = db.query(models.User).filter(
+def read_teachers(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    grade_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_school_admin)
+):
+    """
+    Teachers of the school with the names of their assigned grades, in one
+    grouped query (group_concat / string_agg). Optionally only teachers
+    assigned to grade_id; skip/limit page through the list.
+    """
+    # Distinct (teacher, grade name) pairs, so a grade taught in several subjects is listed once
+    teacher_grades = select(
+        models.TeacherAssignment.teacher_id, models.Grade.name
+    ).join(
+        models.Grade, models.TeacherAssignment.grade_id == models.Grade.id
+    ).distinct().subquery()
+
+    query = db.query(
+        models.User,
+        func.aggregate_strings(teacher_grades.c.name, GRADE_NAME_SEPARATOR)
+    ).outerjoin(
+        teacher_grades, teacher_grades.c.teacher_id == models.User.id
+    ).filter(
         models.User.school_id == current_user.school_id,
         models.User.role == models.UserRole.TEACHER
-    ).all()
-    
+    )
+    if grade_id is not None:
+        query = query.filter(models.User.id.in_(
+            select(models.TeacherAssignment.teacher_id).where(models.TeacherAssignment.grade_id == grade_id)
+        ))
+    query = query.group_by(models.User.id).order_by(models.User.id).offset(max(skip, 0))
+    if limit is not None:
+        query = query.limit(max(limit, 0))
+
     results = []
-    for t in teachers:
-        # Get unique grade names for this teacher
-        grade_names = db.query(models.Grade.name).join(
-            models.TeacherAssignment, models.TeacherAssignment.grade_id == models.Grade.id
-        ).filter(
-            models.TeacherAssignment.teacher_id == t.id
-        ).distinct().all()
-        
-        # Flatten the list of tuples
-        grades_list = [g[0] for g in grade_names]
-        
-        # Map to schema
-        teacher_data = schemas.UserWithGrades.model_validate(t)
-        teacher_data.assigned_grades = grades_list
+    for teacher, grade_names in query.all():
+        teacher_data = schemas.UserWithGrades.model_validate(teacher)
+        teacher_data.assigned_grades = sorted(grade_names.split(GRADE_NAME_SEPARATOR)) if grade_names else []
         results.append(teacher_data)
-        
     return results
 
 @router.patch("/teachers/{teacher_id}/status", response_model=schemas.User)
@@ -130,6 +193,10 @@ def create_class(class_data: schemas.ClassCreate, db: Session = Depends(database
         if not teacher:
             raise HTTPException(status_code=404, detail="Teacher not found in this school")
 
+    try:
+        school_quota.reserve(db, current_user.school_id, school_quota.CLASSES)
+    except school_quota.QuotaExceeded as e:
+        raise HTTPException(status_code=400, detail=str(e))
     new_class = models.Class(
         name=class_data.name,
         section=class_data.section,
@@ -138,7 +205,10 @@ def create_class(class_data: schemas.ClassCreate, db: Session = Depends(database
         class_teacher_id=class_data.class_teacher_id
     )
     db.add(new_class)
+    db.flush()
+    teacher_ids = teacher_scope.refresh_grade(db, new_class.grade_id)
     db.commit()
+    teacher_scope.invalidate(teacher_ids)
     db.refresh(new_class)
     return new_class
 
@@ -151,16 +221,17 @@ def delete_class(class_id: int, db: Session = Depends(database.get_db), current_
     if not class_obj:
         raise HTTPException(status_code=404, detail="Class not found")
         
+    teacher_ids = teacher_scope.drop_class(db, class_obj.id)
     db.delete(class_obj)
+    school_quota.release(db, current_user.school_id, school_quota.CLASSES)
     db.commit()
+    teacher_scope.invalidate(teacher_ids)
     return {"message": "Class deleted successfully"}
 
 @router.get("/classes/", response_model=List[schemas.Class])
 def read_classes(grade_id: Optional[int] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
-    query = db.query(models.Class).filter(models.Class.school_id == current_user.school_id)
-    if grade_id:
-        query = query.filter(models.Class.grade_id == grade_id)
-    return query.all()
+    reference = school_reference.get_reference(db, current_user.school_id)
+    return reference.list_classes(grade_id=grade_id or None)
 
 @router.post("/subjects/", response_model=schemas.Subject)
 def create_subject(subject: schemas.SubjectCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
@@ -177,7 +248,7 @@ def create_subject(subject: schemas.SubjectCreate, db: Session = Depends(databas
 @router.get("/subjects/", response_model=List[schemas.Subject])
 def read_subjects(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
     print(f"DEBUG: read_subjects called by {current_user.username} (Role: {current_user.role}, SchoolID: {current_user.school_id})")
-    subjects = db.query(models.Subject).filter(models.Subject.school_id == current_user.school_id).all()
+    subjects = school_reference.get_reference(db, current_user.school_id).list_subjects()
     print(f"DEBUG: Found {len(subjects)} subjects for SchoolID {current_user.school_id}")
     return subjects
 
@@ -216,20 +287,20 @@ def create_grade(grade: schemas.GradeCreate, db: Session = Depends(database.get_
     return new_grade
 
 @router.get("/grades/", response_model=List[schemas.Grade])
-def read_grades(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_user)):
-    query = db.query(models.Grade)
+def read_grades(
+    school_id: Optional[int] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Grades with their active student counts. Users see their own school's grades;
+    super admins see every school unless school_id is given, and can page with skip/limit.
+    """
     if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Grade.school_id == current_user.school_id)
-    grades = query.all()
-
-    # For each grade, count students
-    result = []
-    for grade in grades:
-        student_count = db.query(models.Student).filter(models.Student.grade_id == grade.id, models.Student.active == True).count()
-        # Attach student_count attribute
-        grade.student_count = student_count
-        result.append(grade)
-    return result
+        school_id = current_user.school_id
+    return grade_stats.get_grades(db, school_id, skip=skip, limit=limit)
 
 @router.put("/classes/{class_id}/teacher/{teacher_id}")
 def assign_class_teacher(class_id: int, teacher_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
@@ -255,19 +326,39 @@ def assign_class_teacher(class_id: int, teacher_id: int, db: Session = Depends(d
     return {"message": "Teacher assigned to class successfully"}
 
 @router.get("/students/", response_model=List[schemas.Student])
-def read_students(grade_id: int = None, class_id: int = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
-    query = db.query(models.Student).filter(models.Student.school_id == current_user.school_id)
-    
-    if class_id:
-        query = query.filter(models.Student.class_id == class_id)
-        
-    students = query.all()
-    # Populate email from linked user for the schema
-    for s in students:
-        if s.user:
-            s.email = s.user.email
+def read_students(
+    response: Response,
+    grade_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_school_admin)
+):
+    """
+    Students of the school by id, with their login username, email and last login
+    from one joined query. With limit, the X-Next-Cursor header carries the
+    cursor of the next page (absent on the last one).
+    """
+    students, next_cursor = student_directory.list_students(
+        db, current_user.school_id, grade_id=grade_id, class_id=class_id,
+        name_prefix=name_prefix, cursor=cursor, limit=limit
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return students
 
+@router.get("/typeahead/students", response_model=List[schemas.NameMatch])
+def typeahead_students(q: str, limit: int = 10, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
+    """Students of the school by name: prefix matches first, then substring/trigram matches."""
+    return name_search.search_students(db, current_user.school_id, q, limit=limit)
+
+@router.get("/typeahead/users", response_model=List[schemas.NameMatch])
+def typeahead_users(q: str, role: Optional[models.UserRole] = None, limit: int = 10, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
+    """Users of the school by username, optionally of one role."""
+    return name_search.search_users(db, current_user.school_id, q, limit=limit, roles=[role] if role else None)
+
 @router.put("/students/{student_id}", response_model=schemas.Student)
 def update_student(student_id: int, student_data: schemas.StudentUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
     student = db.query(models.Student).filter(
@@ -279,7 +370,7 @@ def update_student(student_id: int, student_data: schemas.StudentUpdate, db: Ses
     
     # Validation
     if student_data.grade_id is not None:
-        grade = db.query(models.Grade).filter(models.Grade.id == student_data.grade_id, models.Grade.school_id == current_user.school_id).first()
+        grade = school_reference.find_grade(db, current_user.school_id, student_data.grade_id, verify=True)
         if not grade:
             raise HTTPException(status_code=404, detail="Grade not found")
             
@@ -287,7 +378,7 @@ def update_student(student_id: int, student_data: schemas.StudentUpdate, db: Ses
         # If class_id is 0 or -1 (if specific logic needed), but here assuming ID or Null.
         # If user wants to delete class, they might send null. Pydantic handles null if Optional? 
         # But if specifically sent as field. Pydantic exclude_unset handles omitted, but if sent as None it's included.
-        class_obj = db.query(models.Class).filter(models.Class.id == student_data.class_id, models.Class.school_id == current_user.school_id).first()
+        class_obj = school_reference.find_class(db, current_user.school_id, student_data.class_id, verify=True)
         if not class_obj:
             raise HTTPException(status_code=404, detail="Class not found")
             
@@ -304,23 +395,26 @@ def update_student(student_id: int, student_data: schemas.StudentUpdate, db: Ses
             student.user.email = email
             # Also, if we want to update username? Not requested yet.
             
+    previous_class_id = student.class_id
     for key, value in update_data.items():
         setattr(student, key, value)
     
     db.commit()
     db.refresh(student)
-    db.refresh(student)
+    student_profile.invalidate_student(student)
+    if student.class_id != previous_class_id:
+        teacher_stats.invalidate_classes([previous_class_id, student.class_id])
     return student
 
 @router.post("/students/", response_model=schemas.Student)
 def create_student(student_data: schemas.StudentCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
     # 1. Validation
-    grade = db.query(models.Grade).filter(models.Grade.id == student_data.grade_id, models.Grade.school_id == current_user.school_id).first()
+    grade = school_reference.find_grade(db, current_user.school_id, student_data.grade_id, verify=True)
     if not grade:
         raise HTTPException(status_code=404, detail="Grade not found")
         
     if student_data.class_id:
-        cls = db.query(models.Class).filter(models.Class.id == student_data.class_id, models.Class.school_id == current_user.school_id).first()
+        cls = school_reference.find_class(db, current_user.school_id, student_data.class_id, verify=True)
         if not cls:
             raise HTTPException(status_code=404, detail="Class not found")
 
@@ -357,9 +451,13 @@ def create_student(student_data: schemas.StudentCreate, db: Session = Depends(da
         school_id=current_user.school_id,
         active=True
     )
+    try:
+        school_quota.reserve(db, current_user.school_id, school_quota.STUDENTS)
+    except school_quota.QuotaExceeded as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # User and student are created in one transaction with the quota slot
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush()
     
     # 4. Create Student
     new_student = models.Student(
@@ -373,9 +471,27 @@ def create_student(student_data: schemas.StudentCreate, db: Session = Depends(da
     db.add(new_student)
     db.commit()
     db.refresh(new_student)
+    teacher_stats.invalidate_classes([new_student.class_id])
     
     return new_student
 
+@router.post("/students/promote", response_model=schemas.PromotionReport)
+def promote_students(promotion: schemas.PromotionRequest, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_school_admin)):
+    """
+    End-of-year promotion of the school's active students along grade and class
+    mappings, in one transaction. With dry_run only the per-move counts are returned.
+    """
+    try:
+        report = roster_promotion.promote(
+            db, current_user.school_id, promotion.grade_map, promotion.class_map, dry_run=promotion.dry_run
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not report.dry_run:
+        db.commit()
+        roster_promotion.refresh_caches(current_user.school_id, report)
+    return report
+
 # --- Teacher Assignments ---
 
 @router.get("/teachers/{teacher_id}/assignments", response_model=List[schemas.TeacherAssignment])
@@ -420,7 +536,10 @@ def create_teacher_assignment(teacher_id: int, assignment: schemas.TeacherAssign
         class_id=assignment.class_id
     )
     db.add(new_assignment)
+    db.flush()
+    teacher_scope.refresh_teacher(db, teacher_id)
     db.commit()
+    teacher_scope.invalidate([teacher_id])
     db.refresh(new_assignment)
     return new_assignment
 
@@ -434,8 +553,12 @@ def delete_teacher_assignment(assignment_id: int, db: Session = Depends(database
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
         
+    teacher_id = assignment.teacher_id
     db.delete(assignment)
+    db.flush()
+    teacher_scope.refresh_teacher(db, teacher_id)
     db.commit()
+    teacher_scope.invalidate([teacher_id])
     return {"message": "Assignment deleted"}
 
 # --- Grade-Subject Management ---
@@ -446,13 +569,14 @@ def read_grade_subjects(grade_id: int, db: Session = Depends(database.get_db), c
     if current_user.role not in [models.UserRole.SCHOOL_ADMIN, models.UserRole.TEACHER, models.UserRole.SUPER_ADMIN]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
         
-    query = db.query(models.Grade).filter(models.Grade.id == grade_id)
-    
-    # If not super admin, restrict to user's school
+    # Users of a school read their own school's snapshot; super admins may ask for any grade
     if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Grade.school_id == current_user.school_id)
-        
-    grade = query.first()
+        grade = school_reference.find_grade(db, current_user.school_id, grade_id)
+        if not grade:
+            raise HTTPException(status_code=404, detail="Grade not found")
+        return grade["subjects"]
+
+    grade = db.query(models.Grade).filter(models.Grade.id == grade_id).first()
     if not grade:
         raise HTTPException(status_code=404, detail="Grade not found")
         
@@ -526,7 +650,18 @@ def create_assignment_from_bank(
     # School Admins can create assignments for any grade/subject in their school
     # Using the same logic as teacher but for admin scope
     
-    # 1. Create Assignment
+    question_ids = list(dict.fromkeys(data.question_ids or []))
+
+    # 1. Validate that every bank question belongs to this school
+    if question_ids:
+        owned_count = db.query(func.count(models.Question.id)).filter(
+            models.Question.id.in_(question_ids),
+            models.Question.school_id == current_user.school_id
+        ).scalar()
+        if owned_count != len(question_ids):
+            raise HTTPException(status_code=404, detail="One or more questions not found in this school")
+
+    # 2. Create Assignment
     new_assignment = models.Assignment(
         title=data.title,
         description=data.description,
@@ -536,43 +671,22 @@ def create_assignment_from_bank(
         class_id=data.grade_id or data.class_id,
         subject_id=data.subject_id,
         exam_type="Quiz",
-        question_count=len(data.question_ids) if data.question_ids else 0,
+        question_count=len(question_ids),
         difficulty_level="Medium",
         question_type="Mixed"
     )
     db.add(new_assignment)
-    db.commit()
-    db.refresh(new_assignment)
-    
-    # 2. Clone Questions
-    original_questions = db.query(models.Question).filter(
-        models.Question.id.in_(data.question_ids),
-        models.Question.school_id == current_user.school_id
-    ).all()
+    db.flush()
     
-    for q in original_questions:
-        new_q = models.Question(
-            text=q.text,
-            points=q.points,
-            question_type=q.question_type,
-            difficulty_level=q.difficulty_level,
-            assignment_id=new_assignment.id,
-            school_id=current_user.school_id,
-            subject_id=data.subject_id,
-            class_id=data.grade_id or data.class_id,
-            parent_question_id=q.id
-        )
-        db.add(new_q)
-        db.commit()
-        db.refresh(new_q)
-        
-        for opt in q.options:
-            new_opt = models.QuestionOption(
-                text=opt.text,
-                is_correct=opt.is_correct,
-                question_id=new_q.id
-            )
-            db.add(new_opt)
-            
+    # 3. Clone Questions and Options (set-based, same transaction)
+    quiz_store.clone_bank_questions(
+        db,
+        new_assignment.id,
+        question_ids,
+        school_id=current_user.school_id,
+        subject_id=data.subject_id,
+        class_id=data.grade_id or data.class_id
+    )
     db.commit()
+    db.refresh(new_assignment)
     return new_assignment
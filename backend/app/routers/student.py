@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 from .. import database, models, schemas, auth
+from ..services import student_profile, question_stats
 
 router = APIRouter(
     prefix="/student",
@@ -19,15 +20,7 @@ def get_current_student_profile(
     db: Session = Depends(database.get_db), 
     current_user: models.User = Depends(get_current_student)
 ):
-    # Priority: Link via user_id
-    student = db.query(models.Student).filter(models.Student.user_id == current_user.id).first()
-    
-    if not student:
-        # Fallback: Link via name matching (Legacy)
-        student = db.query(models.Student).filter(
-            models.Student.name == current_user.username,
-            models.Student.school_id == current_user.school_id
-        ).first()
+    student = student_profile.resolve_student(db, current_user)
 
     if not student:
         raise HTTPException(status_code=404, detail="Student profile not found")
@@ -200,6 +193,7 @@ def create_submission(submission: schemas.SubmissionCreate, db: Session = Depend
     db.refresh(new_submission)
     
     # Process Answers
+    graded_answers = []
     for ans in submission.answers:
         # Calculate points only if auto-gradable (e.g., MCQ)
         is_correct = False
@@ -222,8 +216,15 @@ def create_submission(submission: schemas.SubmissionCreate, db: Session = Depend
                 points_awarded=points
             )
             db.add(db_answer)
+            graded_answers.append((
+                question_stats.lineage_root(question.id, question.parent_question_id),
+                is_correct, points, ans.time_spent_seconds
+            ))
             
     db.commit()
+    for root_id, is_correct, points, seconds in graded_answers:
+        question_stats.record_answer(root_id, is_correct, points, seconds)
+    question_stats.maybe_flush(db)
     db.refresh(new_submission)
     return new_submission
 
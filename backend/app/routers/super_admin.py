@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import database, models, schemas, auth
+from ..services import system_counters, master_data, school_quota, student_directory, question_stats
 
 router = APIRouter(
     prefix="/super-admin",
@@ -18,39 +19,51 @@ def get_current_super_admin(current_user: models.User = Depends(auth.get_current
 
 @router.get("/stats", response_model=schemas.SuperAdminStats)
 def get_dashboard_stats(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    total_schools = db.query(models.School).count()
-    
-    # Active Users = Active Students + Active Users (Teachers + Admins)
-    # Note: Super Admin is also a user but usually not counted as "School User"
-    # But for "System Users" count, we can include everyone.
-    
-    total_students = db.query(models.Student).filter(models.Student.active == True).count()
-    total_users = db.query(models.User).filter(models.User.active == True).count()
-    
+    # Totals come from the incrementally maintained system counter row
+    totals = system_counters.get_totals(db)
     recent_schools = db.query(models.School).order_by(models.School.id.desc()).limit(5).all()
     
-    # Calculate Quizzes vs Projects
-    # Quiz: Assignment with at least one question
-    # Project: Assignment with zero questions
-    
-    # This query might be expensive if many assignments. Optimizing with count only.
-    # Approach: Count assignments with > 0 questions.
-    # We can join Assignment and Question.
-    
-    total_quizzes = db.query(models.Assignment).join(models.Question).distinct().count()
-    
-    total_assignments = db.query(models.Assignment).count()
-    total_projects = total_assignments - total_quizzes
-    
+    # Active Users = Active Students + Active Users (Teachers + Admins)
+    # Quiz: Assignment with at least one question; Project: Assignment with zero questions
     return {
-        "total_schools": total_schools,
-        "active_users": total_students + total_users,
-        "total_quizzes": total_quizzes,
-        "total_projects": max(0, total_projects),
+        "total_schools": totals.schools,
+        "active_users": totals.active_students + totals.active_users,
+        "total_quizzes": totals.quizzes,
+        "total_projects": max(0, totals.assignments - totals.quizzes),
         "recent_schools": recent_schools
     }
 
 
+@router.get("/stats/system", response_model=schemas.SystemCounters)
+def read_system_counters(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    """System-wide counters (one row read)."""
+    return system_counters.get_totals(db)
+
+
+@router.get("/stats/schools", response_model=List[schemas.SchoolCounters])
+def read_school_counters(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    """Per-school breakdown of the system counters, by school id."""
+    results = []
+    for counters, school_name in system_counters.list_school_totals(db, skip=skip, limit=limit):
+        item = schemas.SchoolCounters.model_validate(counters)
+        item.school_name = school_name
+        results.append(item)
+    return results
+
+
+@router.post("/stats/reconcile", response_model=schemas.SystemCounters)
+def reconcile_system_counters(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    """Recompute every counter row (the schools' quota usage and question lineage stats too) from the source tables now."""
+    system_counters.reconcile(db.get_bind())
+    school_quota.recount(db)
+    db.commit()
+    # Write this worker's buffered deltas first so rebuild() does not count them twice later
+    question_stats.flush(db)
+    question_stats.rebuild(db)
+    db.expire_all()
+    return system_counters.get_totals(db)
+
+
 @router.post("/schools/", response_model=schemas.School)
 def create_school(school: schemas.SchoolCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
     # Check if exists in DB
@@ -76,24 +89,8 @@ def create_school(school: schemas.SchoolCreate, db: Session = Depends(database.g
 
 @router.get("/schools/", response_model=List[schemas.School])
 def read_schools(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    schools = db.query(models.School).offset(skip).limit(limit).all()
-    results = []
-    for school in schools:
-        student_count = db.query(models.Student).filter(models.Student.school_id == school.id).count()
-        teacher_count = db.query(models.User).filter(models.User.school_id == school.id, models.User.role == models.UserRole.TEACHER).count()
-        
-        # We need to convert SQLAlchemy model to Pydantic model manually or attach attributes if using ORM mode with extra fields
-        # Pydantic's from_attributes usually picks up properties. Let's attach them to the object instance if possible (Python dynamic)
-        # However, it's cleaner to just create a dictionary or update the object if it wasn't a DB model.
-        # Since school is a DB model instance, we can't easily add arbitrary attributes that aren't columns without ignoring them in SQL.
-        # But we can reconstruct the Pydantic model.
-        
-        school_data = schemas.School.model_validate(school) 
-        school_data.student_count = student_count
-        school_data.teacher_count = teacher_count
-        results.append(school_data)
-        
-    return results
+    # Usage comes from the counter columns maintained by school_quota, so the page is one plain query
+    return db.query(models.School).order_by(models.School.id).offset(skip).limit(limit).all()
 
 @router.put("/schools/{school_id}", response_model=schemas.School)
 def update_school(school_id: int, school_update: schemas.SchoolCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
@@ -176,11 +173,24 @@ def read_school_users(school_id: int, role: models.UserRole = None, db: Session
     return query.all()
 
 @router.get("/schools/{school_id}/students", response_model=List[schemas.Student])
-def read_school_students(school_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    school = db.query(models.School).filter(models.School.id == school_id).first()
-    if not school:
+def read_school_students(
+    school_id: int,
+    response: Response,
+    name_prefix: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_super_admin)
+):
+    """Students of a school by id (cursor-paginated with limit, see X-Next-Cursor)."""
+    if db.get(models.School, school_id) is None:
        raise HTTPException(status_code=404, detail="School not found")
-    return db.query(models.Student).filter(models.Student.school_id == school_id).all()
+    students, next_cursor = student_directory.list_students(
+        db, school_id, name_prefix=name_prefix, cursor=cursor, limit=limit
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return students
 
 @router.post("/users/{user_id}/deactivate")
 def deactivate_user(user_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
@@ -220,9 +230,18 @@ def reset_password(user_id: int, request: schemas.PasswordResetRequest, db: Sess
 
 # Master Data Endpoints
 
+def _master_data_response(kind: str, country_id, request: Request, response: Response, db: Session):
+    # Served from the process-wide cache; a matching If-None-Match gets an empty 304
+    items, etag = master_data.get(db, kind, country_id)
+    headers = {"ETag": etag, "Cache-Control": master_data.CACHE_CONTROL}
+    if master_data.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return items
+
 @router.get("/master/countries", response_model=List[schemas.Country])
-def read_countries(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    return db.query(models.Country).all()
+def read_countries(request: Request, response: Response, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    return _master_data_response(master_data.COUNTRIES, None, request, response, db)
 
 @router.post("/master/countries", response_model=schemas.Country)
 def create_country(country: schemas.CountryCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
@@ -232,6 +251,7 @@ def create_country(country: schemas.CountryCreate, db: Session = Depends(databas
     
     new_country = models.Country(name=country.name)
     db.add(new_country)
+    master_data.bump_version(db)
     db.commit()
     db.refresh(new_country)
     return new_country
@@ -249,6 +269,7 @@ def update_country(country_id: int, country: schemas.CountryCreate, db: Session
             raise HTTPException(status_code=400, detail="Country name already taken")
     
     db_country.name = country.name
+    master_data.bump_version(db)
     db.commit()
     db.refresh(db_country)
     return db_country
@@ -264,15 +285,13 @@ def delete_country(country_id: int, db: Session = Depends(database.get_db), curr
         raise HTTPException(status_code=400, detail="Cannot delete country in use by schools")
     
     db.delete(db_country)
+    master_data.bump_version(db)
     db.commit()
     return {"message": "Country deleted successfully"}
 
 @router.get("/master/curriculums", response_model=List[schemas.Curriculum])
-def read_curriculums(country_id: int = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    query = db.query(models.Curriculum)
-    if country_id:
-        query = query.filter(models.Curriculum.country_id == country_id)
-    return query.all()
+def read_curriculums(request: Request, response: Response, country_id: Optional[int] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    return _master_data_response(master_data.CURRICULUMS, country_id, request, response, db)
 
 @router.post("/master/curriculums", response_model=schemas.Curriculum)
 def create_curriculum(curriculum: schemas.CurriculumCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
@@ -290,6 +309,7 @@ def create_curriculum(curriculum: schemas.CurriculumCreate, db: Session = Depend
     
     new_curriculum = models.Curriculum(name=curriculum.name, country_id=curriculum.country_id)
     db.add(new_curriculum)
+    master_data.bump_version(db)
     db.commit()
     db.refresh(new_curriculum)
     return new_curriculum
@@ -316,6 +336,7 @@ def update_curriculum(curriculum_id: int, curriculum: schemas.CurriculumCreate,
 
     db_obj.name = curriculum.name
     db_obj.country_id = curriculum.country_id
+    master_data.bump_version(db)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -331,15 +352,13 @@ def delete_curriculum(curriculum_id: int, db: Session = Depends(database.get_db)
         raise HTTPException(status_code=400, detail="Cannot delete Curriculum in use by schools")
     
     db.delete(db_obj)
+    master_data.bump_version(db)
     db.commit()
     return {"message": "Curriculum deleted successfully"}
 
 @router.get("/master/school-types", response_model=List[schemas.SchoolType])
-def read_school_types(country_id: int = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
-    query = db.query(models.SchoolType)
-    if country_id:
-        query = query.filter(models.SchoolType.country_id == country_id)
-    return query.all()
+def read_school_types(request: Request, response: Response, country_id: Optional[int] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
+    return _master_data_response(master_data.SCHOOL_TYPES, country_id, request, response, db)
 
 @router.post("/master/school-types", response_model=schemas.SchoolType)
 def create_school_type(school_type: schemas.SchoolTypeCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_super_admin)):
@@ -357,6 +376,7 @@ def create_school_type(school_type: schemas.SchoolTypeCreate, db: Session = Depe
     
     new_type = models.SchoolType(name=school_type.name, country_id=school_type.country_id)
     db.add(new_type)
+    master_data.bump_version(db)
     db.commit()
     db.refresh(new_type)
     return new_type
@@ -383,6 +403,7 @@ def update_school_type(type_id: int, school_type: schemas.SchoolTypeCreate, db:
 
     db_obj.name = school_type.name
     db_obj.country_id = school_type.country_id
+    master_data.bump_version(db)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -398,6 +419,7 @@ def delete_school_type(type_id: int, db: Session = Depends(database.get_db), cur
         raise HTTPException(status_code=400, detail="Cannot delete School Type in use by schools")
     
     db.delete(db_obj)
+    master_data.bump_version(db)
     db.commit()
     return {"message": "School Type deleted successfully"}
 
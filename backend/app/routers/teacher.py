@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 import logging
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
@@ -9,7 +10,7 @@ from app import database
 from app import models
 from app import schemas
 from app import auth
-from app.services import rag_service
+from app.services import rag_service, teacher_scope, teacher_stats, quiz_store, question_search, bulk_grading, item_analysis, question_stats, quiz_assembly, question_dedup, question_embeddings, gradebook_export, school_reference, school_quota, name_search
 from app.config import settings
 
 router = APIRouter(
@@ -40,22 +41,16 @@ def get_teacher_settings():
 @router.post("/students/", response_model=schemas.Student)
 def create_student(student: schemas.StudentCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
     # Verify grade exists and belongs to the same school
-    grade = db.query(models.Grade).filter(
-        models.Grade.id == student.grade_id,
-        models.Grade.school_id == current_user.school_id
-    ).first()
+    grade = school_reference.find_grade(db, current_user.school_id, student.grade_id, verify=True)
     if not grade:
         raise HTTPException(status_code=404, detail="Grade not found in this school")
     
     # If class_id is provided, verify it
     if student.class_id:
-        class_obj = db.query(models.Class).filter(
-            models.Class.id == student.class_id,
-            models.Class.school_id == current_user.school_id
-        ).first()
+        class_obj = school_reference.find_class(db, current_user.school_id, student.class_id, verify=True)
         if not class_obj:
             raise HTTPException(status_code=404, detail="Class not found in this school")
-        if class_obj.grade_id != student.grade_id:
+        if class_obj["grade_id"] != student.grade_id:
             raise HTTPException(status_code=400, detail="Class does not belong to the selected grade")
 
     # 1. Username Generation
@@ -82,9 +77,13 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(databas
         school_id=current_user.school_id,
         active=True
     )
+    try:
+        school_quota.reserve(db, current_user.school_id, school_quota.STUDENTS)
+    except school_quota.QuotaExceeded as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # User and student are created in one transaction with the quota slot
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush()
 
     # 3. Create Student record linked to User
     new_student = models.Student(
@@ -99,6 +98,7 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(databas
     db.add(new_student)
     db.commit()
     db.refresh(new_student)
+    teacher_stats.invalidate_classes([new_student.class_id])
     return new_student
 
 @router.get("/students/", response_model=schemas.PaginatedResponse[schemas.StudentWithMetrics])
@@ -122,22 +122,10 @@ def read_students(
     # Calculate offset
     offset = (page - 1) * page_size
     
-    # Get visible class IDs first
-    visible_classes = db.query(models.Class.id).join(
-        models.TeacherAssignment, 
-        (models.TeacherAssignment.class_id == models.Class.id) | 
-        ((models.TeacherAssignment.class_id == None) & (models.TeacherAssignment.grade_id == models.Class.grade_id))
-    ).filter(
-        models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
-    
-    visible_class_ids = [c[0] for c in visible_classes]
-    
-    # Also include grade IDs to see students not yet in a class
-    visible_grade_ids = db.query(models.TeacherAssignment.grade_id).filter(
-        models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
-    visible_grade_ids = [g[0] for g in visible_grade_ids]
+    # Visible classes and grades (materialized scope, also includes grade IDs to see students not yet in a class)
+    scope = teacher_scope.get_scope(db, current_user.id)
+    visible_class_ids = list(scope.class_ids)
+    visible_grade_ids = list(scope.grade_ids)
 
     query = db.query(models.Student).filter(
         models.Student.school_id == current_user.school_id,
@@ -232,6 +220,14 @@ def read_students(
         total_pages=total_pages
     )
 
+@router.get("/typeahead/students", response_model=List[schemas.NameMatch])
+def typeahead_students(q: str, limit: int = 10, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
+    """Visible students by name (same scope as read_students): prefix matches first, then substring/trigram."""
+    scope = teacher_scope.get_scope(db, current_user.id)
+    return name_search.search_students(
+        db, current_user.school_id, q, limit=limit, class_ids=scope.class_ids, grade_ids=scope.grade_ids
+    )
+
 @router.get("/students/{student_id}", response_model=schemas.Student)
 def read_student(student_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
     student = db.query(models.Student).filter(
@@ -305,6 +301,38 @@ async def generate_ai_assignment(
     subject_name = subject.name if subject else "General Knowledge"
     logger.info(f"📍 [AI GEN] Step 1: Resolved subject to '{subject_name}'")
 
+    # Fast path: a full quiz on this topic can be assembled from the question bank
+    if req.use_question_bank and req.question_count:
+        candidate_ids = set(question_search.match_question_ids(
+            db, req.topic, teacher_id=current_user.id, subject_id=req.subject_id
+        ))
+        if len(candidate_ids) >= req.question_count:
+            quiz = quiz_assembly.assemble(
+                db,
+                current_user.id,
+                req.subject_id,
+                req.question_count,
+                grade_id=req.grade_id,
+                difficulty_mix={req.difficulty: 1.0} if req.difficulty in quiz_assembly.DIFFICULTY_BUCKETS else None,
+                type_mix=quiz_assembly.type_mix_for_label(req.question_type),
+                candidate_ids=candidate_ids
+            )
+            if not quiz.shortfall:
+                new_assignment = _create_bank_assignment(
+                    db,
+                    current_user,
+                    quiz.question_ids,
+                    title=f"Quiz: {req.topic}",
+                    description=f"A {req.difficulty} level quiz about {req.topic}. Assembled from the question bank.",
+                    due_date=req.due_date,
+                    grade_id=req.grade_id,
+                    subject_id=req.subject_id,
+                    difficulty_level=req.difficulty or "Medium",
+                    question_type=req.question_type or "Mixed"
+                )
+                logger.info(f"⚡ [AI GEN] Assembled assignment {new_assignment.id} from the question bank, skipping the LLM")
+                return new_assignment
+
     # 2. Call RAG Service
     logger.info(f"🤖 [AI GEN] Step 2: Calling RAG service with topic: {req.topic}")
     try:
@@ -345,45 +373,16 @@ async def generate_ai_assignment(
         difficulty_level=req.difficulty or "Medium",
         question_type=getattr(req, 'question_type', "Mixed") or "Mixed"
     )
-    db.add(new_assignment)
-    db.commit()
-    db.refresh(new_assignment)
-    logger.info(f"📦 [AI GEN] Step 4: Created Draft Assignment ID {new_assignment.id}")
-
-    # 4. Create Questions
-    for i, q_data in enumerate(generated_questions):
-        logger.debug(f"📝 [AI GEN] Saving question {i+1}/{len(generated_questions)}")
-        # Map Type
-        q_type_str = q_data.get("question_type", "MULTIPLE_CHOICE")
-        try:
-            q_type = models.QuestionType(q_type_str)
-        except ValueError:
-            q_type = models.QuestionType.MULTIPLE_CHOICE
-            
-        new_q = models.Question(
-            text=q_data.get("text", "Question Text"),
-            points=q_data.get("points", 5),
-            question_type=q_type,
-            assignment_id=new_assignment.id,
-            school_id=current_user.school_id,
-            subject_id=req.subject_id,
-            # grade_id=req.grade_id, # If model has grade_id
-            difficulty_level=req.difficulty
-        )
-        db.add(new_q)
-        db.commit()
-        db.refresh(new_q)
-        
-        # Options
-        for opt in q_data.get("options", []):
-            new_opt = models.QuestionOption(
-                text=opt.get("text", ""),
-                is_correct=opt.get("is_correct", False),
-                question_id=new_q.id
-            )
-            db.add(new_opt)
-    
-    db.commit()
+    # 4. Persist assignment, questions and options in one transaction
+    quiz_store.save_generated_quiz(
+        db,
+        new_assignment,
+        generated_questions,
+        school_id=current_user.school_id,
+        subject_id=req.subject_id,
+        difficulty=req.difficulty
+    )
+    logger.info(f"📦 [AI GEN] Step 4: Saved Draft Assignment ID {new_assignment.id} with {len(generated_questions)} questions")
     logger.info(f"🏁 [AI GEN] Finished! Assignment {new_assignment.id} is ready.")
     return new_assignment
 
@@ -393,58 +392,151 @@ def create_assignment_from_bank(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_teacher)
 ):
-    # Support both grade_id (new) and class_id (legacy)
-    class_or_grade_id = data.grade_id or data.class_id
-    
-    # 1. Create Assignment
-    new_assignment = models.Assignment(
+    question_ids = list(dict.fromkeys(data.question_ids or []))
+
+    # 1. Validate that every bank question belongs to this teacher
+    if question_ids:
+        owned_count = db.query(func.count(models.Question.id)).join(
+            models.Assignment, models.Question.assignment_id == models.Assignment.id
+        ).filter(
+            models.Question.id.in_(question_ids),
+            models.Assignment.teacher_id == current_user.id
+        ).scalar()
+        if owned_count != len(question_ids):
+            raise HTTPException(status_code=404, detail="One or more questions not found in your question bank")
+
+    # 2. Create Assignment and clone the questions
+    return _create_bank_assignment(
+        db,
+        current_user,
+        question_ids,
         title=data.title,
         description=data.description,
         due_date=data.due_date,
-        status=models.AssignmentStatus.DRAFT,
-        teacher_id=current_user.id,
         grade_id=data.grade_id,
         class_id=data.class_id,
-        subject_id=data.subject_id,
+        subject_id=data.subject_id
+    )
+
+def _create_bank_assignment(
+    db: Session,
+    current_user: models.User,
+    question_ids: List[int],
+    title: str,
+    subject_id: int,
+    description: Optional[str] = None,
+    due_date: Optional[datetime] = None,
+    grade_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    difficulty_level: str = "Medium",
+    question_type: str = "Mixed"
+) -> models.Assignment:
+    # Question ownership must already be validated
+    new_assignment = models.Assignment(
+        title=title,
+        description=description,
+        due_date=due_date,
+        status=models.AssignmentStatus.DRAFT,
+        teacher_id=current_user.id,
+        grade_id=grade_id,
+        class_id=class_id,
+        subject_id=subject_id,
         exam_type="Quiz",
-        question_count=len(data.question_ids) if data.question_ids else 0,
-        difficulty_level="Medium",
-        question_type="Mixed"
+        question_count=len(question_ids),
+        difficulty_level=difficulty_level,
+        question_type=question_type
     )
     db.add(new_assignment)
+    db.flush()
+    
+    # Clone Questions and Options (set-based, same transaction)
+    quiz_store.clone_bank_questions(
+        db,
+        new_assignment.id,
+        question_ids,
+        school_id=current_user.school_id,
+        subject_id=subject_id, # Inherit from new assignment/selection
+        class_id=class_id      # Inherit from new assignment/selection
+    )
     db.commit()
     db.refresh(new_assignment)
-    
-    # 2. Clone Questions
-    original_questions = db.query(models.Question).filter(models.Question.id.in_(data.question_ids)).all()
-    
-    for q in original_questions:
-        new_q = models.Question(
-            text=q.text,
-            points=q.points,
-            question_type=q.question_type,
-            difficulty_level=q.difficulty_level,
-            assignment_id=new_assignment.id,
-            school_id=current_user.school_id,
-            subject_id=data.subject_id, # Inherit from new assignment/selection
-            class_id=data.class_id,     # Inherit from new assignment/selection
-            parent_question_id=q.id     # Link to parent
+    return new_assignment
+
+@router.post("/assignments/assemble", response_model=schemas.QuizAssemblyResult)
+def assemble_quiz(
+    req: schemas.QuizAssemblyRequest,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Assemble a quiz from the teacher's question bank without calling the LLM:
+    sampled per difficulty bucket and question type, skipping questions the class
+    (or grade) has already been given. Optionally saved as a draft assignment.
+    """
+    if req.question_count < 1 or req.question_count > settings.MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"question_count must be between 1 and {settings.MAX_PAGE_SIZE}")
+
+    candidate_ids = None
+    if req.topic:
+        candidate_ids = set(question_search.match_question_ids(
+            db, req.topic, teacher_id=current_user.id, subject_id=req.subject_id
+        ))
+    try:
+        quiz = quiz_assembly.assemble(
+            db,
+            current_user.id,
+            req.subject_id,
+            req.question_count,
+            grade_id=req.grade_id,
+            class_id=req.class_id,
+            difficulty_mix=req.difficulty_mix,
+            type_mix=req.type_mix,
+            candidate_ids=candidate_ids,
+            seed=req.seed
         )
-        db.add(new_q)
-        db.commit() # Commit to get ID
-        db.refresh(new_q)
-        
-        # Clone Options
-        for opt in q.options:
-            new_opt = models.QuestionOption(
-                text=opt.text,
-                is_correct=opt.is_correct,
-                question_id=new_q.id
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    questions = []
+    if quiz.question_ids:
+        rows = {
+            q.id: q for q in db.query(
+                models.Question.id, models.Question.text, models.Question.question_type,
+                models.Question.difficulty_level, models.Question.subject_id, models.Question.points
+            ).filter(models.Question.id.in_(quiz.question_ids)).all()
+        }
+        questions = [
+            schemas.QuestionBankItem(
+                id=q.id, text=q.text, question_type=q.question_type, difficulty_level=q.difficulty_level,
+                subject_id=q.subject_id, points=q.points
             )
-            db.add(new_opt)
-            
-    db.commit()
-    return new_assignment
+            for q in (rows[q_id] for q_id in quiz.question_ids if q_id in rows)
+        ]
+        # Deleted since the bank index was built
+        quiz.question_ids = [q_id for q_id in quiz.question_ids if q_id in rows]
+
+    assignment = None
+    if req.create_assignment and quiz.question_ids:
+        assignment = _create_bank_assignment(
+            db,
+            current_user,
+            quiz.question_ids,
+            title=req.title or f"Quiz ({len(quiz.question_ids)} questions)",
+            description=req.description,
+            due_date=req.due_date,
+            grade_id=req.grade_id,
+            class_id=req.class_id,
+            subject_id=req.subject_id
+        )
+
+    return schemas.QuizAssemblyResult(
+        question_ids=quiz.question_ids,
+        requested=quiz.requested,
+        shortfall=quiz.shortfall,
+        cells=quiz.cells,
+        questions=questions,
+        assignment=assignment
+    )
 
 @router.put("/assignments/{assignment_id}/publish")
 def publish_assignment(assignment_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
@@ -498,26 +590,33 @@ def update_assignment(
     db.refresh(assignment)
     return assignment
 
-@router.get("/questions/", response_model=List[schemas.QuestionOut])
-def read_questions(
-    subject_id: Optional[int] = None, 
-    class_id: Optional[int] = None, 
-    difficulty: Optional[str] = None, 
+QUESTION_SUMMARY_TEXT_LENGTH = 120
+
+
+def _teacher_bank_query(
+    db: Session,
+    current_user: models.User,
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(database.get_db), 
-    current_user: models.User = Depends(get_current_teacher)
+    *columns,
+    include_duplicates: bool = False
 ):
-    """
-    Get all questions for the current teacher with optional filters.
-    Used for question bank browsing and filtering.
-    """
-    query = db.query(models.Question).join(models.Assignment, models.Question.assignment_id == models.Assignment.id)
+    query = db.query(*columns) if columns else db.query(models.Question)
+    query = query.join(models.Assignment, models.Question.assignment_id == models.Assignment.id)
     
     # Filter by Teacher (security)
     query = query.filter(models.Assignment.teacher_id == current_user.id)
     
     # Exclude derived questions (only show originals)
     query = query.filter(models.Question.parent_question_id == None)
+
+    # Hide questions flagged as near-duplicates of another bank question
+    if not include_duplicates:
+        query = query.outerjoin(
+            models.QuestionFingerprint, models.QuestionFingerprint.question_id == models.Question.id
+        ).filter(models.QuestionFingerprint.duplicate_of_id == None)
     
     # Context Filters (populated in models now)
     if class_id:
@@ -532,8 +631,213 @@ def read_questions(
     if search:
         search_fmt = f"%{search}%"
         query = query.filter(models.Question.text.ilike(search_fmt))
-        
-    return query.all()
+    return query
+
+
+@router.get("/questions/", response_model=List[schemas.QuestionOut])
+def read_questions(
+    subject_id: Optional[int] = None, 
+    class_id: Optional[int] = None, 
+    difficulty: Optional[str] = None, 
+    search: Optional[str] = None,
+    include_duplicates: bool = False,
+    db: Session = Depends(database.get_db), 
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Get all questions for the current teacher with optional filters.
+    Used for question bank browsing and filtering.
+    Near-duplicates of other bank questions are hidden unless include_duplicates is set.
+    """
+    return _teacher_bank_query(
+        db, current_user, subject_id, class_id, difficulty, search, include_duplicates=include_duplicates
+    ).all()
+
+@router.get("/questions/duplicates", response_model=List[schemas.DuplicateGroup])
+def read_duplicate_questions(
+    subject_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """Groups of near-duplicate bank questions (MinHash similarity), largest groups first."""
+    return question_dedup.duplicate_report(db, current_user.id, subject_id=subject_id)
+
+@router.get("/questions/bank", response_model=schemas.QuestionBankPage, response_model_exclude_none=True)
+def read_question_bank_page(
+    subject_id: Optional[int] = None, 
+    class_id: Optional[int] = None, 
+    difficulty: Optional[str] = None, 
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    view: str = "summary",
+    include_options: bool = False,
+    sort: str = "newest",
+    min_correct_rate: Optional[float] = None,
+    max_correct_rate: Optional[float] = None,
+    min_attempts: Optional[int] = None,
+    include_duplicates: bool = False,
+    db: Session = Depends(database.get_db), 
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Cursor-paginated question bank listing.
+    view=summary returns id, truncated text, type, difficulty and subject only;
+    view=full returns full rows, with options eager-loaded when include_options is set.
+    Observed difficulty (attempts, correct rate across all clones) comes from the
+    running lineage stats; sort=hardest/easiest orders by it. Every sort uses
+    keyset pagination: pass next_cursor back unchanged (it is opaque and only
+    valid for the sort that produced it).
+    Facet counts for subject, difficulty and type come from one grouped query.
+    """
+    if limit is None or limit < 1 or limit > settings.MAX_PAGE_SIZE:
+        limit = settings.DEFAULT_PAGE_SIZE
+    if sort not in ("newest", "hardest", "easiest"):
+        raise HTTPException(status_code=400, detail="sort must be one of newest, hardest, easiest")
+
+    correct_rate = question_stats.correct_rate()
+    stats_columns = (models.QuestionLineageStats.attempts, models.QuestionLineageStats.correct_count, correct_rate)
+    if view == "full":
+        query = _teacher_bank_query(
+            db, current_user, subject_id, class_id, difficulty, search, models.Question, *stats_columns,
+            include_duplicates=include_duplicates
+        )
+        if include_options:
+            query = query.options(selectinload(models.Question.options))
+    else:
+        query = _teacher_bank_query(
+            db, current_user, subject_id, class_id, difficulty, search,
+            models.Question.id,
+            func.substr(models.Question.text, 1, QUESTION_SUMMARY_TEXT_LENGTH + 1),
+            models.Question.question_type,
+            models.Question.difficulty_level,
+            models.Question.subject_id,
+            *stats_columns,
+            include_duplicates=include_duplicates
+        )
+    # Bank questions are lineage roots, so the stats row is keyed by their own id
+    query = query.outerjoin(
+        models.QuestionLineageStats, models.QuestionLineageStats.root_question_id == models.Question.id
+    )
+    if min_correct_rate is not None:
+        query = query.filter(correct_rate >= min_correct_rate)
+    if max_correct_rate is not None:
+        query = query.filter(correct_rate <= max_correct_rate)
+    if min_attempts:
+        query = query.filter(models.QuestionLineageStats.attempts >= min_attempts)
+
+    try:
+        if sort == "newest":
+            if cursor:
+                query = query.filter(models.Question.id < int(cursor))
+            query = query.order_by(models.Question.id.desc())
+        else:
+            rate_order = correct_rate.asc() if sort == "hardest" else correct_rate.desc()
+            query = query.order_by(correct_rate.is_(None), rate_order, models.Question.id.desc())
+            if cursor:
+                query = query.filter(question_stats.after_rate_cursor(
+                    models.Question.id, question_stats.decode_rate_cursor(cursor), descending=sort == "easiest"
+                ))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = query.limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        if view == "full":
+            question, attempts, correct, rate = row
+            item = schemas.QuestionBankItem(
+                id=question.id,
+                text=question.text,
+                question_type=question.question_type,
+                difficulty_level=question.difficulty_level,
+                subject_id=question.subject_id,
+                points=question.points,
+                assignment_id=question.assignment_id,
+                attempts=attempts or 0,
+                correct_rate=rate,
+                options=[schemas.QuestionOptionOut.model_validate(o) for o in question.options] if include_options else None
+            )
+        else:
+            q_id, q_text, q_type, q_difficulty, q_subject_id, attempts, correct, rate = row
+            q_text = q_text or ""
+            if len(q_text) > QUESTION_SUMMARY_TEXT_LENGTH:
+                q_text = q_text[:QUESTION_SUMMARY_TEXT_LENGTH].rstrip() + "…"
+            item = schemas.QuestionBankItem(
+                id=q_id,
+                text=q_text,
+                question_type=q_type,
+                difficulty_level=q_difficulty,
+                subject_id=q_subject_id,
+                attempts=attempts or 0,
+                correct_rate=rate
+            )
+        items.append(item)
+
+    # Facets: one grouped query over the unfiltered bank, folded per facet
+    facet_rows = _teacher_bank_query(
+        db, current_user, None, class_id, None, search,
+        models.Question.subject_id,
+        models.Question.difficulty_level,
+        models.Question.question_type,
+        func.count(models.Question.id),
+        include_duplicates=include_duplicates
+    ).group_by(
+        models.Question.subject_id, models.Question.difficulty_level, models.Question.question_type
+    ).all()
+
+    facet_counts = {"subject": {}, "difficulty": {}, "question_type": {}}
+    for f_subject, f_difficulty, f_type, count in facet_rows:
+        f_type = f_type.value if f_type is not None else None
+        for facet, value in (("subject", f_subject), ("difficulty", f_difficulty), ("question_type", f_type)):
+            facet_counts[facet][value] = facet_counts[facet].get(value, 0) + count
+
+    facets = schemas.QuestionFacets(**{
+        facet: [schemas.FacetCount(value=value, count=count)
+                for value, count in sorted(counts.items(), key=lambda kv: -kv[1])]
+        for facet, counts in facet_counts.items()
+    })
+
+    return schemas.QuestionBankPage(
+        items=items,
+        next_cursor=(
+            str(items[-1].id) if sort == "newest"
+            else question_stats.encode_rate_cursor(rows[-1][-2], rows[-1][-3], items[-1].id)
+        ) if has_more and items else None,
+        facets=facets
+    )
+
+@router.get("/questions/search", response_model=schemas.QuestionSearchResponse)
+def search_questions(
+    q: str,
+    subject_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Ranked full-text search over the teacher's question bank.
+    Returns highlighted hits, subject/difficulty facet counts and a cursor for the next page.
+    """
+    if limit < 1 or limit > settings.MAX_PAGE_SIZE:
+        limit = settings.DEFAULT_PAGE_SIZE
+    try:
+        return question_search.search_questions(
+            db,
+            q,
+            teacher_id=current_user.id,
+            subject_id=subject_id,
+            difficulty=difficulty,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/assignments/{assignment_id}")
 def delete_assignment(assignment_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
@@ -550,35 +854,58 @@ def delete_assignment(assignment_id: int, db: Session = Depends(database.get_db)
     # Assuming standard setup:
     db.delete(assignment)
     db.commit()
+    quiz_assembly.invalidate_teacher(current_user.id)
     return {"message": "Assignment deleted successfully"}
 
 @router.get("/classes/", response_model=List[schemas.Class])
 def read_classes(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
     # Return classes where teacher is explicitly assigned, OR classes in grades where teacher is assigned (if we assume grade assignment equals all classes)
     # Given user request "admin only assigns a class", we should perhaps prioritize explicit class_id, but if 'grade_id' is set in TeacherAssignment, it implies access to that grade's classes.
-    return db.query(models.Class).join(
-        models.TeacherAssignment, 
-        (models.TeacherAssignment.class_id == models.Class.id) | 
-        ((models.TeacherAssignment.class_id == None) & (models.TeacherAssignment.grade_id == models.Class.grade_id))
-    ).filter(
-        models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
+    scope = teacher_scope.get_scope(db, current_user.id)
+    if not scope.class_ids:
+        return []
+    return school_reference.get_reference(db, current_user.school_id).list_classes(class_ids=scope.class_ids)
+
+@router.get("/classes/{class_id}/gradebook/export")
+def export_class_gradebook(
+    class_id: int,
+    format: str = "csv",
+    subject_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Stream the class gradebook (students x this teacher's published assignments)
+    as csv, xlsx or parquet.
+    """
+    scope = teacher_scope.get_scope(db, current_user.id)
+    if class_id not in scope.class_ids:
+        raise HTTPException(status_code=404, detail="Class not found")
+    columns = gradebook_export.gradebook_columns(
+        db, current_user.school_id, class_id=class_id, subject_id=subject_id, teacher_id=current_user.id
+    )
+    try:
+        body, media_type = gradebook_export.export(format, current_user.school_id, columns, class_id=class_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="gradebook-class-{class_id}.{format}"'
+    })
 
 @router.get("/subjects/", response_model=List[schemas.Subject])
 def read_subjects(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
-    return db.query(models.Subject).join(models.TeacherAssignment).filter(
+    subject_ids = {s for (s,) in db.query(models.TeacherAssignment.subject_id).filter(
         models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
+    )}
+    return school_reference.get_reference(db, current_user.school_id).list_subjects(subject_ids)
 
 @router.get("/grades/", response_model=List[schemas.Grade])
 def read_grades(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
     # Only return grades that the teacher is assigned to via TeacherAssignment
-    return db.query(models.Grade).join(
-        models.TeacherAssignment,
-        models.TeacherAssignment.grade_id == models.Grade.id
-    ).filter(
-        models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
+    scope = teacher_scope.get_scope(db, current_user.id)
+    if not scope.grade_ids:
+        return []
+    return school_reference.get_reference(db, current_user.school_id).list_grades(scope.grade_ids)
 
 # --- Question Endpoints ---
 
@@ -632,7 +959,10 @@ def create_question(assignment_id: int, question: schemas.QuestionCreate, db: Se
         )
         db.add(new_option)
     
+    question_dedup.index_new_questions(db, current_user.id, [new_question])
     db.commit()
+    quiz_assembly.invalidate_teacher(current_user.id)
+    question_embeddings.enqueue([new_question.id])
     db.refresh(new_question)
     return new_question
 
@@ -668,7 +998,13 @@ def update_question(question_id: int, question_update: schemas.QuestionUpdate, d
             )
             db.add(new_option)
 
+    if question_update.text is not None:
+        question_dedup.reindex_question(db, current_user.id, question)
     db.commit()
+    quiz_assembly.invalidate_teacher(current_user.id)
+    if question_update.text is not None:
+        # Re-embedded only if the normalized text actually changed
+        question_embeddings.enqueue([question.id])
     db.refresh(question)
     return question
 
@@ -684,6 +1020,8 @@ def delete_question(question_id: int, db: Session = Depends(database.get_db), cu
 
     db.delete(question)
     db.commit()
+    quiz_assembly.invalidate_teacher(current_user.id)
+    question_embeddings.forget([question_id])
     return {"ok": True}
 
 @router.post("/assignments/{assignment_id}/seed_questions")
@@ -737,6 +1075,7 @@ def seed_sample_questions(assignment_id: int, db: Session = Depends(database.get
     db.add(models.QuestionOption(text="William Shakespeare", is_correct=True, question_id=q3.id))
 
     db.commit()
+    quiz_assembly.invalidate_teacher(current_user.id)
     return {"message": "Sample questions added"}
 
 
@@ -825,6 +1164,15 @@ def grade_submission(submission_id: int, grading_data: schemas.GradingUpdate, db
     submission.feedback = grading_data.feedback
     submission.status = models.SubmissionStatus.GRADED
     
+    # Lineage roots of the assignment's questions, for the running question stats
+    roots = {
+        q_id: question_stats.lineage_root(q_id, parent_id)
+        for q_id, parent_id in db.query(models.Question.id, models.Question.parent_question_id).filter(
+            models.Question.assignment_id == submission.assignment_id
+        ).all()
+    }
+    regrades = []
+
     # Update Points for each answer
     for ans_update in grading_data.answers:
         q_id = ans_update.get('question_id')
@@ -837,6 +1185,12 @@ def grade_submission(submission_id: int, grading_data: schemas.GradingUpdate, db
         ).first()
         
         if answer:
+            if q_id in roots:
+                regrades.append((
+                    roots[q_id],
+                    int(bool(is_correct)) - int(bool(answer.is_correct)),
+                    (points or 0) - (answer.points_awarded or 0)
+                ))
             answer.points_awarded = points
             answer.is_correct = is_correct
             db.add(answer)
@@ -845,54 +1199,152 @@ def grade_submission(submission_id: int, grading_data: schemas.GradingUpdate, db
             pass
 
     db.commit()
+    for root_id, correct_delta, points_delta in regrades:
+        question_stats.record_regrade(root_id, correct_delta, points_delta)
+    question_stats.maybe_flush(db)
     db.refresh(submission)
     return submission
 
 
-@router.get("/dashboard/stats", response_model=schemas.DashboardStats)
-def read_dashboard_stats(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
-    # 1. Get visible classes
-    classes = db.query(models.Class).join(
-        models.TeacherAssignment, 
-        (models.TeacherAssignment.class_id == models.Class.id) | 
-        ((models.TeacherAssignment.class_id == None) & (models.TeacherAssignment.grade_id == models.Class.grade_id))
+@router.post("/assignments/{assignment_id}/grade-bulk", response_model=schemas.BulkGradingResult)
+def grade_assignment_bulk(assignment_id: int, grading_data: schemas.BulkGradingUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
+    """
+    Grade every listed submission of an assignment from one points matrix
+    (rows = student_ids, columns = question_ids) in a single transaction.
+    """
+    assignment = db.query(models.Assignment.id).filter(
+        models.Assignment.id == assignment_id,
+        models.Assignment.teacher_id == current_user.id
+    ).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    try:
+        return bulk_grading.grade_matrix(
+            db,
+            assignment_id,
+            grading_data.student_ids,
+            grading_data.question_ids,
+            grading_data.points,
+            feedback=grading_data.feedback
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/assignments/{assignment_id}/item-analysis", response_model=schemas.ItemAnalysisReport)
+def read_assignment_item_analysis(assignment_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
+    """Difficulty, discrimination, distractor frequencies and reliability for an assignment."""
+    assignment = db.query(models.Assignment.id).filter(
+        models.Assignment.id == assignment_id,
+        models.Assignment.teacher_id == current_user.id
+    ).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    return item_analysis.analyze_assignment(db, assignment_id)
+
+
+@router.get("/questions/{question_id}/item-analysis", response_model=schemas.ItemAnalysisReport)
+def read_question_item_analysis(question_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
+    """Item analysis of a bank question pooled over every assignment it was cloned into."""
+    question = db.query(models.Question.id).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
     ).filter(
-        models.TeacherAssignment.teacher_id == current_user.id
-    ).distinct().all()
+        models.Question.id == question_id,
+        models.Assignment.teacher_id == current_user.id
+    ).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return item_analysis.analyze_bank_question(db, question_id)
 
-    class_stats_list = []
-    total_students = 0
 
-    for cls in classes:
-        # Count students in this class
-        s_count = db.query(models.Student).filter(models.Student.class_id == cls.id).count()
-        
-        # Get grade name
-        grade_name = cls.grade.name if cls.grade else "Unknown Grade"
-
-        class_stats_list.append(schemas.ClassStats(
-            id=cls.id,
-            name=cls.name,
-            section=cls.section,
-            student_count=s_count,
-            grade_name=grade_name
-        ))
-        total_students += s_count
+SIMILAR_QUESTIONS_MAX_LIMIT = 50
 
-    return schemas.DashboardStats(
-        total_students=total_students,
-        total_classes=len(classes),
-        classes=class_stats_list
-    )
+
+@router.get("/questions/{question_id}/similar", response_model=List[schemas.SimilarQuestion])
+def read_similar_questions(
+    question_id: int,
+    subject_id: Optional[int] = None,
+    scope: str = "mine",
+    limit: int = 10,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_teacher)
+):
+    """
+    Semantically similar bank questions ("more like this"), best match first.
+    Searches the teacher's own bank (scope=mine) or every bank of the teacher's
+    school (scope=school), in the question's subject unless subject_id is given.
+    """
+    if scope not in ("mine", "school"):
+        raise HTTPException(status_code=400, detail="scope must be 'mine' or 'school'")
+    limit = max(1, min(limit, SIMILAR_QUESTIONS_MAX_LIMIT))
+    question = db.query(
+        models.Question.id, models.Question.parent_question_id, models.Question.subject_id
+    ).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
+    ).filter(
+        models.Question.id == question_id,
+        models.Assignment.teacher_id == current_user.id
+    ).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    source_id = question_stats.lineage_root(question.id, question.parent_question_id)
+    question_embeddings.ensure_teacher_queued(db, current_user.id)
+    try:
+        hits = question_embeddings.similar_questions(
+            db,
+            source_id,
+            school_id=current_user.school_id,
+            teacher_id=current_user.id if scope == "mine" else None,
+            subject_id=subject_id if subject_id is not None else question.subject_id,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not hits:
+        return []
+
+    # Hydrate in rank order; drops points of deleted questions and flagged duplicates
+    rows = db.query(
+        models.Question.id, models.Question.text, models.Question.question_type,
+        models.Question.difficulty_level, models.Question.subject_id, models.Question.assignment_id
+    ).outerjoin(
+        models.QuestionFingerprint, models.QuestionFingerprint.question_id == models.Question.id
+    ).filter(
+        models.Question.id.in_([q_id for q_id, _ in hits]),
+        models.QuestionFingerprint.duplicate_of_id == None
+    ).all()
+    by_id = {row.id: row for row in rows}
+    results = []
+    for q_id, score in hits:
+        row = by_id.get(q_id)
+        if row is None:
+            continue
+        results.append({
+            "id": row.id,
+            "text": row.text,
+            "question_type": (row.question_type or models.QuestionType.MULTIPLE_CHOICE).value,
+            "difficulty_level": row.difficulty_level,
+            "subject_id": row.subject_id,
+            "assignment_id": row.assignment_id,
+            "score": score
+        })
+    return results[:limit]
+
+
+@router.get("/dashboard/stats", response_model=schemas.DashboardStats)
+def read_dashboard_stats(db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
+    # One grouped count over the visible classes, cached briefly per teacher
+    return teacher_stats.get_dashboard_stats(db, current_user.id)
 
 
 @router.get("/grades/{grade_id}/subjects", response_model=List[schemas.Subject])
 def read_grade_subjects(grade_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_teacher)):
     # Get subjects assigned to this teacher for this specific grade
-    subjects = db.query(models.Subject).join(models.TeacherAssignment).filter(
+    subject_ids = {s for (s,) in db.query(models.TeacherAssignment.subject_id).filter(
         models.TeacherAssignment.teacher_id == current_user.id,
         models.TeacherAssignment.grade_id == grade_id
-    ).distinct().all()
-    
-    return subjects
+    )}
+    return school_reference.get_reference(db, current_user.school_id).list_subjects(subject_ids)
 
@@ -3,13 +3,14 @@ from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
 import os
-import shutil
 from datetime import datetime
 import mimetypes
 import json
 import asyncio
 
 from .. import database, models, schemas, auth
+from ..config import settings
+from ..services import blob_store, file_storage
 
 router = APIRouter(
     prefix="/upload",
@@ -81,27 +82,18 @@ async def upload_training_material(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # Directory Structure: storage/{school_id}/{grade_id}/{subject_id}/
-    relative_dir = os.path.join(str(school_id), str(grade_id), str(subject_id))
-    abs_dir = os.path.join(STORAGE_ROOT_ABS, relative_dir)
-    os.makedirs(abs_dir, exist_ok=True)
-
-    # Generate Stored Filename
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
     original_filename = file.filename
-    clean_filename = "".join(x for x in original_filename if x.isalnum() or x in "._- ")
-    stored_filename = f"{timestamp}_{clean_filename}"
-    
-    file_path = os.path.join(abs_dir, stored_filename)
-    relative_path = os.path.join(relative_dir, stored_filename)
+    file_extension = os.path.splitext(original_filename)[1].lower().replace(".", "")
 
-    # Save File
+    # Content-addressed: a file another upload already stored only gains a reference
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        file_size = os.path.getsize(file_path)
+        blob, created = await blob_store.store_upload(
+            db, file, STORAGE_ROOT_ABS, file_extension, settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+        )
+    except file_storage.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
 
     # Create DB Record
@@ -110,18 +102,27 @@ async def upload_training_material(
         grade_id=grade_id,
         subject_id=subject_id,
         original_filename=original_filename,
-        stored_filename=stored_filename,
-        relative_path=relative_path,
+        stored_filename=os.path.basename(blob.relative_path),
+        relative_path=blob.relative_path,
         mime_type=file.content_type or mimetypes.guess_type(file.filename)[0],
-        file_extension=os.path.splitext(original_filename)[1].lower().replace(".", ""),
-        file_size=file_size,
+        file_extension=file_extension,
+        file_size=blob.size,
+        content_hash=blob.content_hash,
         uploaded_by_id=current_user.id,
         uploaded_at=datetime.utcnow(),
         description=description
     )
     
     db.add(new_artifact)
-    db.commit()
+    content_hash, blob_relative = blob.content_hash, blob.relative_path
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        if created:
+            # Kept if a concurrent upload of the same file has committed its own row meanwhile
+            blob_store.discard_unreferenced(db.get_bind(), STORAGE_ROOT_ABS, content_hash, blob_relative)
+        raise
     db.refresh(new_artifact)
     
     return new_artifact
@@ -406,24 +407,9 @@ def delete_training_material(
 
     ensure_teacher_upload_scope(db, current_user, artifact=artifact)
 
-    # 1. Delete Physical File
-    # Construct absolute path using STORAGE_ROOT to match upload logic
-    try:
-        file_path = os.path.join(STORAGE_ROOT_ABS, artifact.relative_path)
-        
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Deleted file: {file_path}")
-        else:
-            print(f"File not found on disk, skipping delete: {file_path}")
-            
-    except Exception as e:
-        print(f"Error deleting physical file: {e}")
-        # We continue to delete the DB record even if file delete fails (or maybe not? standard is usually yes to clean up DB)
-
-    # 2. Delete DB Record
-    db.delete(artifact)
-    db.commit()
+    # Blob store: drops this artifact's reference, and the file with the last one.
+    # Legacy files not yet migrated are deleted directly.
+    blob_store.delete_artifact(db, STORAGE_ROOT_ABS, artifact)
 
     return {"message": "File deleted successfully"}
 
@@ -4,7 +4,7 @@ from datetime import datetime
 import json
 from app import database
 from app import models
-from app.services import rag_service
+from app.services import rag_service, quiz_store
 from app.connection_manager import manager
 import logging
 
@@ -112,41 +112,16 @@ async def websocket_quiz_endpoint(websocket: WebSocket, client_id: str, db: Sess
                             difficulty_level=difficulty or "Medium",
                             question_type=question_type or "Mixed"
                         )
-                        db.add(new_assignment)
-                        db.commit()
-                        db.refresh(new_assignment)
-                        
-                        # 4. Create Questions
-                        for q_data in generated_questions:
-                            q_type_str = q_data.get("question_type", "MULTIPLE_CHOICE")
-                            try:
-                                q_type = models.QuestionType(q_type_str)
-                            except ValueError:
-                                q_type = models.QuestionType.MULTIPLE_CHOICE
-                                
-                            new_q = models.Question(
-                                text=q_data.get("text", "Question Text"),
-                                points=q_data.get("points", 5),
-                                question_type=q_type,
-                                assignment_id=new_assignment.id,
-                                school_id=school_id,
-                                subject_id=subject_id,
-                                class_id=grade_id,  # Frontend sends grade_id, map to class_id for backward compatibility
-                                difficulty_level=difficulty
-                            )
-                            db.add(new_q)
-                            db.commit()
-                            db.refresh(new_q)
-                            
-                            for opt in q_data.get("options", []):
-                                new_opt = models.QuestionOption(
-                                    text=opt.get("text", ""),
-                                    is_correct=opt.get("is_correct", False),
-                                    question_id=new_q.id
-                                )
-                                db.add(new_opt)
-                        
-                        db.commit()
+                        # 4. Persist assignment, questions and options in one transaction
+                        quiz_store.save_generated_quiz(
+                            db,
+                            new_assignment,
+                            generated_questions,
+                            school_id=school_id,
+                            subject_id=subject_id,
+                            class_id=grade_id,  # Frontend sends grade_id, map to class_id for backward compatibility
+                            difficulty=difficulty
+                        )
                         logger.info(f"[WS] Generation complete. Assignment ID: {new_assignment.id}")
                         
                         # Send result
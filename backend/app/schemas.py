@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Generic, TypeVar
+from typing import Optional, List, Dict, Generic, TypeVar, Union
 from datetime import datetime
 from .models import UserRole, AssignmentStatus, SubmissionStatus
 
@@ -63,8 +63,12 @@ class SchoolCreate(SchoolBase):
 class School(SchoolBase):
     id: int
     active: bool
+    max_teachers: Optional[int] = None
+    max_students: Optional[int] = None
+    max_classes: Optional[int] = None
     student_count: Optional[int] = 0
     teacher_count: Optional[int] = 0
+    class_count: Optional[int] = 0
     
     class Config:
         from_attributes = True
@@ -81,6 +85,7 @@ class FileArtifactBase(BaseModel):
     original_filename: str
     uploaded_at: datetime
     file_size: Optional[int] = None
+    content_hash: Optional[str] = None
     file_extension: Optional[str] = None
     mime_type: Optional[str] = None
     file_status: Optional[str] = "Uploaded"
@@ -220,6 +225,38 @@ class StudentWithMetrics(Student):
     completed_count: int = 0
     graded_count: int = 0
 
+class NameMatch(BaseModel):
+    id: int
+    name: str
+    username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[UserRole] = None
+    grade_id: Optional[int] = None
+    class_id: Optional[int] = None
+    active: Optional[bool] = None
+
+class PromotionRequest(BaseModel):
+    # Source grade id -> next grade id (None graduates: deactivated, class cleared)
+    grade_map: Dict[int, Optional[int]] = {}
+    # Source class id -> next class id (None clears the class); takes precedence over grade_map
+    class_map: Dict[int, Optional[int]] = {}
+    dry_run: bool = False
+
+class PromotionMove(BaseModel):
+    from_grade_id: Optional[int] = None
+    from_class_id: Optional[int] = None
+    to_grade_id: Optional[int] = None
+    to_class_id: Optional[int] = None
+    graduated: bool = False
+    count: int
+
+class PromotionReport(BaseModel):
+    dry_run: bool
+    students: int = 0
+    promoted: int = 0
+    graduated: int = 0
+    moves: List[PromotionMove] = []
+
 class AssignmentBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -248,6 +285,7 @@ class AssignmentAICreate(BaseModel):
     question_type: Optional[str] = "Mixed"
     due_date: Optional[datetime] = None
     use_pdf_context: Optional[bool] = False
+    use_question_bank: Optional[bool] = True # Try assembling from the bank before calling the LLM
 
 class Assignment(AssignmentBase):
     id: int
@@ -331,6 +369,49 @@ class Question(QuestionBase):
     class Config:
         from_attributes = True
 
+class FacetCount(BaseModel):
+    value: Optional[Union[int, str]] = None
+    count: int
+
+class QuestionFacets(BaseModel):
+    subject: List[FacetCount] = []
+    difficulty: List[FacetCount] = []
+    question_type: List[FacetCount] = []
+
+class QuestionSearchHit(BaseModel):
+    id: int
+    text: str
+    highlight: Optional[str] = None
+    score: float
+    points: Optional[int] = None
+    question_type: str
+    difficulty_level: Optional[str] = None
+    subject_id: Optional[int] = None
+    assignment_id: int
+
+class QuestionSearchResponse(BaseModel):
+    items: List[QuestionSearchHit]
+    next_cursor: Optional[str] = None
+    facets: QuestionFacets
+
+class QuestionBankItem(BaseModel):
+    """Question bank row; projection mode only fills the summary fields."""
+    id: int
+    text: str
+    question_type: str
+    difficulty_level: Optional[str] = None
+    subject_id: Optional[int] = None
+    points: Optional[int] = None
+    assignment_id: Optional[int] = None
+    attempts: Optional[int] = None
+    correct_rate: Optional[float] = None
+    options: Optional[List[QuestionOptionOut]] = None
+
+class QuestionBankPage(BaseModel):
+    items: List[QuestionBankItem]
+    next_cursor: Optional[str] = None
+    facets: QuestionFacets
+
 class AssignmentFromBankCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -342,6 +423,50 @@ class AssignmentFromBankCreate(BaseModel):
 
 
 
+class DuplicateQuestion(BaseModel):
+    question_id: int
+    text: Optional[str] = None
+    similarity: float
+
+class DuplicateGroup(BaseModel):
+    question_id: int
+    subject_id: Optional[int] = None
+    text: Optional[str] = None
+    duplicates: List[DuplicateQuestion]
+
+class SimilarQuestion(BaseModel):
+    id: int
+    text: str
+    question_type: str
+    difficulty_level: Optional[str] = None
+    subject_id: Optional[int] = None
+    assignment_id: Optional[int] = None
+    score: float
+
+class QuizAssemblyRequest(BaseModel):
+    subject_id: int
+    question_count: int
+    grade_id: Optional[int] = None
+    class_id: Optional[int] = None
+    difficulty_mix: Optional[Dict[str, float]] = None # e.g. {"Easy": 0.3, "Medium": 0.5, "Hard": 0.2}
+    type_mix: Optional[Dict[str, float]] = None # e.g. {"MULTIPLE_CHOICE": 0.8, "TRUE_FALSE": 0.2}
+    topic: Optional[str] = None # Restrict to questions matching this text
+    seed: Optional[int] = None
+    # Save the selection as a draft assignment
+    create_assignment: bool = False
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+
+class QuizAssemblyResult(BaseModel):
+    question_ids: List[int]
+    requested: int
+    shortfall: int
+    cells: Dict[str, int]
+    questions: List[QuestionBankItem]
+    assignment: Optional[AssignmentOut] = None
+
+
 class SubmissionBase(BaseModel):
     pass
 
@@ -351,7 +476,7 @@ class StudentAnswerBase(BaseModel):
     text_answer: Optional[str] = None
 
 class StudentAnswerCreate(StudentAnswerBase):
-    pass
+    time_spent_seconds: Optional[float] = None # Client-measured, feeds question statistics only
 
 class SubmissionCreate(SubmissionBase):
     assignment_id: int
@@ -392,6 +517,49 @@ class GradingUpdate(BaseModel):
     feedback: Optional[str] = None
     answers: List[dict] # List of {question_id: int, points: int, is_correct: bool}
 
+class BulkGradingUpdate(BaseModel):
+    # points[i][j] is the score of student_ids[i] on question_ids[j]; None leaves the answer unchanged
+    student_ids: List[int]
+    question_ids: List[int]
+    points: List[List[Optional[int]]]
+    feedback: Optional[str] = None
+
+class StudentGradeTotal(BaseModel):
+    student_id: int
+    submission_id: int
+    total_points: float
+    max_points: float
+    grade: str
+
+class BulkGradingResult(BaseModel):
+    assignment_id: int
+    answers_updated: int
+    totals: List[StudentGradeTotal]
+
+class DistractorFrequency(BaseModel):
+    option_id: int
+    text: str
+    is_correct: bool
+    count: int
+    share: float
+
+class ItemStatistics(BaseModel):
+    question_id: int
+    responses: int
+    difficulty: Optional[float] = None
+    discrimination: Optional[float] = None
+    mean_points: float
+    max_points: Optional[int] = None
+    distractors: List[DistractorFrequency] = []
+
+class ItemAnalysisReport(BaseModel):
+    assignment_id: Optional[int] = None
+    question_id: Optional[int] = None
+    students: int
+    mean_score: Optional[float] = None
+    cronbach_alpha: Optional[float] = None
+    items: List[ItemStatistics]
+
 class AssignmentDetail(Assignment):
     questions: List[Question] = []
 
@@ -440,6 +608,23 @@ class SuperAdminStats(BaseModel):
     total_projects: int = 0
     recent_schools: List[School] = [] # Re-using School schema
 
+class SystemCounters(BaseModel):
+    school_id: int
+    schools: int
+    active_students: int
+    active_users: int
+    teachers: int
+    classes: int
+    assignments: int
+    quizzes: int
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class SchoolCounters(SystemCounters):
+    school_name: Optional[str] = None
+
 class PasswordResetRequest(BaseModel):
     password: str
 
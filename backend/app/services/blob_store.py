@@ -0,0 +1,382 @@
+"""
+Content-addressed storage of training material.
+
+Each distinct file is stored once, at blobs/<h[:2]>/<h[2:4]>/<h>.<ext> under the
+storage root (h being its SHA-256), and described by a FileBlob row counting the
+FileArtifact rows that point at it. Uploading a textbook another school already
+uploaded only adds a reference. Deleting an artifact drops one, and the file
+goes with the last reference.
+
+Duplicates are also cheaper to upload: when a blob of the upload's exact size
+exists, the upload is first hashed without being written. It is streamed to
+disk (file_storage.stage_upload) only when no blob has that hash.
+
+Reference counts change through conditional UPDATEs, so concurrent uploads and
+deletes of the same blob serialize on its row. A new blob's row is inserted
+before its file is written. Until that transaction ends, the row's key keeps
+every other writer of the same content waiting. A file is only removed while
+holding that key: after a failed upload (discard_unreferenced), or when the
+last reference goes. A blob whose count reaches zero is deleted in the
+caller's transaction. Its file is first moved aside, and is removed after the
+commit (purge) or moved back after a failure (restore).
+
+Artifacts stored before the blob store, under {school}/{grade}/{subject}/, are
+moved into it by migrate_legacy_files. start_migration runs that in a
+background thread at startup.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services import file_storage
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+# Stored paths use "/" on every platform
+BLOB_PREFIX = BLOB_DIR + "/"
+# Rounds of insert-or-reference against writers of the same content that roll back
+CREATE_ATTEMPTS = 5
+MIGRATION_BATCH_SIZE = 50
+MIGRATION_PAUSE_SECONDS = 0.5
+
+_migration: Optional[threading.Thread] = None
+
+
+@dataclass
+class PendingRemoval:
+    path: str
+    aside_path: str
+
+
+def blob_path(content_hash: str, extension: str = "") -> str:
+    extension = extension.lower()
+    if extension and not extension.startswith("."):
+        extension = "." + extension
+    return f"{BLOB_PREFIX}{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}"
+
+
+def is_blob_path(relative_path: Optional[str]) -> bool:
+    return bool(relative_path) and relative_path.startswith(BLOB_PREFIX)
+
+
+def _acquire(db: Session, content_hash: str) -> Optional[models.FileBlob]:
+    """Take a reference to an existing blob; None if there is no blob with this hash."""
+    FileBlob = models.FileBlob
+    updated = db.execute(
+        update(FileBlob)
+        .where(FileBlob.content_hash == content_hash)
+        .values(ref_count=FileBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return db.get(FileBlob, content_hash) if updated else None
+
+
+def _create(db: Session, content_hash: str, relative_path: str, size: int) -> Optional[models.FileBlob]:
+    """Insert a blob with one reference; None if a concurrent writer inserted it first."""
+    blob = models.FileBlob(content_hash=content_hash, relative_path=relative_path, size=size, ref_count=1)
+    try:
+        with db.begin_nested():
+            db.add(blob)
+    except IntegrityError:
+        return None
+    return blob
+
+
+def _create_or_acquire(db: Session, content_hash: str, relative_path: str, size: int) -> Tuple[models.FileBlob, bool]:
+    """
+    Insert a blob row, or take a reference to the one a concurrent writer
+    committed. Returns (blob, created). A concurrent writer that rolls back
+    leaves neither, so this retries.
+    """
+    for _ in range(CREATE_ATTEMPTS):
+        blob = _create(db, content_hash, relative_path, size)
+        if blob is not None:
+            return blob, True
+        blob = _acquire(db, content_hash)
+        if blob is not None:
+            return blob, False
+    raise RuntimeError(f"Could not store blob {content_hash}: concurrent writers kept rolling back")
+
+
+def discard_unreferenced(bind, storage_root: str, content_hash: str, relative_path: str) -> None:
+    """
+    Remove the file of a blob whose creating transaction failed, unless another
+    writer has a row for the hash. Call after rolling back. The placeholder row
+    taken here keeps new writers of the hash waiting until the file is gone.
+    """
+    with Session(bind=bind) as cleanup:
+        cleanup.add(models.FileBlob(content_hash=content_hash, relative_path=relative_path, size=0, ref_count=0))
+        try:
+            cleanup.flush()
+        except IntegrityError:
+            return
+        file_storage.discard(os.path.join(storage_root, relative_path))
+        cleanup.rollback()
+
+
+async def store_upload(
+    db: Session, upload: UploadFile, storage_root: str, extension: str, max_bytes: int
+) -> Tuple[models.FileBlob, bool]:
+    """
+    Store an upload in the blob store and take a reference to its blob. Returns
+    the blob and whether this upload created it. If the caller's transaction
+    then fails, pass a created blob to discard_unreferenced after the rollback.
+    Raises file_storage.UploadTooLarge. Does not commit.
+    """
+    if upload.size is not None:
+        if upload.size > max_bytes:
+            raise file_storage.UploadTooLarge(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+        same_size = db.execute(
+            select(models.FileBlob.content_hash).where(models.FileBlob.size == upload.size).limit(1)
+        ).first()
+        if same_size:
+            _, content_hash = await file_storage.hash_upload(upload)
+            blob = _acquire(db, content_hash)
+            if blob is not None:
+                return blob, False
+
+    # Staged next to the blob tree so the final rename stays on one filesystem
+    staged = await file_storage.stage_upload(upload, os.path.join(storage_root, BLOB_DIR), max_bytes)
+    blob = _acquire(db, staged.sha256)
+    if blob is not None:
+        file_storage.discard(staged.temp_path)
+        return blob, False
+
+    relative_path = blob_path(staged.sha256, extension)
+    try:
+        blob, created = _create_or_acquire(db, staged.sha256, relative_path, staged.size)
+        if created:
+            # Written under the new row's key: no other writer of this content runs until we commit
+            final_path = os.path.join(storage_root, relative_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            file_storage.commit(staged, final_path)
+    finally:
+        file_storage.discard(staged.temp_path)
+    return blob, created
+
+
+def release(db: Session, storage_root: str, content_hash: str) -> Optional[PendingRemoval]:
+    """
+    Drop one reference to a blob. When it was the last one, the blob row is
+    deleted and its file moved aside: pass the result to purge() after the
+    commit, or to restore() if the transaction fails. Does not commit.
+    """
+    FileBlob = models.FileBlob
+    db.execute(
+        update(FileBlob)
+        .where(FileBlob.content_hash == content_hash, FileBlob.ref_count > 0)
+        .values(ref_count=FileBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    # The UPDATE holds the row lock, so no upload can take a reference in between
+    blob = db.execute(
+        select(FileBlob).where(FileBlob.content_hash == content_hash).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+    if blob is None or blob.ref_count > 0:
+        return None
+
+    path = os.path.join(storage_root, blob.relative_path)
+    db.delete(blob)
+    db.flush()
+    pending = PendingRemoval(path=path, aside_path=f"{path}.deleted-{uuid.uuid4().hex}")
+    try:
+        os.replace(pending.path, pending.aside_path)
+    except FileNotFoundError:
+        logger.warning(f"Blob file already missing: {path}")
+        return None
+    return pending
+
+
+def purge(pending: Optional[PendingRemoval]) -> None:
+    if pending is not None:
+        file_storage.discard(pending.aside_path)
+
+
+def restore(pending: Optional[PendingRemoval]) -> None:
+    if pending is not None and os.path.exists(pending.aside_path):
+        os.replace(pending.aside_path, pending.path)
+
+
+def delete_artifact(db: Session, storage_root: str, artifact: models.FileArtifact) -> None:
+    """
+    Delete an artifact and drop its blob reference (for a legacy artifact, its
+    file) and commit. The row is deleted only if its relative_path is still the
+    one read. If the migration moved the artifact in between, it is re-read and
+    the reference the migration took is released instead.
+    """
+    FileArtifact = models.FileArtifact
+    artifact_id = artifact.id
+    for _ in range(CREATE_ATTEMPTS):
+        relative_path, content_hash = artifact.relative_path, artifact.content_hash
+        deleted = db.execute(
+            delete(FileArtifact)
+            .where(FileArtifact.id == artifact_id, FileArtifact.relative_path == relative_path)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not deleted:
+            db.rollback()
+            artifact = db.get(FileArtifact, artifact_id)
+            if artifact is None:
+                return
+            continue
+
+        in_blob_store = is_blob_path(relative_path) and content_hash
+        pending = release(db, storage_root, content_hash) if in_blob_store else None
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            restore(pending)
+            raise
+        if in_blob_store:
+            purge(pending)
+        elif relative_path:
+            file_storage.discard(os.path.join(storage_root, relative_path))
+        return
+    raise RuntimeError(f"Could not delete file {artifact_id}: it kept moving")
+
+
+# --- Migration of files stored before the blob store -----------------------
+
+def _hash_file(path: str) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(file_storage.CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+
+def _place(source: str, destination: str) -> None:
+    """Put a copy of source at destination atomically: a hard link when possible, else a copy."""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(destination), file_storage.TEMP_PREFIX + uuid.uuid4().hex)
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except Exception:
+        file_storage.discard(temp_path)
+        raise
+
+
+def _migrate_one(db: Session, storage_root: str, artifact_id: int, relative_path: str) -> str:
+    """Move one legacy artifact into the blob store and commit. Returns the outcome counted in stats."""
+    legacy_path = os.path.join(storage_root, relative_path)
+    if not os.path.isfile(legacy_path):
+        return "missing"
+    size, content_hash = _hash_file(legacy_path)
+
+    blob = _acquire(db, content_hash)
+    created = False
+    if blob is None:
+        new_relative = blob_path(content_hash, os.path.splitext(relative_path)[1])
+        blob, created = _create_or_acquire(db, content_hash, new_relative, size)
+        if created:
+            _place(legacy_path, os.path.join(storage_root, new_relative))
+    outcome = "migrated" if created else "deduplicated"
+    blob_relative = blob.relative_path
+
+    FileArtifact = models.FileArtifact
+    moved = db.execute(
+        update(FileArtifact)
+        # Skips artifacts deleted (or moved by another worker) since the batch was read
+        .where(FileArtifact.id == artifact_id, FileArtifact.relative_path == relative_path)
+        .values(
+            relative_path=blob_relative,
+            stored_filename=os.path.basename(blob_relative),
+            content_hash=content_hash,
+            file_size=size,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        db.rollback()
+        if created:
+            discard_unreferenced(db.get_bind(), storage_root, content_hash, blob_relative)
+        return "skipped"
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        if created:
+            discard_unreferenced(db.get_bind(), storage_root, content_hash, blob_relative)
+        raise
+    file_storage.discard(legacy_path)
+    return outcome
+
+
+def migrate_legacy_files(
+    engine: Engine, storage_root: str, batch_size: int = MIGRATION_BATCH_SIZE, pause: float = 0
+) -> Dict[str, int]:
+    """
+    Move every artifact stored outside the blob store into it, one commit per
+    file, oldest first. Files with the same bytes collapse into one blob.
+    Returns how many were migrated, deduplicated, skipped, missing or failed.
+    """
+    FileArtifact = models.FileArtifact
+    stats = {"migrated": 0, "deduplicated": 0, "skipped": 0, "missing": 0, "failed": 0}
+    last_id = 0
+    while True:
+        with Session(bind=engine) as db:
+            batch = db.execute(
+                select(FileArtifact.id, FileArtifact.relative_path)
+                .where(
+                    FileArtifact.id > last_id,
+                    FileArtifact.relative_path != None,
+                    ~FileArtifact.relative_path.startswith(BLOB_PREFIX, autoescape=True),
+                )
+                .order_by(FileArtifact.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                return stats
+            for artifact_id, relative_path in batch:
+                last_id = artifact_id
+                try:
+                    stats[_migrate_one(db, storage_root, artifact_id, relative_path)] += 1
+                except Exception as e:
+                    db.rollback()
+                    stats["failed"] += 1
+                    logger.error(f"Could not move file {artifact_id} into the blob store: {e}")
+        if pause:
+            time.sleep(pause)
+
+
+def _run_migration(engine: Engine, storage_root: str) -> None:
+    try:
+        stats = migrate_legacy_files(engine, storage_root, pause=MIGRATION_PAUSE_SECONDS)
+        if any(stats.values()):
+            logger.info(f"Blob store migration finished: {stats}")
+    except Exception as e:
+        logger.error(f"Blob store migration failed: {e}")
+
+
+def start_migration(engine: Engine, storage_root: str) -> None:
+    """Migrate legacy files into the blob store in a background thread (once per process)."""
+    global _migration
+    if _migration is None or not _migration.is_alive():
+        _migration = threading.Thread(
+            target=_run_migration, args=(engine, storage_root), name="blob-store-migration", daemon=True
+        )
+        _migration.start()
@@ -0,0 +1,188 @@
+"""
+Grade a whole assignment from a student x question points matrix.
+
+All submissions, answers and question points for the assignment are read with
+three queries, totals are computed with NumPy, and the answer and submission
+updates are each sent as a single executemany (ORM bulk UPDATE by primary key)
+in one transaction.
+"""
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services import item_analysis, question_stats
+
+logger = logging.getLogger(__name__)
+
+
+def format_grade(total: float) -> str:
+    return f"{total:g}"
+
+
+def grade_matrix(
+    db: Session,
+    assignment_id: int,
+    student_ids: List[int],
+    question_ids: List[int],
+    points: List[List[Optional[int]]],
+    feedback: Optional[str] = None,
+) -> Dict:
+    """
+    Apply a points matrix to the submissions of an assignment and mark them GRADED.
+
+    Cells set to None keep the answer's current points. Cells without a stored
+    answer (the student skipped the question) are ignored, like in single-submission
+    grading. A submission's grade becomes its new points total unless the teacher
+    entered one (anything other than the total before this call), which is kept.
+    Raises ValueError for malformed input; commits on success and rolls back on
+    failure. Ownership of the assignment must be validated by the caller.
+    """
+    if len(set(student_ids)) != len(student_ids) or len(set(question_ids)) != len(question_ids):
+        raise ValueError("student_ids and question_ids must not contain duplicates")
+    if len(points) != len(student_ids) or any(len(row) != len(question_ids) for row in points):
+        raise ValueError(f"points must be a {len(student_ids)}x{len(question_ids)} matrix")
+
+    # None -> NaN so "unchanged" cells survive the vectorized math
+    matrix = np.array(
+        [[np.nan if p is None else p for p in row] for row in points],
+        dtype=np.float64
+    ).reshape(len(student_ids), len(question_ids))
+
+    question_rows = (
+        db.query(models.Question.id, models.Question.points, models.Question.parent_question_id)
+        .filter(models.Question.assignment_id == assignment_id)
+        .all()
+    )
+    question_points = {qid: pts for qid, pts, _ in question_rows}
+    roots = {qid: question_stats.lineage_root(qid, parent) for qid, _, parent in question_rows}
+    unknown = [qid for qid in question_ids if qid not in question_points]
+    if unknown:
+        raise ValueError(f"Questions not in assignment: {unknown}")
+
+    submissions = {}
+    current_grades = {}
+    for student_id, submission_id, grade in (
+        db.query(models.Submission.student_id, models.Submission.id, models.Submission.grade)
+        .filter(
+            models.Submission.assignment_id == assignment_id,
+            models.Submission.student_id.in_(student_ids)
+        )
+        .all()
+    ):
+        submissions[student_id] = submission_id
+        current_grades[student_id] = grade
+    missing = [sid for sid in student_ids if sid not in submissions]
+    if missing:
+        raise ValueError(f"No submission for students: {missing}")
+
+    max_per_question = np.array([question_points[qid] or 0 for qid in question_ids], dtype=np.float64)
+    if np.any(matrix < 0) or np.any(matrix > max_per_question):
+        raise ValueError("Points must be between 0 and each question's points")
+
+    # Every answer of the assignment's submissions, in one query
+    answers = (
+        db.query(
+            models.StudentAnswer.id,
+            models.Submission.student_id,
+            models.StudentAnswer.question_id,
+            models.StudentAnswer.points_awarded,
+            models.StudentAnswer.is_correct
+        )
+        .join(models.Submission, models.StudentAnswer.submission_id == models.Submission.id)
+        .filter(models.Submission.assignment_id == assignment_id)
+        .all()
+    )
+
+    row_of = {sid: i for i, sid in enumerate(student_ids)}
+    col_of = {qid: j for j, qid in enumerate(question_ids)}
+    current = np.zeros_like(matrix)
+    current_correct = np.zeros(matrix.shape, dtype=bool)
+    answer_ids = np.zeros(matrix.shape, dtype=np.int64)  # 0 = no stored answer
+    for answer_id, student_id, question_id, awarded, was_correct in answers:
+        i = row_of.get(student_id)
+        j = col_of.get(question_id)
+        if i is None or j is None:
+            continue
+        current[i, j] = awarded or 0
+        current_correct[i, j] = bool(was_correct)
+        answer_ids[i, j] = answer_id
+
+    has_answer = answer_ids > 0
+    to_update = has_answer & ~np.isnan(matrix)
+    final = np.where(to_update, matrix, current)
+    final[~has_answer] = 0
+    totals = final.sum(axis=1)
+    previous_totals = current.sum(axis=1)
+
+    # Answers to questions not in the matrix still count towards the total
+    if len(question_ids) < len(question_points):
+        outside = [qid for qid in question_points if qid not in col_of]
+        extra = np.zeros(len(student_ids))
+        for answer_id, student_id, question_id, awarded, _ in answers:
+            if question_id in question_points and question_id not in col_of and student_id in row_of:
+                extra[row_of[student_id]] += awarded or 0
+        totals = totals + extra
+        previous_totals = previous_totals + extra
+        max_points = float(max_per_question.sum() + sum(question_points[qid] or 0 for qid in outside))
+    else:
+        max_points = float(max_per_question.sum())
+
+    rows, cols = np.nonzero(to_update)
+    new_points = matrix[rows, cols].astype(np.int64)
+    # A question worth no points is never "correct" just because 0 >= 0
+    full = max_per_question[cols]
+    new_correct = (full > 0) & (new_points >= full)
+    answer_updates = [
+        {"id": int(answer_id), "points_awarded": int(awarded), "is_correct": bool(correct)}
+        for answer_id, awarded, correct in zip(answer_ids[rows, cols], new_points, new_correct)
+    ]
+    submission_updates = []
+    result_totals = []
+    for sid, total, previous in zip(student_ids, totals.tolist(), previous_totals.tolist()):
+        # Keep a grade the teacher entered; only a missing or previously computed one follows the points
+        grade = current_grades[sid]
+        update_row = {"id": submissions[sid], "status": models.SubmissionStatus.GRADED}
+        if not grade or grade == format_grade(previous):
+            grade = format_grade(total)
+            update_row["grade"] = grade
+        if feedback is not None:
+            update_row["feedback"] = feedback
+        submission_updates.append(update_row)
+        result_totals.append({
+            "student_id": sid,
+            "submission_id": submissions[sid],
+            "total_points": total,
+            "max_points": max_points,
+            "grade": grade
+        })
+
+    try:
+        if answer_updates:
+            db.execute(update(models.StudentAnswer), answer_updates)
+        if submission_updates:
+            db.execute(update(models.Submission), submission_updates)
+        item_analysis.record_bulk_change(db, [assignment_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # Per-question deltas for the running lineage stats
+    correct_delta = np.zeros(len(question_ids), dtype=np.int64)
+    points_delta = np.zeros(len(question_ids), dtype=np.float64)
+    np.add.at(correct_delta, cols, new_correct.astype(np.int64) - current_correct[rows, cols])
+    np.add.at(points_delta, cols, new_points - current[rows, cols])
+    for j, qid in enumerate(question_ids):
+        question_stats.record_regrade(roots[qid], int(correct_delta[j]), float(points_delta[j]))
+    question_stats.maybe_flush(db)
+
+    logger.debug(f"Bulk graded assignment {assignment_id}: {len(submission_updates)} submissions, {len(answer_updates)} answers")
+    return {
+        "assignment_id": assignment_id,
+        "answers_updated": len(answer_updates),
+        "totals": result_totals
+    }
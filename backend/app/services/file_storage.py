@@ -0,0 +1,114 @@
+"""
+Streaming writes of uploaded files into the storage tree.
+
+An upload is read in CHUNK_SIZE pieces and hashed with SHA-256 as it goes. Each
+piece is written to a temp file in the destination directory from a worker
+thread, so the event loop keeps serving other requests during a large textbook
+upload. The size limit is checked on every chunk, so the copy into storage stops
+at most one chunk past the limit. This does not bound the request itself:
+Starlette spools the whole multipart body to a temporary file before the handler
+runs, so oversized requests are rejected earlier by
+app.utils.upload_limit.UploadSizeLimitMiddleware.
+
+The temp file becomes the stored file with a single os.replace. The temp file
+is created in the destination directory, which keeps the rename on one
+filesystem and therefore atomic: readers (downloads, the training websocket)
+never see a partially written file. mkstemp creates it owner-only, so it gets
+the mode a plain open() would have given it (0666 minus the umask) first.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024
+TEMP_PREFIX = ".upload-"
+
+# Read once at import (os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StagedUpload:
+    temp_path: str
+    size: int
+    sha256: str
+
+
+def _write_chunk(out, digest, chunk: bytes) -> None:
+    # hashlib and file writes release the GIL, so this runs alongside the event loop
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _close(out) -> None:
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+
+
+def discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stage_upload(upload: UploadFile, directory: str, max_bytes: int) -> StagedUpload:
+    """
+    Stream an upload into a temp file in directory, hashing it on the way.
+    Raises UploadTooLarge (and leaves nothing behind) once it exceeds max_bytes.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+    out = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            await run_in_threadpool(_write_chunk, out, digest, chunk)
+        await run_in_threadpool(_close, out)
+    except BaseException:
+        out.close()
+        discard(temp_path)
+        raise
+    return StagedUpload(temp_path=temp_path, size=size, sha256=digest.hexdigest())
+
+
+async def hash_upload(upload: UploadFile) -> Tuple[int, str]:
+    """(size, SHA-256) of an upload without writing it anywhere; rewinds it afterwards."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        await run_in_threadpool(digest.update, chunk)
+    await upload.seek(0)
+    return size, digest.hexdigest()
+
+
+def commit(staged: StagedUpload, final_path: str) -> None:
+    """Atomically move a staged upload to its final path (on the same filesystem)."""
+    os.chmod(staged.temp_path, FILE_MODE)
+    os.replace(staged.temp_path, final_path)
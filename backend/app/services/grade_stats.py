@@ -0,0 +1,100 @@
+"""
+Grade listing with active-student counts.
+
+Counts come from one grouped left-join aggregate over the (school-scoped) grades,
+with subjects loaded in a second batched query, instead of a COUNT per grade.
+Results are cached per (school, page). ORM hooks record the schools of every
+Student, Grade and Subject row that is inserted, updated or deleted, and their
+cached listings are dropped once the transaction commits, whichever endpoint or
+script made the change. The TTL bounds staleness across worker processes.
+"""
+from typing import List, Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session, selectinload
+
+from app import models, schemas
+from app.utils.cache import LRUCache
+
+GRADES_CACHE_TTL_SECONDS = 60
+_SESSION_KEY = "grade_stats_changed_schools"
+
+# (school_id or None for every school, skip, limit) -> List[schemas.Grade]
+_grades_cache = LRUCache(maxsize=2000, ttl=GRADES_CACHE_TTL_SECONDS)
+
+
+def get_grades(
+    db: Session,
+    school_id: Optional[int],
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> List[schemas.Grade]:
+    """Grades of a school (every school if school_id is None) with active student counts, by id."""
+    key = (school_id, skip, limit)
+    cached = _grades_cache.get(key)
+    if cached is not None:
+        return cached
+
+    counts = select(
+        models.Student.grade_id, func.count(models.Student.id).label("student_count")
+    ).where(models.Student.active == True)
+    if school_id is not None:
+        counts = counts.where(models.Student.school_id == school_id)
+    counts = counts.group_by(models.Student.grade_id).subquery()
+
+    query = db.query(
+        models.Grade, func.coalesce(counts.c.student_count, 0)
+    ).outerjoin(
+        counts, counts.c.grade_id == models.Grade.id
+    ).options(selectinload(models.Grade.subjects))
+    if school_id is not None:
+        query = query.filter(models.Grade.school_id == school_id)
+    query = query.order_by(models.Grade.id).offset(max(skip, 0))
+    if limit is not None:
+        query = query.limit(max(limit, 0))
+
+    grades = []
+    for grade, student_count in query.all():
+        grade_data = schemas.Grade.model_validate(grade)
+        grade_data.student_count = student_count
+        grades.append(grade_data)
+    _grades_cache.set(key, grades)
+    return grades
+
+
+def invalidate_schools(school_ids) -> None:
+    """Drop cached listings of these schools and the all-schools listings."""
+    changed = set(school_ids)
+    if changed:
+        _grades_cache.invalidate_where(lambda key, _: key[0] is None or key[0] in changed)
+
+
+def clear() -> None:
+    _grades_cache.clear()
+
+
+def _record_change(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    schools = session.info.setdefault(_SESSION_KEY, set())
+    schools.add(target.school_id)
+    # A row moved to another school changes both listings
+    schools.update(v for v in inspect(target).attrs.school_id.history.deleted if v is not None)
+
+
+for _model in (models.Student, models.Grade, models.Subject):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _record_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    changed = session.info.pop(_SESSION_KEY, None)
+    if changed:
+        invalidate_schools(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_SESSION_KEY, None)
@@ -0,0 +1,335 @@
+"""
+Streaming gradebook export (one row per student, one column per assignment).
+
+Students and their submissions are read with a single joined query in student
+id order, fetched in chunks with yield_per (a server-side cursor on
+PostgreSQL), and pivoted on the fly: consecutive rows of one student become one
+gradebook row. Rows are encoded chunk by chunk as CSV, XLSX (a streamed zip of
+SpreadsheetML, no spreadsheet library needed) or Parquet (row groups, needs
+pyarrow), so memory stays flat regardless of the number of submissions.
+
+The row stream opens its own session: a StreamingResponse body runs after the
+request's dependencies have been cleaned up.
+"""
+import csv
+import io
+import logging
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app import database, models
+
+logger = logging.getLogger(__name__)
+
+FETCH_SIZE = 2000
+CSV_FLUSH_ROWS = 500
+XLSX_FLUSH_ROWS = 500
+PARQUET_ROW_GROUP_ROWS = 10000
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+FIXED_COLUMNS = ["student_id", "student_name", "class"]
+# Control characters are not allowed in XML 1.0 documents
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+@dataclass
+class GradebookColumns:
+    assignment_ids: List[int]
+    headers: List[str]
+
+    @property
+    def all_headers(self) -> List[str]:
+        return FIXED_COLUMNS + self.headers + ["average"]
+
+
+def gradebook_columns(
+    db: Session,
+    school_id: int,
+    class_id: Optional[int] = None,
+    grade_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+) -> GradebookColumns:
+    """Published assignments of the school (optionally narrowed) in creation order."""
+    query = db.query(models.Assignment.id, models.Assignment.title).join(
+        models.User, models.User.id == models.Assignment.teacher_id
+    ).filter(
+        models.User.school_id == school_id,
+        models.Assignment.status == models.AssignmentStatus.PUBLISHED
+    )
+    if class_id is not None:
+        class_grade_id = db.query(models.Class.grade_id).filter(models.Class.id == class_id).scalar()
+        query = query.filter(
+            (models.Assignment.class_id == class_id)
+            | ((models.Assignment.class_id == None) & (models.Assignment.grade_id == class_grade_id))
+        )
+    if grade_id is not None:
+        query = query.filter(models.Assignment.grade_id == grade_id)
+    if subject_id is not None:
+        query = query.filter(models.Assignment.subject_id == subject_id)
+    if teacher_id is not None:
+        query = query.filter(models.Assignment.teacher_id == teacher_id)
+    rows = query.order_by(models.Assignment.id).all()
+    return GradebookColumns(
+        assignment_ids=[a_id for a_id, _ in rows],
+        headers=[f"{title or 'Assignment'} (#{a_id})" for a_id, title in rows],
+    )
+
+
+def parse_score(grade: Optional[str]):
+    """Numeric grades as floats, anything else (letter grades) as the raw string."""
+    if grade is None or grade == "":
+        return None
+    try:
+        return float(grade)
+    except ValueError:
+        return grade
+
+
+def iter_rows(
+    school_id: int,
+    columns: GradebookColumns,
+    class_id: Optional[int] = None,
+    grade_id: Optional[int] = None,
+) -> Iterator[list]:
+    """Gradebook rows (without the header) for the school's students."""
+    position = {a_id: i for i, a_id in enumerate(columns.assignment_ids)}
+    width = len(position)
+    stmt = select(
+        models.Student.id,
+        models.Student.name,
+        models.Class.name,
+        models.Submission.assignment_id,
+        models.Submission.grade
+    ).outerjoin(
+        models.Class, models.Class.id == models.Student.class_id
+    ).outerjoin(
+        models.Submission, and_(
+            models.Submission.student_id == models.Student.id,
+            models.Submission.grade != None
+        )
+    ).where(models.Student.school_id == school_id)
+    if class_id is not None:
+        stmt = stmt.where(models.Student.class_id == class_id)
+    if grade_id is not None:
+        stmt = stmt.where(models.Student.grade_id == grade_id)
+    # Latest submission wins when a student has several for one assignment
+    stmt = stmt.order_by(models.Student.id, models.Submission.id).execution_options(yield_per=FETCH_SIZE)
+
+    db = database.SessionLocal()
+    try:
+        current_id = None
+        row = None
+        # Core result on the session's connection: skips ORM row processing
+        for student_id, name, class_name, assignment_id, grade in db.connection().execute(stmt):
+            if student_id != current_id:
+                if row is not None:
+                    yield _finish(row)
+                current_id = student_id
+                row = [student_id, name, class_name] + [None] * width
+            i = position.get(assignment_id)
+            if i is not None:
+                row[len(FIXED_COLUMNS) + i] = parse_score(grade)
+        if row is not None:
+            yield _finish(row)
+    finally:
+        db.close()
+
+
+def _finish(row: list) -> list:
+    numeric = [v for v in row[len(FIXED_COLUMNS):] if isinstance(v, float)]
+    row.append(round(sum(numeric) / len(numeric), 2) if numeric else None)
+    return row
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are handed out in chunks (not seekable)."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _batched(rows: Iterator[list], size: int) -> Iterator[List[list]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_csv(headers: Sequence[str], rows: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # BOM so Excel opens UTF-8 names correctly
+    writer.writerow(headers)
+    for batch in _batched(rows, CSV_FLUSH_ROWS):
+        writer.writerows(
+            [(int(v) if v.is_integer() else v) if isinstance(v, float) else v for v in row] for row in batch
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Gradebook" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values: Sequence) -> str:
+    cells = []
+    for v in values:
+        if v is None:
+            cells.append("<c/>")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            cells.append(f"<c><v>{v}</v></c>")
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(_XML_ILLEGAL.sub("", str(v)))}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def stream_xlsx(headers: Sequence[str], rows: Iterator[list]) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(headers)
+            ).encode("utf-8"))
+            for batch in _batched(rows, XLSX_FLUSH_ROWS):
+                sheet.write("".join(_xlsx_row(row) for row in batch).encode("utf-8"))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def stream_parquet(headers: Sequence[str], rows: Iterator[list]) -> Iterator[bytes]:
+    """Parquet with one row group per PARQUET_ROW_GROUP_ROWS students; scores as float64 (letter grades become null)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    score_count = len(headers) - len(FIXED_COLUMNS)
+    schema = pa.schema(
+        [pa.field("student_id", pa.int64()), pa.field("student_name", pa.string()), pa.field("class", pa.string())]
+        + [pa.field(h, pa.float64()) for h in headers[len(FIXED_COLUMNS):]]
+    )
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in _batched(rows, PARQUET_ROW_GROUP_ROWS):
+            arrays = [
+                pa.array([r[0] for r in batch], pa.int64()),
+                pa.array([r[1] for r in batch], pa.string()),
+                pa.array([r[2] for r in batch], pa.string()),
+            ] + [
+                pa.array([r[len(FIXED_COLUMNS) + j] if isinstance(r[len(FIXED_COLUMNS) + j], float) else None for r in batch], pa.float64())
+                for j in range(score_count)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export(
+    fmt: str,
+    school_id: int,
+    columns: GradebookColumns,
+    class_id: Optional[int] = None,
+    grade_id: Optional[int] = None,
+) -> Tuple[Iterator[bytes], str]:
+    """(body iterator, media type) for a StreamingResponse. Raises ValueError for unsupported formats."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {sorted(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise ValueError("Parquet export needs the pyarrow package")
+    rows = iter_rows(school_id, columns, class_id=class_id, grade_id=grade_id)
+    encoder = {"csv": stream_csv, "xlsx": stream_xlsx, "parquet": stream_parquet}[fmt]
+    logger.debug(f"Gradebook export ({fmt}) for school {school_id}: {len(columns.assignment_ids)} assignments")
+    return encoder(columns.all_headers, rows), FORMATS[fmt]
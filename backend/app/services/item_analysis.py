@@ -0,0 +1,368 @@
+"""
+Classical item analysis over StudentAnswer.
+
+Answers are read grouped by (question, selected option): the database returns
+a few hundred rows, each with its answer count, points sum and the packed
+submission id and correctness of every answer, which are parsed in one pass
+into a dense students x items correctness matrix. Every statistic is then
+computed column-wise with NumPy:
+
+- difficulty index: share of students answering the item correctly
+- discrimination: point-biserial correlation between the item and the rest
+  score (total without the item), so an item is not correlated with itself
+- distractor frequencies: how often each QuestionOption was selected
+- Cronbach's alpha (KR-20 on dichotomous items) for the whole assignment
+
+Bank questions are analysed across every clone (parent_question_id), using each
+student's total on the assignment the clone belongs to. In both reports
+mean_score is the mean total points per submission.
+
+Reports are cached per assignment or bank question. ORM hooks record the
+assignments and questions behind every StudentAnswer and Question written, and
+reports built from them are dropped once the transaction commits; bulk writes
+call record_bulk_change(). Bank reports are also keyed by the question's
+lineage, so new clones rebuild them. The TTL bounds staleness across worker
+processes.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, String, cast, event, func, inspect, select, text
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_TTL_SECONDS = 60
+_SESSION_KEY = "item_analysis_changes"
+
+# ("assignment" | "question", id) -> (lineage or None, assignment ids, question ids, report dict)
+_report_cache = LRUCache(maxsize=512, ttl=REPORT_CACHE_TTL_SECONDS)
+
+
+def _none_if_nan(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def point_biserial(items: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    Corrected point-biserial for each column of `items` (students x items)
+    against `totals` minus that column. NaN where either side has no variance.
+    """
+    rest = totals[:, None] - items
+    item_c = items - items.mean(axis=0)
+    rest_c = rest - rest.mean(axis=0)
+    denom = np.sqrt((item_c ** 2).sum(axis=0) * (rest_c ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denom > 0, (item_c * rest_c).sum(axis=0) / denom, np.nan)
+
+
+def cronbach_alpha(items: np.ndarray) -> float:
+    """Cronbach's alpha of a students x items score matrix (NaN if undefined)."""
+    students, k = items.shape
+    if k < 2 or students < 2:
+        return float("nan")
+    total_var = items.sum(axis=1).var(ddof=1)
+    if total_var == 0:
+        return float("nan")
+    return float(k / (k - 1) * (1 - items.var(axis=0, ddof=1).sum() / total_var))
+
+
+def analyze_matrix(correct: np.ndarray, totals: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized statistics for a students x items 0/1 matrix. `totals` defaults
+    to the row sums; pass the full-assignment totals when `correct` holds a
+    subset of the assignment's items.
+    """
+    correct = np.asarray(correct, dtype=np.float64)
+    if totals is None:
+        totals = correct.sum(axis=1)
+    if correct.shape[0] == 0:
+        empty = np.full(correct.shape[1], np.nan)
+        return {"difficulty": empty, "discrimination": empty, "alpha": float("nan")}
+    return {
+        "difficulty": correct.mean(axis=0),
+        "discrimination": point_biserial(correct, np.asarray(totals, dtype=np.float64)),
+        "alpha": cronbach_alpha(correct),
+    }
+
+
+def _answer_groups(db: Session, *criteria) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Answers matching `criteria`, grouped by question and selected option. Returns
+    the groups as an int64 array of (question_id, selected_option_id or 0,
+    answers, points sum) and, for every answer in group order, its group index,
+    submission id and correctness (0/1).
+    """
+    Answer = models.StudentAnswer
+    if db.get_bind().dialect.name == "mysql":
+        # GROUP_CONCAT silently truncates at 1024 bytes by default
+        db.execute(text("SET SESSION group_concat_max_len = 4294967295"))
+    # One comma-separated string per group instead of one row per answer
+    packed = cast(Answer.submission_id * 2 + func.coalesce(cast(Answer.is_correct, Integer), 0), String)
+    rows = db.execute(
+        select(
+            Answer.question_id,
+            func.coalesce(Answer.selected_option_id, 0),
+            func.count(),
+            func.coalesce(func.sum(Answer.points_awarded), 0),
+            func.aggregate_strings(packed, ",")
+        ).where(*criteria).group_by(Answer.question_id, Answer.selected_option_id)
+    ).all()
+    groups = np.array([row[:4] for row in rows], dtype=np.int64).reshape(len(rows), 4)
+    codes = np.fromstring(",".join(row[4] for row in rows), dtype=np.int64, sep=",") if rows else np.zeros(0, dtype=np.int64)
+    if len(codes) != groups[:, 2].sum():
+        raise RuntimeError(f"Packed answers were cut short ({len(codes)} of {groups[:, 2].sum()})")
+    group_idx = np.repeat(np.arange(len(rows)), groups[:, 2])
+    return groups, group_idx, codes >> 1, codes & 1
+
+
+def _distractors(
+    option_rows: List[Tuple[int, int, str, bool]],
+    option_counts: Dict[int, int],
+    responses_by_question: Dict[int, int],
+) -> Dict[int, List[Dict]]:
+    """
+    Selection counts per option. `option_rows` are (option_id, question_id, text,
+    is_correct); `option_counts` maps option ids to how often they were selected.
+    """
+    result = {}
+    for option_id, question_id, text, is_correct in option_rows:
+        count = option_counts.get(option_id, 0)
+        responses = responses_by_question.get(question_id, 0)
+        result.setdefault(question_id, []).append({
+            "option_id": option_id,
+            "text": text,
+            "is_correct": bool(is_correct),
+            "count": count,
+            "share": count / responses if responses else 0.0,
+        })
+    return result
+
+
+def analyze_assignment(db: Session, assignment_id: int) -> Dict:
+    """Item analysis for every question of one assignment (cached per version)."""
+    cache_key = ("assignment", assignment_id)
+    cached = _report_cache.get(cache_key)
+    if cached is not None:
+        return cached[3]
+
+    questions = db.query(models.Question.id, models.Question.points).filter(
+        models.Question.assignment_id == assignment_id
+    ).order_by(models.Question.id).all()
+    question_ids = np.array([q[0] for q in questions], dtype=np.int64)
+    # Every answer to the assignment's questions belongs to one of its submissions
+    groups, group_idx, answer_submissions, answer_correct = _answer_groups(
+        db, models.StudentAnswer.question_id.in_(question_ids.tolist())
+    )
+
+    submission_ids, student_idx = np.unique(answer_submissions, return_inverse=True)
+    group_item = np.searchsorted(question_ids, groups[:, 0])
+    correct = np.zeros((len(submission_ids), len(question_ids)), dtype=np.float64)
+    correct[student_idx, group_item[group_idx]] = answer_correct
+
+    stats = analyze_matrix(correct)
+    responses = np.bincount(group_item, weights=groups[:, 2], minlength=len(question_ids)).astype(np.int64)
+    point_sums = np.bincount(group_item, weights=groups[:, 3], minlength=len(question_ids))
+    students = len(submission_ids)
+    mean_points = point_sums / students if students else np.zeros(len(question_ids))
+
+    option_rows = db.query(
+        models.QuestionOption.id,
+        models.QuestionOption.question_id,
+        models.QuestionOption.text,
+        models.QuestionOption.is_correct
+    ).filter(
+        models.QuestionOption.question_id.in_(question_ids.tolist())
+    ).order_by(models.QuestionOption.question_id, models.QuestionOption.id).all()
+    responses_by_question = dict(zip(question_ids.tolist(), responses.tolist()))
+    option_counts = {option_id: count for _, option_id, count, _ in groups.tolist() if option_id}
+    distractors = _distractors(option_rows, option_counts, responses_by_question)
+
+    items = [
+        {
+            "question_id": qid,
+            "responses": int(responses[j]),
+            "difficulty": _none_if_nan(stats["difficulty"][j]),
+            "discrimination": _none_if_nan(stats["discrimination"][j]),
+            "mean_points": float(mean_points[j]),
+            "max_points": questions[j][1],
+            "distractors": distractors.get(qid, []),
+        }
+        for j, qid in enumerate(question_ids.tolist())
+    ]
+    report = {
+        "assignment_id": assignment_id,
+        "question_id": None,
+        "students": students,
+        "mean_score": float(point_sums.sum() / students) if students else None,
+        "cronbach_alpha": _none_if_nan(stats["alpha"]),
+        "items": items,
+    }
+    _report_cache.set(cache_key, (None, frozenset([assignment_id]), frozenset(question_ids.tolist()), report))
+    return report
+
+
+def analyze_bank_question(db: Session, question_id: int) -> Dict:
+    """
+    Item analysis of a bank question pooled over all its clones. Discrimination
+    uses each student's total on the assignment the clone was answered in, and
+    clone options are mapped back onto the source question's options by position.
+    """
+    lineage = db.query(models.Question.id, models.Question.assignment_id).filter(
+        (models.Question.id == question_id) | (models.Question.parent_question_id == question_id)
+    ).all()
+    assignment_ids = sorted({a for _, a in lineage if a is not None})
+    cache_key = ("question", question_id)
+    lineage_key = tuple(sorted(q for q, _ in lineage))
+    cached = _report_cache.get(cache_key)
+    if cached is not None and cached[0] == lineage_key:
+        return cached[3]
+
+    lineage_ids = np.array(lineage_key, dtype=np.int64)
+    groups, group_idx, answer_submissions, answer_correct = _answer_groups(
+        db, models.StudentAnswer.submission_id.in_(
+            select(models.Submission.id).where(models.Submission.assignment_id.in_(assignment_ids))
+        )
+    )
+    submission_ids, student_idx = np.unique(answer_submissions, return_inverse=True)
+    students = len(submission_ids)
+    # Correct counts for discrimination (0/1 items)
+    totals = np.bincount(student_idx, weights=answer_correct, minlength=students)
+
+    item_groups = np.isin(groups[:, 0], lineage_ids)
+    in_item = item_groups[group_idx]
+    item = np.zeros(students, dtype=np.float64)
+    item[student_idx[in_item]] = answer_correct[in_item]
+    responses = int(groups[item_groups, 2].sum())
+
+    stats = analyze_matrix(item[:, None], totals)
+
+    # Options of the source and every clone, ranked within their question
+    option_rows = db.query(
+        models.QuestionOption.id,
+        models.QuestionOption.question_id,
+        models.QuestionOption.text,
+        models.QuestionOption.is_correct
+    ).filter(
+        models.QuestionOption.question_id.in_(lineage_ids.tolist())
+    ).order_by(models.QuestionOption.question_id, models.QuestionOption.id).all()
+    by_question: Dict[int, List[int]] = {}
+    for option_id, qid, _, _ in option_rows:
+        by_question.setdefault(qid, []).append(option_id)
+    source_options = by_question.get(question_id, [])
+    option_map = {}
+    for qid, option_ids in by_question.items():
+        for rank, option_id in enumerate(option_ids):
+            if rank < len(source_options):
+                option_map[option_id] = source_options[rank]
+    option_counts: Dict[int, int] = {}
+    for _, option_id, count, _ in groups[item_groups].tolist():
+        source_option = option_map.get(option_id)
+        if source_option is not None:
+            option_counts[source_option] = option_counts.get(source_option, 0) + count
+    source_rows = [o for o in option_rows if o[1] == question_id]
+    distractors = _distractors(source_rows, option_counts, {question_id: responses})
+
+    source_points = db.query(models.Question.points).filter(models.Question.id == question_id).scalar()
+    report = {
+        "assignment_id": None,
+        "question_id": question_id,
+        "students": students,
+        "mean_score": float(groups[:, 3].sum() / students) if students else None,
+        "cronbach_alpha": None,
+        "items": [{
+            "question_id": question_id,
+            "responses": responses,
+            "difficulty": _none_if_nan(stats["difficulty"][0]),
+            "discrimination": _none_if_nan(stats["discrimination"][0]),
+            "mean_points": float(groups[item_groups, 3].sum() / students) if students else 0.0,
+            "max_points": source_points,
+            "distractors": distractors.get(question_id, []),
+        }],
+    }
+    logger.debug(f"Item analysis for bank question {question_id}: {len(lineage_ids)} copies, {len(submission_ids)} submissions")
+    _report_cache.set(cache_key, (lineage_key, frozenset(assignment_ids), frozenset(lineage_key), report))
+    return report
+
+
+def invalidate(assignment_ids=(), question_ids=()) -> None:
+    """Drop cached reports built from any of these assignments or questions."""
+    assignments, questions = set(assignment_ids), set(question_ids)
+    if assignments or questions:
+        _report_cache.invalidate_where(
+            lambda key, entry: not assignments.isdisjoint(entry[1]) or not questions.isdisjoint(entry[2])
+        )
+
+
+def clear() -> None:
+    _report_cache.clear()
+
+
+def _changes(session: Session) -> Dict[str, set]:
+    return session.info.setdefault(_SESSION_KEY, {"assignments": set(), "questions": set(), "submissions": set()})
+
+
+def record_bulk_change(db: Session, assignment_ids) -> None:
+    """Account for answers written with a bulk UPDATE (no mapper events). Applied on commit."""
+    _changes(db)["assignments"].update(assignment_ids)
+
+
+def record_question_change(db: Session, question_ids) -> None:
+    """Account for questions moved between lineages with a bulk UPDATE (no mapper events). Applied on commit."""
+    _changes(db)["questions"].update(question_ids)
+
+
+def _record_answer(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    changes = _changes(session)
+    changes["submissions"].add(target.submission_id)
+    changes["questions"].add(target.question_id)
+
+
+def _record_question(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    changes = _changes(session)
+    changes["questions"].update(q for q in (target.id, target.parent_question_id) if q is not None)
+    changes["assignments"].add(target.assignment_id)
+    changes["assignments"].update(v for v in inspect(target).attrs.assignment_id.history.deleted if v is not None)
+
+
+for _model, _hook in ((models.StudentAnswer, _record_answer), (models.Question, _record_question)):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _hook)
+
+
+@event.listens_for(Session, "after_flush")
+def _resolve_submissions(session, flush_context) -> None:
+    # Answers only know their submission; map those to assignments while SQL is still allowed
+    changes = session.info.get(_SESSION_KEY)
+    if not changes or not changes["submissions"]:
+        return
+    pending, changes["submissions"] = changes["submissions"], set()
+    for obj in session.deleted:
+        if isinstance(obj, models.Submission) and obj.id in pending:
+            changes["assignments"].add(obj.assignment_id)
+    changes["assignments"].update(session.connection().execute(
+        select(models.Submission.assignment_id).where(models.Submission.id.in_(pending))
+    ).scalars())
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    changes = session.info.pop(_SESSION_KEY, None)
+    if changes:
+        invalidate(changes["assignments"], changes["questions"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_SESSION_KEY, None)
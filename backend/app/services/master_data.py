@@ -0,0 +1,85 @@
+"""
+Process-wide cache of master data: countries, curriculums and school types.
+
+These lists almost never change but back every school form. Each worker keeps
+them in memory, keyed by the version stamp stored in cache_versions. The
+super-admin create/update/delete endpoints bump the stamp in the same
+transaction as their change. Every read compares the stamp with a single
+primary-key lookup, so an edit made through any worker invalidates the lists
+in all of them. The stamp also forms the ETag, which lets browsers revalidate
+with If-None-Match and get a 304 instead of the list.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.utils.cache import LRUCache
+
+MASTER_DATA_SCOPE = "master_data"
+# Authenticated endpoints: browsers may reuse a response for a minute, then revalidate by ETag
+CACHE_CONTROL = "private, max-age=60, must-revalidate"
+
+COUNTRIES = "countries"
+CURRICULUMS = "curriculums"
+SCHOOL_TYPES = "school-types"
+
+# (kind, country_id, version) -> list of schemas; old versions age out of the LRU
+_cache = LRUCache(maxsize=256)
+
+
+def current_version(db: Session) -> int:
+    version = db.query(models.CacheVersion.version).filter(
+        models.CacheVersion.name == MASTER_DATA_SCOPE
+    ).scalar()
+    return version or 0
+
+
+def bump_version(db: Session) -> None:
+    """Invalidate the master data caches of every worker once the caller commits."""
+    result = db.execute(
+        update(models.CacheVersion)
+        .where(models.CacheVersion.name == MASTER_DATA_SCOPE)
+        .values(version=models.CacheVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if not result.rowcount:
+        db.add(models.CacheVersion(name=MASTER_DATA_SCOPE, version=1, updated_at=datetime.utcnow()))
+
+
+def _load(db: Session, kind: str, country_id: Optional[int]) -> list:
+    if kind == COUNTRIES:
+        return [schemas.Country.model_validate(c) for c in db.query(models.Country).order_by(models.Country.id)]
+    model, schema = {
+        CURRICULUMS: (models.Curriculum, schemas.Curriculum),
+        SCHOOL_TYPES: (models.SchoolType, schemas.SchoolType),
+    }[kind]
+    query = db.query(model)
+    if country_id:
+        query = query.filter(model.country_id == country_id)
+    return [schema.model_validate(row) for row in query.order_by(model.id)]
+
+
+def get(db: Session, kind: str, country_id: Optional[int] = None) -> Tuple[List, str]:
+    """The list of `kind` (optionally one country's) and its ETag."""
+    country_id = country_id or None
+    version = current_version(db)
+    key = (kind, country_id, version)
+    items = _cache.get(key)
+    if items is None:
+        items = _load(db, kind, country_id)
+        _cache.set(key, items)
+    etag = f'"{kind}-{country_id or "all"}-v{version}"'
+    return items, etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def clear() -> None:
+    _cache.clear()
@@ -0,0 +1,186 @@
+"""
+Typeahead name search over students (by name) and users (by username).
+
+Each lookup runs in two steps, always scoped to one school and, for teachers,
+to the students they can see:
+
+1. Prefix matches (case-insensitive), read in name order from the
+   (school_id, lower(name)) index. The scan stops once the page is full.
+2. If the page is not full, substring matches through a trigram index:
+   - SQLite: an external-content FTS5 table with the trigram tokenizer
+     (`students_fts` / `users_fts`), kept in sync by triggers. Queries need at
+     least 3 characters.
+   - PostgreSQL: pg_trgm GiST indexes. They also give fuzzy (similarity)
+     matches ordered by trigram distance, so typos still find the name.
+   - Other dialects, or when the index could not be created: an unindexed
+     LIKE '%q%' within the school.
+"""
+import logging
+from typing import Collection, Dict, List, Optional
+
+from sqlalchemy import Integer, column, func, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.student_directory import PREFIX_UPPER_BOUND, escape_like
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+TRIGRAM_MIN_LENGTH = 3
+
+# table -> (FTS table, indexed column)
+_FTS_TABLES = {"students": ("students_fts", "name"), "users": ("users_fts", "username")}
+
+_SQLITE_DDL = []
+for _table, (_fts, _col) in _FTS_TABLES.items():
+    _SQLITE_DDL += [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {_fts} USING fts5(
+            {_col}, content='{_table}', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_fts}_ai AFTER INSERT ON {_table} BEGIN
+            INSERT INTO {_fts}(rowid, {_col}) VALUES (new.id, new.{_col});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_fts}_ad AFTER DELETE ON {_table} BEGIN
+            INSERT INTO {_fts}({_fts}, rowid, {_col}) VALUES ('delete', old.id, old.{_col});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_fts}_au AFTER UPDATE OF {_col} ON {_table} BEGIN
+            INSERT INTO {_fts}({_fts}, rowid, {_col}) VALUES ('delete', old.id, old.{_col});
+            INSERT INTO {_fts}(rowid, {_col}) VALUES (new.id, new.{_col});
+        END
+        """,
+    ]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_trgm ON students USING GIST (name gist_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING GIST (username gist_trgm_ops)",
+]
+
+# Engines whose trigram index is in place (str(engine.url) -> dialect)
+_indexed: Dict[str, str] = {}
+
+
+def ensure_name_search_index(engine: Engine) -> None:
+    """Create the trigram indexes (and FTS5 sync triggers) if missing (idempotent)."""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                existing = {name for (name,) in conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('students_fts', 'users_fts')"
+                ))}
+                for ddl in _SQLITE_DDL:
+                    conn.execute(text(ddl))
+                for fts, _ in _FTS_TABLES.values():
+                    if fts not in existing:
+                        # Index rows that existed before the FTS table
+                        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+            else:
+                logger.info(f"Trigram name search not available for dialect '{dialect}', using LIKE")
+                return
+        _indexed[str(engine.url)] = dialect
+    except Exception as e:
+        logger.error(f"Could not create name search index: {e}")
+
+
+def _trigram_dialect(db: Session) -> Optional[str]:
+    return _indexed.get(str(db.get_bind().url))
+
+
+def _search(db: Session, stmt, in_school, table: str, name_col, id_col, q: str, limit: int) -> List[dict]:
+    # A range on lower(name) walks the (school_id, lower(name)) index and stops after `limit` rows
+    key = func.lower(name_col)
+    lowered = q.lower()
+    rows = [dict(r) for r in db.execute(
+        stmt.where(in_school, key >= lowered, key < lowered + PREFIX_UPPER_BOUND).order_by(key, id_col).limit(limit)
+    ).mappings()]
+    remaining = limit - len(rows)
+    if remaining <= 0:
+        return rows
+
+    seen = [r["id"] for r in rows]
+    rest = stmt.where(id_col.notin_(seen)) if seen else stmt
+    dialect = _trigram_dialect(db)
+    contains = "%" + escape_like(q.lower()) + "%"
+    if dialect == "sqlite":
+        if len(q) < TRIGRAM_MIN_LENGTH:
+            return rows
+        fts, _ = _FTS_TABLES[table]
+        hits = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match").bindparams(
+            match='"' + q.replace('"', '""') + '"'
+        ).columns(column("rowid", Integer)).subquery()
+        # likely() keeps SQLite from walking the school index (for its name order) instead of
+        # looking up the few FTS hits by primary key
+        rest = rest.where(func.likely(in_school), id_col.in_(select(hits.c.rowid))).order_by(name_col, id_col)
+    elif dialect == "postgresql":
+        # `%` is pg_trgm's similarity operator; `<->` its distance (GiST-ordered)
+        rest = rest.where(in_school, or_(
+            func.lower(name_col).like(contains, escape="\\"), name_col.op("%")(q)
+        )).order_by(name_col.op("<->")(q), id_col)
+    else:
+        rest = rest.where(in_school, func.lower(name_col).like(contains, escape="\\")).order_by(name_col, id_col)
+    rows += [dict(r) for r in db.execute(rest.limit(remaining)).mappings()]
+    return rows
+
+
+def search_students(
+    db: Session,
+    school_id: int,
+    q: str,
+    limit: int = 10,
+    class_ids: Optional[Collection[int]] = None,
+    grade_ids: Optional[Collection[int]] = None,
+    active_only: bool = False,
+) -> List[dict]:
+    """
+    Students of a school whose name starts with (then contains) q. When
+    class_ids/grade_ids are given, only students in those classes, or without a
+    class in those grades (teacher visibility), are searched.
+    """
+    q = (q or "").strip()
+    if not q:
+        return []
+    Student, User = models.Student, models.User
+    stmt = select(
+        Student.id, Student.name, User.username, Student.user_id, Student.grade_id, Student.class_id, Student.active
+    ).outerjoin(User, User.id == Student.user_id)
+    if class_ids is not None or grade_ids is not None:
+        stmt = stmt.where(or_(
+            Student.class_id.in_(list(class_ids or [])),
+            (Student.class_id == None) & Student.grade_id.in_(list(grade_ids or [])),
+        ))
+    if active_only:
+        stmt = stmt.where(Student.active == True)
+    return _search(db, stmt, Student.school_id == school_id, "students", Student.name, Student.id, q, max(1, min(limit, MAX_RESULTS)))
+
+
+def search_users(
+    db: Session,
+    school_id: int,
+    q: str,
+    limit: int = 10,
+    roles: Optional[Collection[models.UserRole]] = None,
+) -> List[dict]:
+    """Users of a school whose username starts with (then contains) q, optionally of some roles."""
+    q = (q or "").strip()
+    if not q:
+        return []
+    User = models.User
+    stmt = select(
+        User.id, User.username.label("name"), User.username, User.role, User.active
+    )
+    if roles:
+        stmt = stmt.where(User.role.in_(list(roles)))
+    return _search(db, stmt, User.school_id == school_id, "users", User.username, User.id, q, max(1, min(limit, MAX_RESULTS)))
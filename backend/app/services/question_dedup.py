@@ -0,0 +1,424 @@
+"""
+Near-duplicate detection for bank questions with MinHash + LSH.
+
+Question text is normalized (case, accents folded by NFKC, punctuation and
+whitespace collapsed) and split into character 5-gram shingles. A 128-value
+MinHash signature estimates Jaccard similarity between shingle sets; it is cut
+into 16 bands of 8 rows (candidates from roughly 0.7 similarity, so templated
+questions that merely share phrasing rarely collide). Each band is hashed,
+together with its band number, into question_lsh_buckets, so finding
+candidates for a new question is one indexed lookup per insert batch,
+independent of the bank size. Candidates are confirmed by comparing signatures.
+
+Only canonical questions get buckets; a near-duplicate is recorded with
+duplicate_of_id pointing at its canonical question. Depending on
+QUESTION_DEDUP_MODE it is then hidden from bank listings ("flag") or attached to
+the canonical question's lineage via parent_question_id ("merge").
+
+Banks that predate the index are fingerprinted by backfill(), run in a
+background thread at startup (when the mode is not "off") or from
+scripts/backfill_question_fingerprints.py, never inside a request. Until then
+new questions are only compared with the part of the bank already indexed.
+
+Candidates are limited to the same teacher and subject. Deleting a canonical
+question hands its role to its earliest remaining duplicate, including the
+parent_question_id of merged duplicates (SQLite does not enforce the ON DELETE
+actions of the fingerprint table, and the questions foreign key would reject
+the delete on PostgreSQL, so this is done by a mapper hook before the DELETE).
+Editing a question's text re-fingerprints it with reindex_question().
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.config import settings
+from app.services import item_analysis
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_PAUSE_SECONDS = 0.5  # between teachers, in the startup thread
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes. The
+# coefficients are derived from fixed strings so stored signatures stay
+# comparable across processes and library versions.
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_A = np.array([
+    int.from_bytes(hashlib.blake2b(f"minhash-a-{i}".encode(), digest_size=4).digest(), "little") >> 1 | 1
+    for i in range(NUM_PERM)
+], dtype=np.uint64)
+_B = np.array([
+    int.from_bytes(hashlib.blake2b(f"minhash-b-{i}".encode(), digest_size=4).digest(), "little")
+    for i in range(NUM_PERM)
+], dtype=np.uint64)
+
+_backfill: Optional[threading.Thread] = None
+
+
+def normalize_text(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def shingles(text: Optional[str]) -> Set[str]:
+    normalized = normalize_text(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: Optional[str]) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of a question text."""
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64
+    )
+    # (shingles x permutations) fits in uint64: a < 2**31, x < 2**32
+    return ((hashes[:, None] * _A[None, :] + _B[None, :]) % _PRIME).min(axis=0)
+
+
+def band_hashes(sig: np.ndarray) -> List[int]:
+    """One signed 63-bit hash per band (fits a BIGINT column)."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(), digest_size=8).digest(),
+            "little"
+        ) & 0x7FFFFFFFFFFFFFFF
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def _to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u8").tobytes()
+
+
+def _from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<u8")
+
+
+def _index_batch(
+    db: Session,
+    teacher_id: int,
+    questions: Sequence[Tuple[int, Optional[str], Optional[int]]],
+    threshold: float,
+) -> Dict[int, int]:
+    """
+    Fingerprint (question_id, text, subject_id) rows in id order and return
+    {duplicate question id: canonical question id}. Does not commit.
+    """
+    sigs = {q_id: signature(text) for q_id, text, _ in questions}
+    bands = {q_id: band_hashes(sig) for q_id, sig in sigs.items()}
+    batch_subjects = {subject_id for _, _, subject_id in questions}
+
+    # Candidate canonical questions already in the index: one lookup for the batch
+    Fingerprint = models.QuestionFingerprint
+    all_hashes = {h for hashes in bands.values() for h in hashes}
+    subject_filter = [Fingerprint.subject_id.in_(batch_subjects - {None})]
+    if None in batch_subjects:
+        subject_filter.append(Fingerprint.subject_id == None)
+    bucket_rows = db.query(
+        models.QuestionLSHBucket.band,
+        models.QuestionLSHBucket.bucket_hash,
+        models.QuestionLSHBucket.question_id
+    ).join(
+        Fingerprint, Fingerprint.question_id == models.QuestionLSHBucket.question_id
+    ).filter(
+        models.QuestionLSHBucket.teacher_id == teacher_id,
+        models.QuestionLSHBucket.bucket_hash.in_(all_hashes),
+        or_(*subject_filter)
+    ).all() if all_hashes else []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for band, bucket_hash, q_id in bucket_rows:
+        buckets.setdefault((band, bucket_hash), []).append(q_id)
+
+    candidate_ids = {q_id for _, _, q_id in bucket_rows}
+    known_sigs = {}
+    known_subjects: Dict[int, Optional[int]] = {}
+    if candidate_ids:
+        for q_id, raw, subject_id in db.query(
+            Fingerprint.question_id, Fingerprint.signature, Fingerprint.subject_id
+        ).join(
+            models.Question, models.Question.id == Fingerprint.question_id
+        ).filter(Fingerprint.question_id.in_(candidate_ids)).all():
+            known_sigs[q_id] = _from_bytes(raw)
+            known_subjects[q_id] = subject_id
+
+    duplicates: Dict[int, int] = {}
+    fingerprint_rows = []
+    bucket_inserts = []
+    for q_id, _, subject_id in questions:
+        sig = sigs[q_id]
+        best_id = None
+        candidates = sorted(
+            c for c in {c for band, h in enumerate(bands[q_id]) for c in buckets.get((band, h), [])}
+            if c in known_sigs and known_subjects[c] == subject_id
+        )
+        if candidates:
+            scores = (np.stack([known_sigs[c] for c in candidates]) == sig).mean(axis=1)
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                best_id = candidates[best]
+        fingerprint_rows.append({
+            "question_id": q_id,
+            "teacher_id": teacher_id,
+            "subject_id": subject_id,
+            "signature": _to_bytes(sig),
+            "duplicate_of_id": best_id
+        })
+        if best_id is not None:
+            duplicates[q_id] = best_id
+            continue
+        # Canonical: later questions in this batch can match it too
+        known_sigs[q_id] = sig
+        known_subjects[q_id] = subject_id
+        for band, h in enumerate(bands[q_id]):
+            buckets.setdefault((band, h), []).append(q_id)
+            bucket_inserts.append({"teacher_id": teacher_id, "band": band, "bucket_hash": h, "question_id": q_id})
+
+    db.bulk_insert_mappings(models.QuestionFingerprint, fingerprint_rows)
+    if bucket_inserts:
+        db.bulk_insert_mappings(models.QuestionLSHBucket, bucket_inserts)
+    return duplicates
+
+
+def backfill_teacher(db: Session, teacher_id: int) -> int:
+    """Fingerprint the teacher's bank questions that predate the index. Does not commit; returns the count."""
+    rows = db.query(
+        models.Question.id, models.Question.text, models.Question.subject_id
+    ).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
+    ).outerjoin(
+        models.QuestionFingerprint, models.QuestionFingerprint.question_id == models.Question.id
+    ).filter(
+        models.Assignment.teacher_id == teacher_id,
+        models.Question.parent_question_id == None,
+        models.QuestionFingerprint.question_id == None
+    ).order_by(models.Question.id).all()
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        _index_batch(db, teacher_id, rows[start:start + BACKFILL_BATCH_SIZE], settings.QUESTION_DEDUP_THRESHOLD)
+        db.flush()
+    return len(rows)
+
+
+def backfill(engine: Engine, pause: float = 0) -> Dict[str, int]:
+    """
+    Fingerprint every bank question that predates the index, one commit per
+    teacher. Returns how many questions were indexed and teachers skipped.
+    """
+    stats = {"indexed": 0, "skipped": 0}
+    with Session(bind=engine) as db:
+        teacher_ids = db.execute(
+            select(models.Assignment.teacher_id).distinct().join(
+                models.Question, models.Question.assignment_id == models.Assignment.id
+            ).outerjoin(
+                models.QuestionFingerprint, models.QuestionFingerprint.question_id == models.Question.id
+            ).where(
+                models.Assignment.teacher_id != None,
+                models.Question.parent_question_id == None,
+                models.QuestionFingerprint.question_id == None
+            ).order_by(models.Assignment.teacher_id)
+        ).scalars().all()
+    for teacher_id in teacher_ids:
+        with Session(bind=engine) as db:
+            try:
+                stats["indexed"] += backfill_teacher(db, teacher_id)
+                db.commit()
+            except IntegrityError:
+                # A request fingerprinted some of these questions meanwhile; the next run picks up the rest
+                db.rollback()
+                stats["skipped"] += 1
+        if pause:
+            time.sleep(pause)
+    return stats
+
+
+def _run_backfill(engine: Engine) -> None:
+    try:
+        stats = backfill(engine, pause=BACKFILL_PAUSE_SECONDS)
+        if any(stats.values()):
+            logger.info(f"Question fingerprint backfill finished: {stats}")
+    except Exception as e:
+        logger.error(f"Question fingerprint backfill failed: {e}")
+
+
+def start_backfill(engine: Engine) -> None:
+    """Fingerprint banks that predate the index in a background thread (once per process, unless dedup is off)."""
+    global _backfill
+    if (settings.QUESTION_DEDUP_MODE or "off").lower() == "off":
+        return
+    if _backfill is None or not _backfill.is_alive():
+        _backfill = threading.Thread(target=_run_backfill, args=(engine,), name="question-fingerprint-backfill", daemon=True)
+        _backfill.start()
+
+
+def _release_fingerprint(connection: Connection, question_id: int) -> Tuple[Optional[int], List[int]]:
+    """
+    Drop a question's fingerprint and buckets and promote its earliest remaining
+    duplicate to canonical (the others, and the parent_question_id of merged
+    ones, now point at that one). Returns the question's former duplicate_of_id
+    and the ids of its former duplicates.
+    """
+    Fingerprint = models.QuestionFingerprint
+    duplicate_of_id = connection.execute(
+        select(Fingerprint.duplicate_of_id).where(Fingerprint.question_id == question_id)
+    ).scalar()
+    connection.execute(delete(models.QuestionLSHBucket).where(models.QuestionLSHBucket.question_id == question_id))
+    connection.execute(delete(Fingerprint).where(Fingerprint.question_id == question_id))
+    orphans = connection.execute(
+        select(Fingerprint.question_id, Fingerprint.teacher_id, Fingerprint.signature)
+        .where(Fingerprint.duplicate_of_id == question_id)
+        .order_by(Fingerprint.question_id)
+    ).all()
+    if not orphans:
+        return duplicate_of_id, []
+    canonical_id, teacher_id, raw = orphans[0]
+    others = [row.question_id for row in orphans[1:]]
+    connection.execute(update(Fingerprint).where(Fingerprint.question_id == canonical_id).values(duplicate_of_id=None))
+    connection.execute(
+        update(models.Question)
+        .where(models.Question.id == canonical_id, models.Question.parent_question_id == question_id)
+        .values(parent_question_id=None)
+    )
+    if others:
+        connection.execute(
+            update(Fingerprint).where(Fingerprint.duplicate_of_id == question_id).values(duplicate_of_id=canonical_id)
+        )
+        connection.execute(
+            update(models.Question)
+            .where(models.Question.id.in_(others), models.Question.parent_question_id == question_id)
+            .values(parent_question_id=canonical_id)
+        )
+    connection.execute(models.QuestionLSHBucket.__table__.insert(), [
+        {"teacher_id": teacher_id, "band": band, "bucket_hash": h, "question_id": canonical_id}
+        for band, h in enumerate(band_hashes(_from_bytes(raw)))
+    ])
+    return duplicate_of_id, [canonical_id] + others
+
+
+def _before_question_delete(mapper, connection: Connection, target: models.Question) -> None:
+    # Before the DELETE: merged duplicates still reference the question through parent_question_id
+    _, released = _release_fingerprint(connection, target.id)
+    session = object_session(target)
+    if released and session is not None:
+        item_analysis.record_question_change(session, released)
+
+
+event.listen(models.Question, "before_delete", _before_question_delete)
+
+
+def reindex_question(db: Session, teacher_id: int, question: models.Question) -> Optional[int]:
+    """
+    Re-fingerprint a bank question whose text was edited, so it is compared
+    (and found) by its new text. Call before the commit that saves the edit.
+    Returns the canonical question id if it is now a near-duplicate.
+    """
+    Fingerprint = models.QuestionFingerprint
+    db.flush()
+    stored = db.query(Fingerprint.signature).filter(Fingerprint.question_id == question.id).scalar()
+    if stored is not None and stored == _to_bytes(signature(question.text)):
+        return None
+    if stored is None and question.parent_question_id is not None:
+        # A clone, never indexed
+        return None
+
+    former_canonical, released = _release_fingerprint(db.connection(), question.id)
+    if released:
+        item_analysis.record_question_change(db, released)
+    if former_canonical is not None and question.parent_question_id == former_canonical:
+        # Merged into its old canonical; the new text decides again
+        question.parent_question_id = None
+        db.flush()
+    return index_new_questions(db, teacher_id, [question]).get(question.id)
+
+
+def index_new_questions(db: Session, teacher_id: int, questions: Sequence[models.Question]) -> Dict[int, int]:
+    """
+    Fingerprint newly flushed bank questions and apply QUESTION_DEDUP_MODE to
+    near-duplicates. Call before the commit that saves them. Returns
+    {duplicate question id: canonical question id}.
+    """
+    mode = (settings.QUESTION_DEDUP_MODE or "off").lower()
+    originals = [q for q in questions if q.parent_question_id is None]
+    if mode == "off" or not originals:
+        return {}
+
+    duplicates = _index_batch(
+        db,
+        teacher_id,
+        sorted(((q.id, q.text, q.subject_id) for q in originals), key=lambda row: row[0]),
+        settings.QUESTION_DEDUP_THRESHOLD
+    )
+    if duplicates and mode == "merge":
+        db.execute(update(models.Question), [
+            {"id": q_id, "parent_question_id": canonical_id} for q_id, canonical_id in duplicates.items()
+        ])
+    if duplicates:
+        logger.info(f"{len(duplicates)} of {len(originals)} new questions for teacher {teacher_id} are near-duplicates ({mode})")
+    return duplicates
+
+
+def duplicate_report(db: Session, teacher_id: int, subject_id: Optional[int] = None) -> List[Dict]:
+    """Near-duplicate groups of a teacher's bank (the part already fingerprinted), largest first."""
+    Fingerprint = models.QuestionFingerprint
+    query = db.query(
+        Fingerprint.question_id, Fingerprint.duplicate_of_id, Fingerprint.subject_id,
+        Fingerprint.signature, models.Question.text
+    ).join(
+        models.Question, models.Question.id == Fingerprint.question_id
+    ).filter(
+        Fingerprint.teacher_id == teacher_id,
+        Fingerprint.duplicate_of_id != None
+    )
+    if subject_id is not None:
+        query = query.filter(Fingerprint.subject_id == subject_id)
+    duplicate_rows = query.order_by(Fingerprint.question_id).all()
+    if not duplicate_rows:
+        return []
+
+    canonical_ids = {row.duplicate_of_id for row in duplicate_rows}
+    canonicals = {
+        row.question_id: row for row in db.query(
+            Fingerprint.question_id, Fingerprint.subject_id, Fingerprint.signature, models.Question.text
+        ).join(
+            models.Question, models.Question.id == Fingerprint.question_id
+        ).filter(Fingerprint.question_id.in_(canonical_ids)).all()
+    }
+
+    groups: Dict[int, Dict] = {}
+    for row in duplicate_rows:
+        canonical = canonicals.get(row.duplicate_of_id)
+        if canonical is None:
+            continue
+        group = groups.setdefault(canonical.question_id, {
+            "question_id": canonical.question_id,
+            "subject_id": canonical.subject_id,
+            "text": canonical.text,
+            "duplicates": []
+        })
+        group["duplicates"].append({
+            "question_id": row.question_id,
+            "text": row.text,
+            "similarity": similarity(_from_bytes(row.signature), _from_bytes(canonical.signature))
+        })
+    return sorted(groups.values(), key=lambda g: (-len(g["duplicates"]), g["question_id"]))
+
@@ -0,0 +1,312 @@
+"""
+Semantic "similar questions" search over the question bank.
+
+Original bank questions are embedded into their own Qdrant collection
+(`learnmist-questions`, next to the `learnmist-school` RAG collection), one
+point per question id with the tenant fields (school, teacher, subject) as
+indexed payload. Nearest neighbours come from the collection's HNSW index,
+filtered on the payload indexes, so a lookup never scans the bank.
+
+Saving questions only queues their ids; a background thread embeds the queue in
+batches. Vectors are keyed by a hash of the model and normalized text and
+reused instead of calling the embeddings API again: from an in-process cache,
+or from any stored point with the same text (clones, regenerated quizzes,
+re-saves with unchanged text). Banks that predate the collection are queued
+lazily, once per teacher and process, on their first similarity lookup.
+"""
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from openai import OpenAI
+from qdrant_client.http import models as qmodels
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import database, models
+from app.config import settings
+from app.services import rag_service
+from app.services.question_dedup import normalize_text
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "learnmist-questions"
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+BATCH_SIZE = 64
+FLUSH_INTERVAL_SECONDS = 2.0
+# Extra neighbours fetched to make up for points of deleted or hidden questions
+OVERFETCH = 10
+
+# content hash -> vector
+_vector_cache = LRUCache(maxsize=20000)
+
+_lock = threading.Lock()
+_pending: Set[int] = set()
+_wakeup = threading.Event()
+_worker: Optional[threading.Thread] = None
+_collection_ready = False
+_backfilled_teachers: Set[int] = set()
+
+
+def is_enabled() -> bool:
+    return bool(settings.OPENAI_API_KEY)
+
+
+def content_hash(text: Optional[str]) -> str:
+    model = settings.QUESTION_EMBEDDING_MODEL
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _client():
+    global _collection_ready
+    client = rag_service.get_qdrant_client()
+    if not _collection_ready:
+        if not client.collection_exists(COLLECTION_NAME):
+            size = EMBEDDING_DIMENSIONS.get(settings.QUESTION_EMBEDDING_MODEL, 1536)
+            client.create_collection(
+                collection_name=COLLECTION_NAME,
+                vectors_config=qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE),
+                # payload_m also builds per-school graphs, so tenant-filtered searches stay on the index
+                hnsw_config=qmodels.HnswConfigDiff(m=16, payload_m=16),
+            )
+            for field, principal in (("school_id", True), ("teacher_id", False), ("subject_id", False)):
+                client.create_payload_index(
+                    collection_name=COLLECTION_NAME,
+                    field_name=field,
+                    field_schema=qmodels.IntegerIndexParams(
+                        type=qmodels.IntegerIndexType.INTEGER, lookup=True, range=False, is_principal=principal
+                    ),
+                )
+            client.create_payload_index(
+                collection_name=COLLECTION_NAME,
+                field_name="content_hash",
+                field_schema=qmodels.PayloadSchemaType.KEYWORD,
+            )
+            logger.info(f"Created question embedding collection '{COLLECTION_NAME}'")
+        _collection_ready = True
+    return client
+
+
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    response = OpenAI(api_key=settings.OPENAI_API_KEY).embeddings.create(
+        input=texts, model=settings.QUESTION_EMBEDDING_MODEL
+    )
+    return [item.embedding for item in response.data]
+
+
+def _question_rows(db: Session, question_ids: Sequence[int]) -> List[Tuple]:
+    """(id, text, subject_id, school_id, teacher_id) of original bank questions."""
+    return db.query(
+        models.Question.id,
+        models.Question.text,
+        models.Question.subject_id,
+        func.coalesce(models.Question.school_id, models.User.school_id),
+        models.Assignment.teacher_id
+    ).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
+    ).outerjoin(
+        models.User, models.User.id == models.Assignment.teacher_id
+    ).filter(
+        models.Question.id.in_(question_ids),
+        models.Question.parent_question_id == None
+    ).all()
+
+
+def embed_questions(db: Session, question_ids: Sequence[int]) -> int:
+    """
+    Embed and upsert the given questions, skipping those whose stored point is
+    already up to date. Returns the number of points written.
+    """
+    rows = _question_rows(db, question_ids)
+    if not rows:
+        return 0
+    client = _client()
+    hashes = {q_id: content_hash(text) for q_id, text, _, _, _ in rows}
+
+    stored = client.retrieve(COLLECTION_NAME, ids=list(hashes), with_payload=["content_hash"])
+    up_to_date = {p.id for p in stored if (p.payload or {}).get("content_hash") == hashes[p.id]}
+    rows = [r for r in rows if r[0] not in up_to_date]
+    if not rows:
+        return 0
+
+    vectors: Dict[str, List[float]] = {}
+    for h in {hashes[r[0]] for r in rows}:
+        cached = _vector_cache.get(h)
+        if cached is not None:
+            vectors[h] = cached
+    missing = {hashes[r[0]] for r in rows} - vectors.keys()
+    if missing:
+        # Same text already embedded for another question
+        reused, _ = client.scroll(
+            COLLECTION_NAME,
+            scroll_filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="content_hash", match=qmodels.MatchAny(any=list(missing)))
+            ]),
+            limit=len(missing) * 4,
+            with_payload=["content_hash"],
+            with_vectors=True,
+        )
+        for point in reused:
+            h = point.payload["content_hash"]
+            if h in missing and h not in vectors:
+                vectors[h] = point.vector
+        missing -= vectors.keys()
+    if missing:
+        texts = {}
+        for q_id, text, _, _, _ in rows:
+            texts.setdefault(hashes[q_id], text or "")
+        new_hashes = sorted(missing)
+        for h, vector in zip(new_hashes, _embed_texts([texts[h] for h in new_hashes])):
+            vectors[h] = vector
+    for h, vector in vectors.items():
+        _vector_cache.set(h, vector)
+
+    client.upsert(COLLECTION_NAME, points=[
+        qmodels.PointStruct(
+            id=q_id,
+            vector=vectors[hashes[q_id]],
+            payload={
+                "question_id": q_id,
+                "school_id": school_id,
+                "teacher_id": teacher_id,
+                "subject_id": subject_id,
+                "content_hash": hashes[q_id],
+            },
+        )
+        for q_id, _, subject_id, school_id, teacher_id in rows
+    ])
+    logger.debug(f"Embedded {len(rows)} questions ({len(missing)} via the embeddings API)")
+    return len(rows)
+
+
+def _drain() -> None:
+    with _lock:
+        batch = sorted(_pending)[:BATCH_SIZE]
+        _pending.difference_update(batch)
+    if not batch:
+        return
+    db = database.SessionLocal()
+    try:
+        embed_questions(db, batch)
+    except Exception as e:
+        # Dropped ids are picked up again by the next backfill
+        logger.error(f"Embedding {len(batch)} questions failed: {e}")
+    finally:
+        db.close()
+
+
+def _run() -> None:
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL_SECONDS)
+        _wakeup.clear()
+        while _pending:
+            _drain()
+
+
+def enqueue(question_ids: Sequence[int]) -> None:
+    """Queue questions for background embedding. No-op without an OpenAI API key."""
+    global _worker
+    if not question_ids or not is_enabled():
+        return
+    with _lock:
+        _pending.update(question_ids)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="question-embeddings", daemon=True)
+            _worker.start()
+        if len(_pending) >= BATCH_SIZE:
+            _wakeup.set()
+
+
+def forget(question_ids: Sequence[int]) -> None:
+    """Remove points of deleted questions (best effort)."""
+    if not question_ids or not _collection_ready:
+        return
+    try:
+        _client().delete(COLLECTION_NAME, points_selector=qmodels.PointIdsList(points=list(question_ids)))
+    except Exception as e:
+        logger.warning(f"Could not delete question embeddings {list(question_ids)}: {e}")
+
+
+def ensure_teacher_queued(db: Session, teacher_id: int) -> None:
+    """Queue bank questions of a teacher that have no point yet (once per teacher and process)."""
+    if teacher_id in _backfilled_teachers or not is_enabled():
+        return
+    bank_ids = {
+        row[0] for row in db.query(models.Question.id).join(
+            models.Assignment, models.Question.assignment_id == models.Assignment.id
+        ).filter(
+            models.Assignment.teacher_id == teacher_id,
+            models.Question.parent_question_id == None
+        ).all()
+    }
+    client = _client()
+    embedded: Set[int] = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            COLLECTION_NAME,
+            scroll_filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="teacher_id", match=qmodels.MatchValue(value=teacher_id))
+            ]),
+            limit=1000,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        embedded.update(p.id for p in points)
+        if offset is None:
+            break
+    missing = sorted(bank_ids - embedded)
+    if missing:
+        logger.info(f"Queued {len(missing)} bank questions of teacher {teacher_id} for embedding")
+        enqueue(missing)
+    with _lock:
+        _backfilled_teachers.add(teacher_id)
+
+
+def similar_questions(
+    db: Session,
+    question_id: int,
+    school_id: Optional[int],
+    teacher_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    limit: int = 10,
+) -> List[Tuple[int, float]]:
+    """
+    Nearest bank questions to `question_id` within a school (and optionally one
+    teacher's bank and one subject) as (question_id, cosine score), best first.
+    Embeds the source question on the spot if the queue has not reached it.
+    Raises ValueError if semantic search is not configured.
+    """
+    if not is_enabled():
+        raise ValueError("Semantic search needs OPENAI_API_KEY")
+    client = _client()
+    stored = client.retrieve(COLLECTION_NAME, ids=[question_id], with_vectors=True)
+    if not stored:
+        embed_questions(db, [question_id])
+        stored = client.retrieve(COLLECTION_NAME, ids=[question_id], with_vectors=True)
+        if not stored:
+            return []
+
+    conditions = [qmodels.FieldCondition(key="school_id", match=qmodels.MatchValue(value=school_id))]
+    if teacher_id is not None:
+        conditions.append(qmodels.FieldCondition(key="teacher_id", match=qmodels.MatchValue(value=teacher_id)))
+    if subject_id is not None:
+        conditions.append(qmodels.FieldCondition(key="subject_id", match=qmodels.MatchValue(value=subject_id)))
+    response = client.query_points(
+        COLLECTION_NAME,
+        query=stored[0].vector,
+        query_filter=qmodels.Filter(
+            must=conditions,
+            must_not=[qmodels.HasIdCondition(has_id=[question_id])],
+        ),
+        limit=limit + OVERFETCH,
+        with_payload=False,
+    )
+    return [(int(p.id), float(p.score)) for p in response.points]
@@ -0,0 +1,308 @@
+"""
+Full-text search over the question bank.
+
+SQLite: an external-content FTS5 table (`questions_fts`) kept in sync with
+`questions` by triggers, ranked with bm25().
+PostgreSQL: a generated `search_vector` tsvector column with a GIN index,
+ranked with ts_rank_cd() (Postgres has no built-in BM25).
+Other dialects fall back to an unranked ILIKE scan.
+
+Results use keyset (cursor) pagination on (score, id) where higher scores are
+better on every backend. Scores are double precision everywhere, so a score
+round-trips through the cursor unchanged and compares equal to itself.
+
+Highlights are HTML: the question text is escaped and only the <mark> tags
+around matched terms are markup. The database marks matches with private-use
+sentinel characters, which are swapped for the tags after escaping.
+"""
+import base64
+import binascii
+import html
+import json
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Emitted by the database around matches, replaced by the tags once the text is escaped
+_MATCH_START = "\ue000"
+_MATCH_END = "\ue001"
+
+# Topic matching (match_question_ids): words that say nothing about the topic
+TOPIC_STOPWORDS = frozenset("""
+    a about after all an and any are as at be before between by can do does for from how in into is it its
+    of on or our question questions quiz test than that the their them then these this those through to
+    under was were what when where which who why will with your
+""".split())
+# Matches scoring below this fraction of the best match are dropped as off-topic
+TOPIC_RELEVANCE_FLOOR = 0.3
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+        text, content='questions', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE OF text ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO questions_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+_POSTGRES_DDL = [
+    """
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_questions_search_vector ON questions USING GIN (search_vector)",
+]
+
+
+def dialect_of(bind) -> str:
+    return bind.dialect.name
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Create the full-text index and its sync triggers if missing (idempotent)."""
+    dialect = dialect_of(engine)
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"
+                )).first()
+                for ddl in _SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if not exists:
+                    # Index questions that existed before the FTS table
+                    conn.execute(text("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+            else:
+                logger.info(f"Full-text question search not available for dialect '{dialect}', using ILIKE")
+    except Exception as e:
+        logger.error(f"Could not create question search index: {e}")
+
+
+def encode_cursor(score: float, question_id: int) -> str:
+    raw = json.dumps([score, question_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Inverse of encode_cursor(); raises ValueError for anything it did not produce."""
+    try:
+        score, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        score, question_id = float(score), int(question_id)
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not math.isfinite(score):
+        raise ValueError("Invalid cursor")
+    return score, question_id
+
+
+def render_highlight(highlight: Optional[str]) -> Optional[str]:
+    """HTML-escape a highlighted snippet and turn the match sentinels into <mark> tags."""
+    if highlight is None:
+        return None
+    return html.escape(highlight).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+
+
+def to_fts5_query(search: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression (AND of terms, prefix on the last)."""
+    terms = re.findall(r"\w+", search.lower())
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _scope_sql(teacher_id: Optional[int], school_id: Optional[int]) -> Tuple[str, Dict]:
+    clauses = ["q.parent_question_id IS NULL"]
+    params = {}
+    if teacher_id is not None:
+        clauses.append("a.teacher_id = :teacher_id")
+        params["teacher_id"] = teacher_id
+    if school_id is not None:
+        clauses.append("q.school_id = :school_id")
+        params["school_id"] = school_id
+    return " AND ".join(clauses), params
+
+
+def _match_sql(dialect: str) -> Tuple[str, str, str]:
+    """Returns (FROM/JOIN fragment, match predicate, score/highlight select list)."""
+    if dialect == "sqlite":
+        return (
+            "questions_fts JOIN questions q ON q.id = questions_fts.rowid "
+            "JOIN assignments a ON a.id = q.assignment_id",
+            "questions_fts MATCH :match",
+            f"-bm25(questions_fts) AS score, "
+            f"highlight(questions_fts, 0, '{_MATCH_START}', '{_MATCH_END}') AS highlight",
+        )
+    if dialect == "postgresql":
+        return (
+            "questions q JOIN assignments a ON a.id = q.assignment_id, "
+            "websearch_to_tsquery('english', :match) AS tsq",
+            "q.search_vector @@ tsq",
+            # ts_rank_cd() is real; the cursor carries (and compares) doubles
+            f"CAST(ts_rank_cd(q.search_vector, tsq) AS double precision) AS score, "
+            f"ts_headline('english', q.text, tsq, 'StartSel={_MATCH_START}, StopSel={_MATCH_END}') AS highlight",
+        )
+    return (
+        "questions q JOIN assignments a ON a.id = q.assignment_id",
+        "lower(q.text) LIKE :match",
+        "0.0 AS score, NULL AS highlight",
+    )
+
+
+def search_questions(
+    db: Session,
+    search: str,
+    teacher_id: Optional[int] = None,
+    school_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Dict:
+    """
+    Ranked search over original (non-cloned) bank questions visible to a teacher
+    or school. Facet counts cover every match in scope, before the subject and
+    difficulty filters, so the UI can show counts for each option.
+    """
+    dialect = dialect_of(db.get_bind())
+    empty = {"items": [], "next_cursor": None, "facets": {"subject": [], "difficulty": [], "question_type": []}}
+
+    if dialect == "sqlite":
+        match = to_fts5_query(search)
+    elif dialect == "postgresql":
+        match = search.strip()
+    else:
+        match = f"%{search.strip().lower()}%"
+    if not match:
+        return empty
+
+    from_sql, match_sql, score_sql = _match_sql(dialect)
+    scope_sql, params = _scope_sql(teacher_id, school_id)
+    params["match"] = match
+
+    filter_sql = ""
+    if subject_id is not None:
+        filter_sql += " AND q.subject_id = :subject_id"
+        params["subject_id"] = subject_id
+    if difficulty:
+        filter_sql += " AND q.difficulty_level = :difficulty"
+        params["difficulty"] = difficulty
+
+    cursor_sql = ""
+    if cursor:
+        params["cursor_score"], params["cursor_id"] = decode_cursor(cursor)
+        cursor_sql = "WHERE score < :cursor_score OR (score = :cursor_score AND id > :cursor_id)"
+    params["limit"] = limit + 1
+
+    rows = db.execute(text(f"""
+        SELECT * FROM (
+            SELECT q.id AS id, q.text AS text, q.question_type AS question_type,
+                   q.difficulty_level AS difficulty_level, q.subject_id AS subject_id,
+                   q.assignment_id AS assignment_id, q.points AS points, {score_sql}
+            FROM {from_sql}
+            WHERE {match_sql} AND {scope_sql}{filter_sql}
+        ) hits
+        {cursor_sql}
+        ORDER BY score DESC, id ASC
+        LIMIT :limit
+    """), params).mappings().all()
+
+    items = [dict(r, highlight=render_highlight(r["highlight"])) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["score"], last["id"])
+
+    facets = {}
+    facet_params = {k: v for k, v in params.items() if k in ("match", "teacher_id", "school_id")}
+    for facet, column in (("subject", "q.subject_id"), ("difficulty", "q.difficulty_level"), ("question_type", "q.question_type")):
+        facet_rows = db.execute(text(f"""
+            SELECT {column} AS value, COUNT(*) AS count
+            FROM {from_sql}
+            WHERE {match_sql} AND {scope_sql}
+            GROUP BY {column}
+            ORDER BY count DESC
+        """), facet_params).all()
+        facets[facet] = [{"value": value, "count": count} for value, count in facet_rows]
+
+    return {"items": items, "next_cursor": next_cursor, "facets": facets}
+
+
+def topic_terms(search: str) -> List[str]:
+    """Content words of a topic: lower-cased, stopwords and single characters removed."""
+    terms = [t for t in re.findall(r"\w+", (search or "").lower()) if len(t) > 1 and t not in TOPIC_STOPWORDS]
+    return list(dict.fromkeys(terms))
+
+
+def match_question_ids(
+    db: Session,
+    search: str,
+    teacher_id: Optional[int] = None,
+    school_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    limit: int = 1000,
+) -> List[int]:
+    """
+    Ids of the best-ranked bank questions on the topic `search` (no facets, no
+    highlighting). Every content word of the topic must match, and matches
+    scoring below TOPIC_RELEVANCE_FLOOR of the best one are dropped, so a topic
+    the bank does not cover returns no (or few) ids rather than loosely related
+    questions.
+    """
+    terms = topic_terms(search)
+    if not terms:
+        return []
+    dialect = dialect_of(db.get_bind())
+    if dialect == "sqlite":
+        # Space-separated FTS5 phrases are AND-ed
+        match = " ".join(f'"{t}"' for t in terms)
+    elif dialect == "postgresql":
+        match = " ".join(terms)
+    else:
+        match = "%" + "%".join(terms) + "%"
+
+    from_sql, match_sql, score_sql = _match_sql(dialect)
+    scope_sql, params = _scope_sql(teacher_id, school_id)
+    params.update(match=match, limit=limit)
+    if subject_id is not None:
+        scope_sql += " AND q.subject_id = :subject_id"
+        params["subject_id"] = subject_id
+    score = score_sql.split(" AS score")[0]
+    rows = db.execute(text(f"""
+        SELECT q.id, {score} AS score FROM {from_sql}
+        WHERE {match_sql} AND {scope_sql}
+        ORDER BY score DESC, q.id
+        LIMIT :limit
+    """), params).all()
+    if not rows or rows[0][1] <= 0:
+        return [r[0] for r in rows]
+    floor = rows[0][1] * TOPIC_RELEVANCE_FLOOR
+    return [question_id for question_id, row_score in rows if row_score >= floor]
@@ -0,0 +1,263 @@
+"""
+Running answer statistics per question lineage.
+
+A lineage is a bank question plus every clone of it; its root is
+`parent_question_id` for clones and the question's own id otherwise. For each
+root, question_lineage_stats holds attempts, correct count, points sum and a
+Welford mean/M2 of answer times, so bank queries can sort or filter by observed
+difficulty without aggregating student_answers.
+
+Grading paths record deltas in memory; they are written in batches (one
+executemany of relative UPDATEs) once enough answers are pending or the oldest
+delta is old enough. Updates are relative, so several workers can flush
+concurrently. Pending deltas are lost if a worker dies before flushing;
+rebuild() recomputes the counts from student_answers. It runs from
+scripts/rebuild_question_stats.py and from the super admin /stats/reconcile
+endpoint.
+"""
+import base64
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Float, and_, bindparam, case, cast, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+FLUSH_MAX_PENDING = 500       # buffered answers before a flush
+FLUSH_MAX_AGE_SECONDS = 10.0  # oldest buffered delta before a flush
+
+
+@dataclass
+class LineageDelta:
+    attempts: int = 0
+    correct: int = 0
+    points: float = 0.0
+    time_count: int = 0
+    time_mean: float = 0.0
+    time_m2: float = 0.0
+
+    def add_time(self, seconds: float) -> None:
+        # Welford's online update
+        self.time_count += 1
+        delta = seconds - self.time_mean
+        self.time_mean += delta / self.time_count
+        self.time_m2 += delta * (seconds - self.time_mean)
+
+    def merge(self, other: "LineageDelta") -> None:
+        self.attempts += other.attempts
+        self.correct += other.correct
+        self.points += other.points
+        n = self.time_count + other.time_count
+        if n:
+            # Chan et al. parallel combination of mean/M2
+            delta = other.time_mean - self.time_mean
+            self.time_m2 += other.time_m2 + delta * delta * self.time_count * other.time_count / n
+            self.time_mean += delta * other.time_count / n
+            self.time_count = n
+
+
+_lock = threading.Lock()
+_pending: Dict[int, LineageDelta] = {}
+_pending_answers = 0
+_oldest_pending: Optional[float] = None
+
+
+def lineage_root(question_id: int, parent_question_id: Optional[int]) -> int:
+    return parent_question_id or question_id
+
+
+def _delta_for(root_question_id: int) -> LineageDelta:
+    global _pending_answers, _oldest_pending
+    _pending_answers += 1
+    if _oldest_pending is None:
+        _oldest_pending = time.monotonic()
+    return _pending.setdefault(root_question_id, LineageDelta())
+
+
+def record_answer(root_question_id: int, is_correct: bool, points: float, seconds: Optional[float] = None) -> None:
+    """Count a new graded attempt (call after the answer is committed)."""
+    with _lock:
+        delta = _delta_for(root_question_id)
+        delta.attempts += 1
+        delta.correct += 1 if is_correct else 0
+        delta.points += points or 0
+        if seconds is not None and seconds >= 0:
+            delta.add_time(seconds)
+
+
+def record_regrade(root_question_id: int, correct_delta: int, points_delta: float) -> None:
+    """Adjust an already counted attempt after a teacher changed its grade."""
+    if not correct_delta and not points_delta:
+        return
+    with _lock:
+        delta = _delta_for(root_question_id)
+        delta.correct += correct_delta
+        delta.points += points_delta
+
+
+def maybe_flush(db: Session) -> bool:
+    """Flush if the buffer is full or stale. Never raises; returns whether it flushed."""
+    with _lock:
+        due = _pending_answers >= FLUSH_MAX_PENDING or (
+            _oldest_pending is not None and time.monotonic() - _oldest_pending >= FLUSH_MAX_AGE_SECONDS
+        )
+    if not due:
+        return False
+    try:
+        flush(db)
+    except Exception as e:
+        logger.error(f"Could not flush question lineage stats: {e}")
+        return False
+    return True
+
+
+def flush(db: Session) -> int:
+    """Write all pending deltas and commit. Deltas are restored if the write fails."""
+    global _pending, _pending_answers, _oldest_pending
+    with _lock:
+        batch, _pending = _pending, {}
+        _pending_answers, _oldest_pending = 0, None
+    if not batch:
+        return 0
+
+    Stats = models.QuestionLineageStats
+    try:
+        existing = set(db.execute(
+            select(Stats.root_question_id).where(Stats.root_question_id.in_(list(batch)))
+        ).scalars())
+        missing = [root for root in batch if root not in existing]
+        if missing:
+            try:
+                with db.begin_nested():
+                    db.bulk_insert_mappings(Stats, [
+                        {"root_question_id": root, "attempts": 0, "correct_count": 0, "points_sum": 0,
+                         "time_count": 0, "time_mean": 0, "time_m2": 0}
+                        for root in missing
+                    ])
+            except IntegrityError:
+                # Another worker created some of the rows first; insert the rest one by one
+                for root in missing:
+                    try:
+                        with db.begin_nested():
+                            db.add(Stats(root_question_id=root, attempts=0, correct_count=0, points_sum=0,
+                                         time_count=0, time_mean=0, time_m2=0))
+                    except IntegrityError:
+                        pass
+
+        t_n = bindparam("t_n")
+        t_mean = bindparam("t_mean")
+        # Relative update. SET order matters on MySQL, which applies assignments left to
+        # right: M2 and mean must read time_count/time_mean before they change.
+        table = Stats.__table__
+        new_count = Stats.time_count + cast(t_n, Float)
+        stmt = update(table).where(
+            table.c.root_question_id == bindparam("root")
+        ).ordered_values(
+            (table.c.time_m2, case(
+                (new_count > 0, Stats.time_m2 + bindparam("t_m2")
+                 + (t_mean - Stats.time_mean) * (t_mean - Stats.time_mean)
+                 * Stats.time_count * t_n / new_count),
+                else_=Stats.time_m2
+            )),
+            (table.c.time_mean, case(
+                (new_count > 0, Stats.time_mean + (t_mean - Stats.time_mean) * t_n / new_count),
+                else_=Stats.time_mean
+            )),
+            (table.c.time_count, Stats.time_count + t_n),
+            (table.c.attempts, Stats.attempts + bindparam("d_attempts")),
+            (table.c.correct_count, Stats.correct_count + bindparam("d_correct")),
+            (table.c.points_sum, Stats.points_sum + bindparam("d_points")),
+        )
+        db.connection().execute(stmt, [
+            {"root": root, "d_attempts": d.attempts, "d_correct": d.correct, "d_points": float(d.points),
+             "t_n": d.time_count, "t_mean": float(d.time_mean), "t_m2": float(d.time_m2)}
+            for root, d in batch.items()
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _lock:
+            for root, d in batch.items():
+                _delta_for(root).merge(d)
+        raise
+    logger.debug(f"Flushed lineage stats for {len(batch)} questions")
+    return len(batch)
+
+
+def correct_rate():
+    """SQL expression for a lineage's observed correct rate (NULL before any attempt)."""
+    Stats = models.QuestionLineageStats
+    return cast(Stats.correct_count, Float) / func.nullif(Stats.attempts, 0)
+
+
+def encode_rate_cursor(correct: Optional[int], attempts: Optional[int], question_id: int) -> str:
+    """Opaque keyset cursor for a correct_rate() ordering; keeps the exact counts, not the float."""
+    raw = json.dumps([correct or 0, attempts or 0, question_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_rate_cursor(cursor: str) -> Tuple[int, int, int]:
+    correct, attempts, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return int(correct), int(attempts), int(question_id)
+
+
+def after_rate_cursor(question_id_column, cursor: Tuple[int, int, int], descending: bool = False):
+    """
+    Rows after `cursor` in ORDER BY correct_rate() IS NULL, correct_rate() ASC|DESC, id DESC.
+    Rates are compared by cross-multiplying the counts, so the key is exact.
+    """
+    Stats = models.QuestionLineageStats
+    correct, attempts, question_id = cursor
+    no_rate = or_(Stats.attempts.is_(None), Stats.attempts == 0)
+    if not attempts:
+        return and_(no_rate, question_id_column < question_id)
+    # rate <op> correct/attempts  <=>  correct_count * attempts <op> correct * Stats.attempts
+    lhs = Stats.correct_count * attempts
+    rhs = Stats.attempts * correct
+    beyond = lhs < rhs if descending else lhs > rhs
+    return or_(
+        no_rate,
+        and_(Stats.attempts > 0, or_(beyond, and_(lhs == rhs, question_id_column < question_id))),
+    )
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute attempts, correct counts and points from student_answers (for backfills
+    or after lost buffers). Time statistics are kept, answer times are not stored.
+    """
+    Question = models.Question
+    Answer = models.StudentAnswer
+    Stats = models.QuestionLineageStats
+    root = func.coalesce(Question.parent_question_id, Question.id)
+    rows = db.query(
+        root,
+        func.count(Answer.id),
+        func.sum(case((Answer.is_correct == True, 1), else_=0)),
+        func.coalesce(func.sum(Answer.points_awarded), 0)
+    ).join(Question, Answer.question_id == Question.id).group_by(root).all()
+
+    existing = set(db.execute(select(Stats.root_question_id)).scalars())
+    counts = [
+        {"root_question_id": r, "attempts": attempts, "correct_count": correct or 0, "points_sum": float(points)}
+        for r, attempts, correct, points in rows
+    ]
+    db.bulk_update_mappings(Stats, [c for c in counts if c["root_question_id"] in existing])
+    answered = {c["root_question_id"] for c in counts}
+    db.bulk_update_mappings(Stats, [
+        {"root_question_id": r, "attempts": 0, "correct_count": 0, "points_sum": 0.0}
+        for r in existing - answered
+    ])
+    db.bulk_insert_mappings(Stats, [
+        dict(c, time_count=0, time_mean=0, time_m2=0) for c in counts if c["root_question_id"] not in existing
+    ])
+    db.commit()
+    return len(counts)
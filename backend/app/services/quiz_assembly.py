@@ -0,0 +1,274 @@
+"""
+Local quiz assembly from a teacher's question bank.
+
+Each teacher's bank (original, non-cloned, non-duplicate questions) is indexed in memory by
+(subject, question type, difficulty bucket), built with one query and kept for
+a few minutes. The bucket is the observed difficulty from the lineage stats
+once a question has enough attempts, otherwise its labelled difficulty level.
+
+A quiz request is a count plus a difficulty mix and a question-type mix; quotas
+per (type, bucket) cell are filled by random sampling, skipping questions the
+class (or grade) has already seen in an earlier assignment, and shortfalls are
+filled from neighbouring difficulty buckets.
+"""
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INDEX_CACHE_TTL_SECONDS = 300
+DIFFICULTY_BUCKETS = ("Easy", "Medium", "Hard")
+# Observed difficulty replaces the label once a lineage has this many attempts
+MIN_ATTEMPTS_FOR_OBSERVED = 20
+EASY_MIN_CORRECT_RATE = 0.75
+MEDIUM_MIN_CORRECT_RATE = 0.4
+
+
+# UI labels accepted by the AI generator, mapped to QuestionType values (None = mixed)
+QUESTION_TYPE_LABELS = {
+    "multiple choice": "MULTIPLE_CHOICE",
+    "true/false": "TRUE_FALSE",
+    "short answer": "SHORT_ANSWER",
+    "multiple_choice": "MULTIPLE_CHOICE",
+    "true_false": "TRUE_FALSE",
+    "short_answer": "SHORT_ANSWER",
+}
+
+
+@dataclass
+class BankIndex:
+    # (subject_id, question_type, bucket) -> [(question_id, grade_id)]
+    cells: Dict[Tuple[Optional[int], str, str], List[Tuple[int, Optional[int]]]] = field(default_factory=dict)
+    size: int = 0
+
+
+@dataclass
+class AssembledQuiz:
+    question_ids: List[int]
+    requested: int
+    # "TYPE/Bucket" -> selected count
+    cells: Dict[str, int]
+
+    @property
+    def shortfall(self) -> int:
+        return self.requested - len(self.question_ids)
+
+
+# teacher_id -> BankIndex
+_index_cache = LRUCache(maxsize=2000, ttl=INDEX_CACHE_TTL_SECONDS)
+
+
+def difficulty_bucket(label: Optional[str], attempts: Optional[int], correct_count: Optional[int]) -> str:
+    if attempts and attempts >= MIN_ATTEMPTS_FOR_OBSERVED:
+        rate = (correct_count or 0) / attempts
+        if rate >= EASY_MIN_CORRECT_RATE:
+            return "Easy"
+        if rate >= MEDIUM_MIN_CORRECT_RATE:
+            return "Medium"
+        return "Hard"
+    label = (label or "").strip().capitalize()
+    return label if label in DIFFICULTY_BUCKETS else "Medium"
+
+
+def get_index(db: Session, teacher_id: int) -> BankIndex:
+    index = _index_cache.get(teacher_id)
+    if index is not None:
+        return index
+
+    rows = db.query(
+        models.Question.id,
+        models.Question.subject_id,
+        models.Question.question_type,
+        models.Question.difficulty_level,
+        models.Assignment.grade_id,
+        models.QuestionLineageStats.attempts,
+        models.QuestionLineageStats.correct_count
+    ).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
+    ).outerjoin(
+        models.QuestionLineageStats, models.QuestionLineageStats.root_question_id == models.Question.id
+    ).outerjoin(
+        models.QuestionFingerprint, models.QuestionFingerprint.question_id == models.Question.id
+    ).filter(
+        models.Assignment.teacher_id == teacher_id,
+        models.Question.parent_question_id == None,
+        models.QuestionFingerprint.duplicate_of_id == None
+    ).all()
+
+    index = BankIndex(size=len(rows))
+    for q_id, subject_id, q_type, label, grade_id, attempts, correct in rows:
+        type_name = q_type.value if q_type is not None else models.QuestionType.MULTIPLE_CHOICE.value
+        key = (subject_id, type_name, difficulty_bucket(label, attempts, correct))
+        index.cells.setdefault(key, []).append((q_id, grade_id))
+    _index_cache.set(teacher_id, index)
+    return index
+
+
+def invalidate_teacher(teacher_id: Optional[int]) -> None:
+    if teacher_id is not None:
+        _index_cache.invalidate(teacher_id)
+
+
+def clear() -> None:
+    _index_cache.clear()
+
+
+def seen_roots(db: Session, grade_id: Optional[int], class_id: Optional[int]) -> Set[int]:
+    """Lineage roots of every question published to the class (or, without a class, the grade)."""
+    if class_id is not None:
+        audience = or_(
+            models.Assignment.class_id == class_id,
+            (models.Assignment.class_id == None) & (models.Assignment.grade_id == grade_id)
+        ) if grade_id is not None else models.Assignment.class_id == class_id
+    elif grade_id is not None:
+        audience = models.Assignment.grade_id == grade_id
+    else:
+        return set()
+    root = func.coalesce(models.Question.parent_question_id, models.Question.id)
+    rows = db.query(root).join(
+        models.Assignment, models.Question.assignment_id == models.Assignment.id
+    ).filter(
+        audience,
+        models.Assignment.status == models.AssignmentStatus.PUBLISHED
+    ).distinct().all()
+    return {r[0] for r in rows}
+
+
+def _quotas(count: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """Split `count` by weights with the largest-remainder method."""
+    weights = {k: v for k, v in weights.items() if v and v > 0}
+    if not weights or count <= 0:
+        return {}
+    total = sum(weights.values())
+    exact = {k: count * v / total for k, v in weights.items()}
+    quotas = {k: int(x) for k, x in exact.items()}
+    remaining = count - sum(quotas.values())
+    for k in sorted(exact, key=lambda k: exact[k] - quotas[k], reverse=True)[:remaining]:
+        quotas[k] += 1
+    return quotas
+
+
+def _neighbours(bucket: str) -> List[str]:
+    i = DIFFICULTY_BUCKETS.index(bucket)
+    return sorted(DIFFICULTY_BUCKETS, key=lambda b: (abs(DIFFICULTY_BUCKETS.index(b) - i), DIFFICULTY_BUCKETS.index(b)))
+
+
+def normalize_mix(mix: Optional[Dict[str, float]], allowed: Iterable[str]) -> Dict[str, float]:
+    allowed = list(allowed)
+    if not mix:
+        return {k: 1.0 for k in allowed}
+    lookup = {a.upper(): a for a in allowed}
+    normalized = {}
+    for key, weight in mix.items():
+        name = lookup.get(str(key).strip().upper())
+        if name is None:
+            raise ValueError(f"Unknown mix key '{key}', expected one of {allowed}")
+        normalized[name] = normalized.get(name, 0.0) + float(weight)
+    return normalized
+
+
+def type_mix_for_label(label: Optional[str]) -> Optional[Dict[str, float]]:
+    """Type mix for a single AI-generator question type label; None for "Mixed" or unknown labels."""
+    type_name = QUESTION_TYPE_LABELS.get((label or "").strip().lower())
+    return {type_name: 1.0} if type_name else None
+
+
+def assemble(
+    db: Session,
+    teacher_id: int,
+    subject_id: int,
+    count: int,
+    grade_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    difficulty_mix: Optional[Dict[str, float]] = None,
+    type_mix: Optional[Dict[str, float]] = None,
+    candidate_ids: Optional[Set[int]] = None,
+    seed: Optional[int] = None,
+) -> AssembledQuiz:
+    """
+    Pick up to `count` bank questions matching the mixes. Questions from
+    assignments of another grade are skipped; `candidate_ids` optionally
+    restricts the pool (e.g. to topic search hits). Raises ValueError for
+    unknown mix keys.
+    """
+    args = (db, teacher_id, subject_id, count, grade_id, class_id, difficulty_mix, type_mix, candidate_ids, seed)
+    quiz = _assemble(get_index(db, teacher_id), *args)
+    if quiz.question_ids:
+        present = {q_id for (q_id,) in db.query(models.Question.id).filter(models.Question.id.in_(quiz.question_ids))}
+        if len(present) < len(quiz.question_ids):
+            # Questions deleted since the index was built (e.g. by another worker): rebuild once
+            invalidate_teacher(teacher_id)
+            quiz = _assemble(get_index(db, teacher_id), *args)
+            present = {q_id for (q_id,) in db.query(models.Question.id).filter(models.Question.id.in_(quiz.question_ids))}
+            quiz.question_ids = [q_id for q_id in quiz.question_ids if q_id in present]
+    return quiz
+
+
+def _assemble(
+    index: BankIndex,
+    db: Session,
+    teacher_id: int,
+    subject_id: int,
+    count: int,
+    grade_id: Optional[int],
+    class_id: Optional[int],
+    difficulty_mix: Optional[Dict[str, float]],
+    type_mix: Optional[Dict[str, float]],
+    candidate_ids: Optional[Set[int]],
+    seed: Optional[int],
+) -> AssembledQuiz:
+    difficulty_quota = _quotas(count, normalize_mix(difficulty_mix, DIFFICULTY_BUCKETS))
+    type_names = [t.value for t in models.QuestionType]
+    type_quota = _quotas(count, normalize_mix(type_mix, type_names))
+    seen = seen_roots(db, grade_id, class_id)
+    rng = random.Random(seed)
+
+    def pool(type_name: str, bucket: str) -> List[int]:
+        return [
+            q_id for q_id, q_grade in index.cells.get((subject_id, type_name, bucket), [])
+            if q_id not in seen
+            and (grade_id is None or q_grade is None or q_grade == grade_id)
+            and (candidate_ids is None or q_id in candidate_ids)
+        ]
+
+    selected: List[int] = []
+    chosen: Set[int] = set()
+    cells: Dict[str, int] = {}
+
+    def take(type_name: str, bucket: str, wanted: int) -> int:
+        available = [q for q in pool(type_name, bucket) if q not in chosen]
+        picked = rng.sample(available, min(wanted, len(available)))
+        selected.extend(picked)
+        chosen.update(picked)
+        if picked:
+            cells[f"{type_name}/{bucket}"] = cells.get(f"{type_name}/{bucket}", 0) + len(picked)
+        return len(picked)
+
+    # Each type's quota is spread over the difficulty mix, then shortfalls move to
+    # the nearest bucket of the same type, then to any type
+    for type_name, type_count in type_quota.items():
+        missing = 0
+        for bucket, wanted in _quotas(type_count, difficulty_quota).items():
+            got = take(type_name, bucket, wanted)
+            for neighbour in _neighbours(bucket)[1:]:
+                if got == wanted:
+                    break
+                got += take(type_name, neighbour, wanted - got)
+            missing += wanted - got
+        if missing:
+            for other in type_quota:
+                for bucket in DIFFICULTY_BUCKETS:
+                    if missing:
+                        missing -= take(other, bucket, missing)
+
+    rng.shuffle(selected)
+    logger.debug(f"Assembled {len(selected)}/{count} questions for teacher {teacher_id} from a bank of {index.size}")
+    return AssembledQuiz(question_ids=selected, requested=count, cells=cells)
@@ -0,0 +1,158 @@
+"""
+Bulk persistence of generated quizzes.
+
+An assignment, its questions and their options are written in a single
+transaction. Question ids are assigned by one flush (batched INSERT ... RETURNING
+where the driver supports it), then all options go out as a single executemany,
+instead of committing once per question. New questions are fingerprinted for
+near-duplicate detection in the same transaction.
+
+Assignments built from the question bank are cloned set-based with
+INSERT ... SELECT, so the statement count does not grow with the quiz size.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, case, insert, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+from app.services import question_dedup, question_embeddings, quiz_assembly, system_counters
+
+logger = logging.getLogger(__name__)
+
+
+def parse_question_type(value: Optional[str]) -> models.QuestionType:
+    try:
+        return models.QuestionType(value or "MULTIPLE_CHOICE")
+    except ValueError:
+        return models.QuestionType.MULTIPLE_CHOICE
+
+
+def build_question(
+    q_data: Dict,
+    school_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+) -> models.Question:
+    """Build an unsaved Question from a generated question dict (options are not attached)."""
+    return models.Question(
+        text=q_data.get("text", "Question Text"),
+        points=q_data.get("points", 5),
+        question_type=parse_question_type(q_data.get("question_type")),
+        school_id=school_id,
+        subject_id=subject_id,
+        class_id=class_id,
+        difficulty_level=difficulty
+    )
+
+
+def save_generated_quiz(
+    db: Session,
+    assignment: models.Assignment,
+    generated_questions: List[Dict],
+    school_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+) -> models.Assignment:
+    """
+    Persist a new assignment with its generated questions and options in one transaction.
+    Rolls back and re-raises on failure, so no partial quiz is left behind.
+    """
+    try:
+        db.add(assignment)
+        db.flush()
+
+        questions = []
+        for q_data in generated_questions:
+            question = build_question(q_data, school_id=school_id, subject_id=subject_id, class_id=class_id, difficulty=difficulty)
+            question.assignment_id = assignment.id
+            questions.append(question)
+        db.add_all(questions)
+        db.flush()  # assigns question ids
+
+        option_rows = [
+            {
+                "text": opt.get("text", ""),
+                "is_correct": opt.get("is_correct", False),
+                "question_id": question.id
+            }
+            for question, q_data in zip(questions, generated_questions)
+            for opt in q_data.get("options", [])
+        ]
+        if option_rows:
+            db.bulk_insert_mappings(models.QuestionOption, option_rows)
+
+        question_dedup.index_new_questions(db, assignment.teacher_id, questions)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(assignment)
+    quiz_assembly.invalidate_teacher(assignment.teacher_id)
+    question_embeddings.enqueue([q.id for q in questions])
+    logger.debug(f"Saved quiz assignment {assignment.id} with {len(questions)} questions and {len(option_rows)} options")
+    return assignment
+
+
+def clone_bank_questions(
+    db: Session,
+    assignment_id: int,
+    question_ids: List[int],
+    school_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+) -> int:
+    """
+    Clone bank questions and their options into an assignment with two set-based
+    INSERT ... SELECT statements. Clones keep the order of `question_ids` and point
+    back at their source via parent_question_id. Ownership of the source questions
+    must be validated by the caller. Does not commit. Returns the number of clones.
+    """
+    ordered_ids = list(dict.fromkeys(question_ids))
+    if not ordered_ids:
+        return 0
+
+    Question = models.Question
+    position = case({qid: idx for idx, qid in enumerate(ordered_ids)}, value=Question.id)
+
+    questions_select = select(
+        Question.text,
+        Question.points,
+        Question.question_type,
+        Question.difficulty_level,
+        literal(assignment_id),
+        literal(school_id, type_=Integer),
+        literal(subject_id, type_=Integer),
+        literal(class_id, type_=Integer),
+        Question.id
+    ).where(Question.id.in_(ordered_ids)).order_by(position)
+
+    db.execute(
+        insert(Question.__table__).from_select(
+            ["text", "points", "question_type", "difficulty_level", "assignment_id",
+             "school_id", "subject_id", "class_id", "parent_question_id"],
+            questions_select
+        )
+    )
+    system_counters.record_question_inserts(db, assignment_id, len(ordered_ids))
+
+    # Options: join each source option to its clone through parent_question_id
+    Option = models.QuestionOption
+    clone = aliased(Question)
+    options_select = select(
+        Option.text,
+        Option.is_correct,
+        clone.id
+    ).join(
+        clone, clone.parent_question_id == Option.question_id
+    ).where(
+        clone.assignment_id == assignment_id
+    ).order_by(clone.id, Option.id)
+
+    db.execute(
+        insert(Option.__table__).from_select(["text", "is_correct", "question_id"], options_select)
+    )
+    return len(ordered_ids)
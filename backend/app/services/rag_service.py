@@ -7,6 +7,8 @@ import uuid
 import json
 import asyncio
 
+from app.config import settings
+
 # Initialize clients (ensure env vars are set)
 # OPENAI_API_KEY
 
@@ -60,8 +62,11 @@ _qdrant_client = None
 def get_qdrant_client():
     global _qdrant_client
     if _qdrant_client is None:
-        # Initialize Qdrant (Local Persistent Mode)
-        _qdrant_client = QdrantClient(path="qdrant_db")
+        if settings.QDRANT_URL:
+            _qdrant_client = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY)
+        else:
+            # Initialize Qdrant (Local Persistent Mode)
+            _qdrant_client = QdrantClient(path="qdrant_db")
     return _qdrant_client
 
 async def process_chunks_async(
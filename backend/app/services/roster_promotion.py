@@ -0,0 +1,132 @@
+"""
+End-of-year roster promotion.
+
+Moves the active students of a school along a grade -> grade and class -> class
+mapping with one set-based UPDATE (plus one grouped SELECT for the report),
+instead of one update_student call per student. A class mapping takes
+precedence: students of a mapped class move to the target class and its grade.
+Other students of a mapped grade move to the next grade with no class. A grade
+mapped to None graduates: its students are deactivated and lose their class.
+
+Every SET expression reads the row's original values, and the assignments are
+ordered (active, grade_id, class_id) so MySQL, which applies them left to right,
+agrees with PostgreSQL and SQLite. A swap such as 1 -> 2, 2 -> 3 is therefore
+safe within a single statement.
+"""
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import case, false, func, null, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.services import grade_stats, school_reference, system_counters, teacher_stats
+
+
+def _validate(db: Session, school_id: int, grade_map: Dict[int, Optional[int]], class_map: Dict[int, Optional[int]]):
+    # Fresh snapshot: the mapping is usually built right after creating next year's classes
+    reference = school_reference.get_reference(db, school_id, refresh=True)
+    for grade_id in set(grade_map) | {g for g in grade_map.values() if g is not None}:
+        if grade_id not in reference.grades:
+            raise ValueError(f"Grade {grade_id} not found in this school")
+    for class_id in set(class_map) | {c for c in class_map.values() if c is not None}:
+        if class_id not in reference.classes:
+            raise ValueError(f"Class {class_id} not found in this school")
+    return reference
+
+
+def _destination(grade_id, class_id, grade_map, class_map, class_grades) -> Tuple[Optional[int], Optional[int], bool]:
+    """(grade_id, class_id, graduated) a student ends up with, mirroring the UPDATE."""
+    if class_map.get(class_id) is not None:
+        target = class_map[class_id]
+        return class_grades[target], target, False
+    if grade_id in grade_map:
+        if grade_map[grade_id] is None:
+            return grade_id, None, True
+        return grade_map[grade_id], None, False
+    return grade_id, None, False
+
+
+def promote(
+    db: Session,
+    school_id: int,
+    grade_map: Dict[int, Optional[int]],
+    class_map: Dict[int, Optional[int]],
+    dry_run: bool = False,
+) -> schemas.PromotionReport:
+    """
+    Promote the school's active students (or only report what would happen when
+    dry_run). Raises ValueError for ids outside the school. Does not commit.
+    """
+    if not grade_map and not class_map:
+        raise ValueError("Nothing to promote: grade_map and class_map are empty")
+    reference = _validate(db, school_id, grade_map, class_map)
+    class_grades = {c: row["grade_id"] for c, row in reference.classes.items()}
+
+    Student = models.Student
+    selected = [
+        Student.school_id == school_id,
+        Student.active == True,
+        or_(Student.class_id.in_(list(class_map)), Student.grade_id.in_(list(grade_map))),
+    ]
+
+    report = schemas.PromotionReport(dry_run=dry_run)
+    for grade_id, class_id, count in db.execute(
+        select(Student.grade_id, Student.class_id, func.count(Student.id))
+        .where(*selected)
+        .group_by(Student.grade_id, Student.class_id)
+        .order_by(Student.grade_id, Student.class_id)
+    ):
+        to_grade, to_class, graduated = _destination(grade_id, class_id, grade_map, class_map, class_grades)
+        report.moves.append(schemas.PromotionMove(
+            from_grade_id=grade_id, from_class_id=class_id,
+            to_grade_id=to_grade, to_class_id=to_class,
+            graduated=graduated, count=count,
+        ))
+        report.students += count
+        if graduated:
+            report.graduated += count
+        else:
+            report.promoted += count
+    if dry_run or not report.students:
+        return report
+
+    moved_classes = {c: t for c, t in class_map.items() if t is not None}
+    next_grades = {g: t for g, t in grade_map.items() if t is not None}
+    graduating = [g for g, t in grade_map.items() if t is None]
+
+    active_whens = []
+    grade_whens = []
+    if moved_classes:
+        active_whens.append((Student.class_id.in_(list(moved_classes)), Student.active))
+        grade_whens.append((
+            Student.class_id.in_(list(moved_classes)),
+            case({c: class_grades[t] for c, t in moved_classes.items()}, value=Student.class_id),
+        ))
+    if graduating:
+        active_whens.append((Student.grade_id.in_(graduating), false()))
+    if next_grades:
+        grade_whens.append((Student.grade_id.in_(list(next_grades)), case(next_grades, value=Student.grade_id)))
+
+    db.execute(
+        update(Student)
+        .where(*selected)
+        .ordered_values(
+            (Student.active, case(*active_whens, else_=Student.active) if active_whens else Student.active),
+            (Student.grade_id, case(*grade_whens, else_=Student.grade_id) if grade_whens else Student.grade_id),
+            (Student.class_id, case(moved_classes, value=Student.class_id, else_=null()) if moved_classes else null()),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    # Core UPDATE: no mapper events, so account for graduations explicitly
+    system_counters.record_bulk_change(db, school_id, "active_students", -report.graduated)
+    return report
+
+
+def affected_classes(report: schemas.PromotionReport) -> Set[int]:
+    return {c for m in report.moves for c in (m.from_class_id, m.to_class_id) if c is not None}
+
+
+def refresh_caches(school_id: int, report: schemas.PromotionReport) -> None:
+    """Drop the cached dashboards and grade listings a committed promotion changed."""
+    teacher_stats.invalidate_classes(affected_classes(report))
+    grade_stats.invalidate_schools([school_id])
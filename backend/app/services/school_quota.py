@@ -0,0 +1,79 @@
+"""
+Per-school quotas (max_teachers, max_students, max_classes).
+
+Usage is kept in counter columns on the school row instead of being counted on
+every create. `reserve` is a single conditional UPDATE, so the check and the
+increment happen atomically: concurrent creates (bulk imports) serialize on the
+school row and cannot overshoot. It runs in the caller's transaction, so a
+create that rolls back also gives its slot back. Deletes call `release`.
+A NULL limit means unlimited.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+
+TEACHERS = "teachers"
+STUDENTS = "students"
+CLASSES = "classes"
+
+# kind -> (usage column, limit column)
+_COLUMNS = {
+    TEACHERS: (models.School.teacher_count, models.School.max_teachers),
+    STUDENTS: (models.School.student_count, models.School.max_students),
+    CLASSES: (models.School.class_count, models.School.max_classes),
+}
+
+
+class QuotaExceeded(ValueError):
+    pass
+
+
+def reserve(db: Session, school_id: Optional[int], kind: str, count: int = 1, enforce: bool = True) -> None:
+    """
+    Take `count` slots of `kind` for the school. Raises QuotaExceeded (leaving
+    the counter untouched) when that would pass the school's limit. Does not
+    commit; with enforce=False the usage is recorded without checking the limit.
+    """
+    if school_id is None or count <= 0:
+        return
+    used, limit = _COLUMNS[kind]
+    stmt = update(models.School).where(models.School.id == school_id)
+    if enforce:
+        stmt = stmt.where(or_(limit == None, used + count <= limit))
+    result = db.execute(stmt.values({used.key: used + count}).execution_options(synchronize_session=False))
+    if result.rowcount == 0 and enforce:
+        max_allowed = db.query(limit).filter(models.School.id == school_id).scalar()
+        raise QuotaExceeded(f"School has reached its limit of {max_allowed} {kind}")
+
+
+def release(db: Session, school_id: Optional[int], kind: str, count: int = 1) -> None:
+    """Give back `count` slots of `kind`. Does not commit."""
+    if school_id is None or count <= 0:
+        return
+    used, _ = _COLUMNS[kind]
+    db.execute(
+        update(models.School)
+        .where(models.School.id == school_id)
+        .values({used.key: case((used > count, used - count), else_=0)})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def recount(db: Session, school_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute the usage counters from the source tables (after imports that bypass the API). Does not commit."""
+    teachers = select(func.count(models.User.id)).where(
+        models.User.school_id == models.School.id, models.User.role == models.UserRole.TEACHER
+    ).scalar_subquery()
+    students = select(func.count(models.Student.id)).where(
+        models.Student.school_id == models.School.id
+    ).scalar_subquery()
+    classes = select(func.count(models.Class.id)).where(
+        models.Class.school_id == models.School.id
+    ).scalar_subquery()
+    stmt = update(models.School).values(teacher_count=teachers, student_count=students, class_count=classes)
+    if school_ids is not None:
+        stmt = stmt.where(models.School.id.in_(list(school_ids)))
+    db.execute(stmt.execution_options(synchronize_session=False))
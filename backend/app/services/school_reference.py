@@ -0,0 +1,184 @@
+"""
+Per-school snapshot of reference data: grades, subjects, classes and the
+grade-subject map.
+
+Nearly every teacher and admin screen lists one of these, and create/update
+student validate against them. The snapshot is built lazily with one query per
+table and kept as plain dicts (id -> row) plus grade_id -> subject ids, so
+handlers filter in memory and build their responses from it. ORM hooks record
+the school of every Grade, Subject and Class written (changing a grade's
+subjects marks the grade dirty too) and the snapshot is dropped once the
+transaction commits. The TTL bounds staleness across worker processes, and a
+lookup that misses rebuilds the snapshot once before reporting "not found".
+A hit can still be stale (deleted or moved by another worker); write paths pass
+verify=True to confirm it with a primary-key lookup in their own transaction.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.utils.cache import LRUCache
+
+REFERENCE_CACHE_TTL_SECONDS = 60
+_SESSION_KEY = "school_reference_changed_schools"
+
+_snapshots = LRUCache(maxsize=2000, ttl=REFERENCE_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class SchoolReference:
+    school_id: int
+    grades: Dict[int, dict]
+    subjects: Dict[int, dict]
+    classes: Dict[int, dict]
+    grade_subjects: Dict[int, Tuple[int, ...]]
+
+    def grade(self, grade_id: int) -> Optional[dict]:
+        """Grade row with its subjects, shaped like schemas.Grade."""
+        grade = self.grades.get(grade_id)
+        if grade is None:
+            return None
+        return {**grade, "subjects": self.subjects_of_grade(grade_id)}
+
+    def subjects_of_grade(self, grade_id: int) -> List[dict]:
+        return [self.subjects[s] for s in self.grade_subjects.get(grade_id, ()) if s in self.subjects]
+
+    def class_(self, class_id: int) -> Optional[dict]:
+        """Class row with its grade, shaped like schemas.Class."""
+        cls = self.classes.get(class_id)
+        if cls is None:
+            return None
+        return {**cls, "grade": self.grade(cls["grade_id"])}
+
+    def list_grades(self, grade_ids=None) -> List[dict]:
+        ids = self.grades if grade_ids is None else [g for g in self.grades if g in grade_ids]
+        return [self.grade(g) for g in ids]
+
+    def list_subjects(self, subject_ids=None) -> List[dict]:
+        if subject_ids is None:
+            return list(self.subjects.values())
+        return [s for sid, s in self.subjects.items() if sid in subject_ids]
+
+    def list_classes(self, class_ids=None, grade_id: Optional[int] = None) -> List[dict]:
+        return [
+            self.class_(c) for c, row in self.classes.items()
+            if (class_ids is None or c in class_ids) and (grade_id is None or row["grade_id"] == grade_id)
+        ]
+
+
+def _build(db: Session, school_id: int) -> SchoolReference:
+    grades = {
+        g.id: {"id": g.id, "name": g.name, "school_id": g.school_id}
+        for g in db.query(models.Grade.id, models.Grade.name, models.Grade.school_id)
+        .filter(models.Grade.school_id == school_id).order_by(models.Grade.id)
+    }
+    subjects = {
+        s.id: {"id": s.id, "name": s.name, "code": s.code, "school_id": s.school_id}
+        for s in db.query(models.Subject.id, models.Subject.name, models.Subject.code, models.Subject.school_id)
+        .filter(models.Subject.school_id == school_id).order_by(models.Subject.id)
+    }
+    classes = {
+        c.id: {
+            "id": c.id, "name": c.name, "section": c.section, "grade_id": c.grade_id,
+            "school_id": c.school_id, "class_teacher_id": c.class_teacher_id,
+        }
+        for c in db.query(
+            models.Class.id, models.Class.name, models.Class.section, models.Class.grade_id,
+            models.Class.school_id, models.Class.class_teacher_id,
+        ).filter(models.Class.school_id == school_id).order_by(models.Class.id)
+    }
+    pairs: Dict[int, List[int]] = {}
+    link = models.grade_subjects.c
+    for grade_id, subject_id in db.query(link.grade_id, link.subject_id).join(
+        models.Grade, models.Grade.id == link.grade_id
+    ).filter(models.Grade.school_id == school_id).order_by(link.grade_id, link.subject_id):
+        pairs.setdefault(grade_id, []).append(subject_id)
+    return SchoolReference(
+        school_id=school_id,
+        grades=grades,
+        subjects=subjects,
+        classes=classes,
+        grade_subjects={g: tuple(s) for g, s in pairs.items()},
+    )
+
+
+def get_reference(db: Session, school_id: int, refresh: bool = False) -> SchoolReference:
+    snapshot = None if refresh else _snapshots.get(school_id)
+    if snapshot is None:
+        snapshot = _build(db, school_id)
+        _snapshots.set(school_id, snapshot)
+    return snapshot
+
+
+def find_grade(db: Session, school_id: int, grade_id: int, verify: bool = False) -> Optional[dict]:
+    """
+    A grade of this school, rebuilding a possibly stale snapshot once on a miss.
+    With verify, a hit is confirmed against the database (for writes that reference it).
+    """
+    grade = get_reference(db, school_id).grade(grade_id)
+    if grade is None:
+        return get_reference(db, school_id, refresh=True).grade(grade_id)
+    if verify and db.query(models.Grade.id).filter(
+        models.Grade.id == grade_id, models.Grade.school_id == school_id
+    ).first() is None:
+        invalidate_schools([school_id])
+        return None
+    return grade
+
+
+def find_class(db: Session, school_id: int, class_id: int, verify: bool = False) -> Optional[dict]:
+    """
+    A class of this school, rebuilding a possibly stale snapshot once on a miss.
+    With verify, a hit (and its grade) is confirmed against the database.
+    """
+    cls = get_reference(db, school_id).class_(class_id)
+    if cls is None:
+        return get_reference(db, school_id, refresh=True).class_(class_id)
+    if verify:
+        row = db.query(models.Class.grade_id).filter(
+            models.Class.id == class_id, models.Class.school_id == school_id
+        ).first()
+        if row is None:
+            invalidate_schools([school_id])
+            return None
+        if row.grade_id != cls["grade_id"]:
+            cls = get_reference(db, school_id, refresh=True).class_(class_id)
+    return cls
+
+
+def invalidate_schools(school_ids) -> None:
+    for school_id in set(school_ids):
+        _snapshots.invalidate(school_id)
+
+
+def clear() -> None:
+    _snapshots.clear()
+
+
+def _record_change(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    schools = session.info.setdefault(_SESSION_KEY, set())
+    schools.add(target.school_id)
+    schools.update(v for v in inspect(target).attrs.school_id.history.deleted if v is not None)
+
+
+for _model in (models.Grade, models.Subject, models.Class):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _record_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    changed = session.info.pop(_SESSION_KEY, None)
+    if changed:
+        invalidate_schools(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_SESSION_KEY, None)
@@ -0,0 +1,71 @@
+"""
+Lean admin listings of a school's students.
+
+One query projects the student columns together with the linked user's
+username, email and last_login through an outer join, and the rows become plain
+dicts. Going through ORM instances would lazy-load one User per student for
+those fields. Pages use keyset pagination on the student id: the cursor is the
+last id returned, and a page is an index range scan on (school_id, id) no
+matter how deep it is. A name prefix filter is a range on lower(name), so it can
+use the (school_id, lower(name)) index instead of scanning the school.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+MAX_PAGE_SIZE = 1000
+# Sorts after every character that can follow a prefix
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def list_students(
+    db: Session,
+    school_id: int,
+    grade_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[dict], Optional[int]]:
+    """
+    Students of a school by id, as dicts shaped like schemas.Student, and the
+    cursor of the next page (None on the last page). limit=None returns all
+    remaining rows; otherwise it is capped at MAX_PAGE_SIZE.
+    """
+    Student, User = models.Student, models.User
+    stmt = select(
+        Student.id, Student.name, Student.active, Student.school_id, Student.grade_id,
+        Student.class_id, Student.user_id,
+        User.username, User.last_login,
+        # The login user's email wins when there is a linked user
+        case((User.id != None, User.email), else_=Student.email).label("email"),
+    ).outerjoin(User, User.id == Student.user_id).where(Student.school_id == school_id)
+
+    if grade_id:
+        stmt = stmt.where(Student.grade_id == grade_id)
+    if class_id:
+        stmt = stmt.where(Student.class_id == class_id)
+    if name_prefix and name_prefix.strip():
+        lowered = name_prefix.strip().lower()
+        key = func.lower(Student.name)
+        stmt = stmt.where(key >= lowered, key < lowered + PREFIX_UPPER_BOUND)
+    if cursor:
+        stmt = stmt.where(Student.id > cursor)
+    stmt = stmt.order_by(Student.id)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        stmt = stmt.limit(limit + 1)
+
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]["id"]
+    return rows, next_cursor
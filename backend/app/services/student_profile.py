@@ -0,0 +1,56 @@
+"""
+Cached resolution of a logged-in STUDENT user to their Student profile.
+
+Every student route resolves the profile, so the user_id -> student_id mapping
+is kept in a process-local LRU. Only ids are cached; the row itself is loaded by
+primary key in the caller's session so no ORM instance outlives its session.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app import models
+from app.config import settings
+from app.utils.cache import LRUCache
+
+_profile_cache = LRUCache(maxsize=10000)
+
+
+def resolve_student(db: Session, user: models.User) -> Optional[models.Student]:
+    student_id = _profile_cache.get(user.id)
+    if student_id is not None:
+        student = db.get(models.Student, student_id)
+        if student is not None and student.school_id == user.school_id:
+            return student
+        # Stale entry (profile deleted or moved), fall through to a fresh lookup
+        _profile_cache.invalidate(user.id)
+
+    # Priority: Link via user_id
+    student = db.query(models.Student).filter(models.Student.user_id == user.id).first()
+
+    if not student and settings.STUDENT_PROFILE_LEGACY_FALLBACK:
+        # Fallback: Link via name matching (Legacy, see the user_id backfill migration)
+        student = db.query(models.Student).filter(
+            models.Student.name == user.username,
+            models.Student.school_id == user.school_id
+        ).first()
+
+    if student:
+        _profile_cache.set(user.id, student.id)
+    return student
+
+
+def invalidate_student(student: models.Student) -> None:
+    """Drop any cached mapping pointing at this student (by user or by student id)."""
+    if student.user_id is not None:
+        _profile_cache.invalidate(student.user_id)
+    _profile_cache.invalidate_where(lambda user_id, student_id: student_id == student.id)
+
+
+def clear() -> None:
+    _profile_cache.clear()
+
+
+@event.listens_for(models.Student, "after_delete")
+def _on_student_delete(mapper, connection, target):
+    invalidate_student(target)
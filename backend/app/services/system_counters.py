@@ -0,0 +1,395 @@
+"""
+Incrementally maintained dashboard totals (system_counters).
+
+One row per school plus a system-wide row (school_id SYSTEM_SCOPE) hold the
+number of schools, active students, active users, teachers, classes,
+assignments and quizzes (assignments with at least one question).
+
+Mapper hooks turn every ORM insert, update and delete of those rows into
+per-school deltas kept on the session (a teacher moving schools takes their
+assignments and quizzes along); quiz deltas are derived once per flush
+from one grouped question count of the touched assignments. When the
+transaction commits, the deltas are applied as one relative UPDATE per changed
+school in a short transaction of their own, so the hot system row is never
+locked for the duration of a request. Rolled back transactions discard their
+deltas. Core statements bypass the mapper hooks; callers that insert questions
+that way report them with record_question_inserts().
+
+reconcile() recomputes the rows from the source tables with grouped counts. It
+runs when a row is missing (first use, new school), from a periodic background
+thread, and on demand, and repairs any drift (deltas lost to a crash, rows
+changed by scripts).
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, case, event, exists, func, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SCOPE = 0
+COUNTERS = ("schools", "active_students", "active_users", "teachers", "classes", "assignments", "quizzes")
+RECONCILE_INTERVAL_SECONDS = 3600
+
+_DELTAS_KEY = "system_counter_deltas"
+_TEACHER_SCHOOLS_KEY = "system_counter_teacher_schools"
+
+_table = models.SystemCounter.__table__
+_reconciler: Optional[threading.Thread] = None
+
+
+# --- Delta collection -------------------------------------------------------
+
+def _add(session: Session, school_id: Optional[int], column: str, amount: int) -> None:
+    if not amount:
+        return
+    deltas = session.info.setdefault(_DELTAS_KEY, {})
+    for scope in {SYSTEM_SCOPE, school_id} - {None}:
+        deltas[(scope, column)] = deltas.get((scope, column), 0) + amount
+
+
+def _teacher_school(session: Session, connection: Connection, teacher_id: Optional[int]) -> Optional[int]:
+    if teacher_id is None:
+        return None
+    schools = session.info.setdefault(_TEACHER_SCHOOLS_KEY, {})
+    if teacher_id not in schools:
+        schools[teacher_id] = connection.execute(
+            select(models.User.school_id).where(models.User.id == teacher_id)
+        ).scalar()
+    return schools[teacher_id]
+
+
+# Attributes whose changes move a row between counters
+_TRACKED = {
+    models.School: (),
+    models.Student: ("active", "school_id"),
+    models.User: ("active", "role", "school_id"),
+    models.Class: ("school_id",),
+    models.Assignment: ("teacher_id",),
+}
+
+
+def _contributions(session, connection, target, value) -> List[Tuple[Optional[int], str]]:
+    """(school_id, counter) pairs a row counts towards, reading attributes through `value`."""
+    if isinstance(target, models.School):
+        return [(value("id"), "schools")]
+    if isinstance(target, models.Student):
+        return [(value("school_id"), "active_students")] if value("active") is not False else []
+    if isinstance(target, models.User):
+        pairs = [(value("school_id"), "active_users")] if value("active") is not False else []
+        if value("role") == models.UserRole.TEACHER:
+            pairs.append((value("school_id"), "teachers"))
+        return pairs
+    if isinstance(target, models.Class):
+        return [(value("school_id"), "classes")]
+    if isinstance(target, models.Assignment):
+        return [(_teacher_school(session, connection, value("teacher_id")), "assignments")]
+    return []
+
+
+def _record(connection, target, sign: int, previous: bool = False) -> None:
+    session = Session.object_session(target)
+    if session is None:
+        return
+    state = inspect(target)
+
+    def value(attr):
+        if previous:
+            deleted = state.attrs[attr].history.deleted
+            if deleted:
+                return deleted[0]
+        return getattr(target, attr)
+
+    for school_id, column in _contributions(session, connection, target, value):
+        _add(session, school_id, column, sign)
+
+
+def _after_insert(mapper, connection, target) -> None:
+    _record(connection, target, +1)
+
+
+def _after_delete(mapper, connection, target) -> None:
+    _record(connection, target, -1)
+
+
+def _after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in _TRACKED[type(target)]):
+        return
+    _record(connection, target, -1, previous=True)
+    _record(connection, target, +1)
+    if isinstance(target, models.User):
+        _move_teacher_assignments(connection, target)
+
+
+def _move_teacher_assignments(connection: Connection, target: models.User) -> None:
+    """Assignments and quizzes count towards their teacher's school, so they move with the teacher."""
+    history = inspect(target).attrs.school_id.history
+    session = Session.object_session(target)
+    if session is None or not history.has_changes():
+        return
+    old_school = history.deleted[0] if history.deleted else None
+    has_questions = exists().where(models.Question.assignment_id == models.Assignment.id)
+    assignments, quizzes = connection.execute(
+        select(func.count(models.Assignment.id), func.coalesce(func.sum(case((has_questions, 1), else_=0)), 0))
+        .where(models.Assignment.teacher_id == target.id)
+    ).one()
+    for column, amount in (("assignments", assignments), ("quizzes", quizzes)):
+        _add(session, old_school, column, -amount)
+        _add(session, target.school_id, column, amount)
+    teacher_schools = session.info.get(_TEACHER_SCHOOLS_KEY)
+    if teacher_schools is not None and target.id in teacher_schools:
+        teacher_schools[target.id] = target.school_id
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+for _model, _attrs in _TRACKED.items():
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_update", _after_update)
+    event.listen(_model, "after_delete", _after_delete)
+    # Objects expired by a commit would otherwise record no previous value on set
+    for _attr in _attrs:
+        event.listen(getattr(_model, _attr), "set", _load_previous, active_history=True, retval=True)
+
+
+def _record_question_changes(
+    session: Session,
+    connection: Connection,
+    changes: Dict[int, List[int]],
+    deleted_teachers: Dict[int, Optional[int]],
+) -> None:
+    """
+    Quiz deltas for assignments whose questions changed. `changes` maps
+    assignment id -> [inserted, deleted] question counts of this flush;
+    `deleted_teachers` maps assignments deleted in it to their teacher.
+    """
+    rows = connection.execute(
+        select(
+            models.Assignment.id,
+            models.Assignment.teacher_id,
+            func.count(models.Question.id)
+        ).outerjoin(
+            models.Question, models.Question.assignment_id == models.Assignment.id
+        ).where(
+            models.Assignment.id.in_(changes)
+        ).group_by(models.Assignment.id, models.Assignment.teacher_id)
+    ).all()
+    current = {a_id: (teacher_id, count) for a_id, teacher_id, count in rows}
+    for assignment_id, (inserted, deleted) in changes.items():
+        if assignment_id in current:
+            teacher_id, now = current[assignment_id]
+        elif assignment_id in deleted_teachers:
+            teacher_id, now = deleted_teachers[assignment_id], 0
+        else:
+            continue
+        before = now - inserted + deleted
+        if (before > 0) != (now > 0):
+            _add(session, _teacher_school(session, connection, teacher_id), "quizzes", 1 if now > 0 else -1)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context) -> None:
+    changes: Dict[int, List[int]] = {}
+    for obj in session.new:
+        if isinstance(obj, models.Question) and obj.assignment_id is not None:
+            changes.setdefault(obj.assignment_id, [0, 0])[0] += 1
+    for obj in session.deleted:
+        if isinstance(obj, models.Question) and obj.assignment_id is not None:
+            changes.setdefault(obj.assignment_id, [0, 0])[1] += 1
+    for obj in session.dirty:
+        if isinstance(obj, models.Question):
+            history = inspect(obj).attrs.assignment_id.history
+            if history.has_changes():
+                for old in history.deleted:
+                    if old is not None:
+                        changes.setdefault(old, [0, 0])[1] += 1
+                if obj.assignment_id is not None:
+                    changes.setdefault(obj.assignment_id, [0, 0])[0] += 1
+    if not changes:
+        return
+    deleted_teachers = {
+        obj.id: obj.teacher_id for obj in session.deleted if isinstance(obj, models.Assignment)
+    }
+    _record_question_changes(session, session.connection(), changes, deleted_teachers)
+
+
+def record_question_inserts(db: Session, assignment_id: int, count: int) -> None:
+    """Account for questions inserted with a Core statement (no mapper events). Call after the insert."""
+    if count:
+        _record_question_changes(db, db.connection(), {assignment_id: [count, 0]}, {})
+
+
+def record_bulk_change(db: Session, school_id: Optional[int], counter: str, amount: int) -> None:
+    """Account for rows changed with a Core UPDATE/INSERT (no mapper events). Applied on commit."""
+    _add(db, school_id, counter, amount)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    session.info.pop(_TEACHER_SCHOOLS_KEY, None)
+    if not deltas:
+        return
+    try:
+        apply_deltas(session.get_bind(), deltas)
+    except Exception as e:
+        # The periodic reconcile repairs the counters
+        logger.error(f"Could not apply system counter deltas: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session) -> None:
+    session.info.pop(_DELTAS_KEY, None)
+    session.info.pop(_TEACHER_SCHOOLS_KEY, None)
+
+
+# --- Applying and reconciling ----------------------------------------------
+
+def apply_deltas(engine: Engine, deltas: Dict[Tuple[int, str], int]) -> None:
+    """Apply {(school_id, counter): delta} as one relative UPDATE per school."""
+    by_school: Dict[int, Dict[str, int]] = {}
+    for (school_id, column), amount in deltas.items():
+        if amount:
+            by_school.setdefault(school_id, {})[column] = amount
+    if not by_school:
+        return
+    with engine.begin() as conn:
+        existing = set(conn.execute(
+            select(_table.c.school_id).where(_table.c.school_id.in_(by_school))
+        ).scalars())
+        if SYSTEM_SCOPE not in existing:
+            # Never initialised: the committed data already contains this change
+            _reconcile(conn, None)
+            return
+        missing = set(by_school) - existing
+        if missing:
+            _reconcile(conn, missing)
+        rows = [
+            dict({f"d_{c}": changes.get(c, 0) for c in COUNTERS}, scope=school_id)
+            for school_id, changes in by_school.items() if school_id not in missing
+        ]
+        if rows:
+            stmt = update(_table).where(_table.c.school_id == bindparam("scope")).values(
+                {**{c: _table.c[c] + bindparam(f"d_{c}") for c in COUNTERS}, "updated_at": datetime.utcnow()}
+            )
+            conn.execute(stmt, rows)
+
+
+def _grouped(conn: Connection, stmt) -> Dict[Optional[int], int]:
+    return {school_id: count for school_id, count in conn.execute(stmt).all()}
+
+
+def _reconcile(conn: Connection, school_ids: Optional[Set[int]]) -> None:
+    """Recompute counter rows from the source tables (all rows if school_ids is None)."""
+    assignments_by_school = select(
+        models.User.school_id, func.count(models.Assignment.id)
+    ).select_from(models.Assignment).outerjoin(
+        models.User, models.User.id == models.Assignment.teacher_id
+    ).group_by(models.User.school_id)
+    has_questions = exists().where(models.Question.assignment_id == models.Assignment.id)
+    counts = {
+        "schools": _grouped(conn, select(models.School.id, func.count()).group_by(models.School.id)),
+        "active_students": _grouped(conn, select(models.Student.school_id, func.count()).where(
+            models.Student.active.is_not(False)).group_by(models.Student.school_id)),
+        "active_users": _grouped(conn, select(models.User.school_id, func.count()).where(
+            models.User.active.is_not(False)).group_by(models.User.school_id)),
+        "teachers": _grouped(conn, select(models.User.school_id, func.count()).where(
+            models.User.role == models.UserRole.TEACHER).group_by(models.User.school_id)),
+        "classes": _grouped(conn, select(models.Class.school_id, func.count()).group_by(models.Class.school_id)),
+        "assignments": _grouped(conn, assignments_by_school),
+        "quizzes": _grouped(conn, assignments_by_school.where(has_questions)),
+    }
+    school_rows = set(counts["schools"])
+    targets = (school_rows | {SYSTEM_SCOPE}) if school_ids is None else (set(school_ids) & school_rows)
+    now = datetime.utcnow()
+    values = {}
+    for school_id in targets:
+        if school_id == SYSTEM_SCOPE:
+            values[school_id] = {c: sum(counts[c].values()) for c in COUNTERS}
+        else:
+            values[school_id] = {c: counts[c].get(school_id, 0) for c in COUNTERS}
+
+    existing = set(conn.execute(select(_table.c.school_id)).scalars())
+    if school_ids is None:
+        stale = existing - targets
+        if stale:
+            conn.execute(_table.delete().where(_table.c.school_id.in_(stale)))
+    updates = [
+        dict({f"v_{c}": row[c] for c in COUNTERS}, scope=school_id)
+        for school_id, row in values.items() if school_id in existing
+    ]
+    inserts = [
+        dict(row, school_id=school_id, updated_at=now)
+        for school_id, row in values.items() if school_id not in existing
+    ]
+    if updates:
+        conn.execute(
+            update(_table).where(_table.c.school_id == bindparam("scope")).values(
+                {**{c: bindparam(f"v_{c}") for c in COUNTERS}, "updated_at": now}
+            ),
+            updates
+        )
+    if inserts:
+        try:
+            with conn.begin_nested():
+                conn.execute(_table.insert(), inserts)
+        except IntegrityError:
+            # Another worker created the rows concurrently
+            logger.info("System counter rows were created concurrently, skipping insert")
+
+
+def reconcile(engine: Engine, school_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute every counter row (or only those of school_ids) in one transaction."""
+    with engine.begin() as conn:
+        _reconcile(conn, set(school_ids) if school_ids is not None else None)
+    logger.info("Reconciled system counters" + (f" for schools {sorted(school_ids)}" if school_ids is not None else ""))
+
+
+def _run_reconciler(engine: Engine, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            reconcile(engine)
+        except Exception as e:
+            logger.error(f"System counter reconcile failed: {e}")
+
+
+def start_reconciler(engine: Engine, interval: float = RECONCILE_INTERVAL_SECONDS) -> None:
+    """Start the periodic background reconcile (once per process)."""
+    global _reconciler
+    if _reconciler is None or not _reconciler.is_alive():
+        _reconciler = threading.Thread(
+            target=_run_reconciler, args=(engine, interval), name="system-counters-reconcile", daemon=True
+        )
+        _reconciler.start()
+
+
+# --- Reads -----------------------------------------------------------------
+
+def get_totals(db: Session, school_id: int = SYSTEM_SCOPE) -> models.SystemCounter:
+    """The counter row of a school or the system (reconciled first if it does not exist yet)."""
+    row = db.get(models.SystemCounter, school_id)
+    if row is None:
+        reconcile(db.get_bind(), None if school_id == SYSTEM_SCOPE else [school_id])
+        row = db.get(models.SystemCounter, school_id)
+    return row
+
+
+def list_school_totals(db: Session, skip: int = 0, limit: int = 100) -> List[Tuple[models.SystemCounter, str]]:
+    """Per-school counter rows with school names, by school id."""
+    if db.get(models.SystemCounter, SYSTEM_SCOPE) is None:
+        reconcile(db.get_bind())
+    return db.query(models.SystemCounter, models.School.name).join(
+        models.School, models.School.id == models.SystemCounter.school_id
+    ).order_by(models.SystemCounter.school_id).offset(skip).limit(limit).all()
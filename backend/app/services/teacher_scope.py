@@ -0,0 +1,140 @@
+"""
+Materialized teacher visibility scope (visible classes and grades).
+
+A teacher sees a class when a TeacherAssignment names that class, or names its
+grade with no class. Evaluating that OR-join on every request defeats indexes, so
+the result is stored in `teacher_class_scope` and refreshed whenever
+TeacherAssignment rows or classes change. Reads go through a per-process cache;
+the TTL bounds staleness in other workers, which do not see local invalidations.
+
+A teacher's rows are built lazily on first read, in a short-lived session of
+their own, so a GET handler never commits its request session. A
+TeacherScopeBuild row marks the scope as built (even when it is empty); its
+primary key makes a concurrent build of the same teacher back off.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import FrozenSet, Iterable, List, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.cache import LRUCache
+
+SCOPE_CACHE_TTL_SECONDS = 60
+
+_scope_cache = LRUCache(maxsize=5000, ttl=SCOPE_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class TeacherScope:
+    class_ids: FrozenSet[int]
+    grade_ids: FrozenSet[int]
+
+
+def _scope_rows(db: Session, teacher_id: int) -> List[Tuple[int, int]]:
+    return db.query(models.TeacherClassScope.grade_id, models.TeacherClassScope.class_id).filter(
+        models.TeacherClassScope.teacher_id == teacher_id
+    ).all()
+
+
+def _build(db: Session, teacher_id: int) -> List[Tuple[int, int]]:
+    """Materialize a teacher's scope in its own transaction; returns the rows."""
+    with Session(bind=db.get_bind()) as build:
+        try:
+            build.add(models.TeacherScopeBuild(teacher_id=teacher_id, built_at=datetime.utcnow()))
+            build.flush()
+        except IntegrityError:
+            # Another request built it first (its commit is what released the key)
+            build.rollback()
+            return _scope_rows(build, teacher_id)
+        refresh_teacher(build, teacher_id)
+        build.commit()
+        return _scope_rows(build, teacher_id)
+
+
+def get_scope(db: Session, teacher_id: int) -> TeacherScope:
+    scope = _scope_cache.get(teacher_id)
+    if scope is not None:
+        return scope
+
+    rows = _scope_rows(db, teacher_id)
+    if not rows and db.get(models.TeacherScopeBuild, teacher_id) is None:
+        # Not materialized yet (new teacher or pre-existing data)
+        rows = _build(db, teacher_id)
+
+    scope = TeacherScope(
+        class_ids=frozenset(c for _, c in rows if c is not None),
+        grade_ids=frozenset(g for g, c in rows if c is None),
+    )
+    _scope_cache.set(teacher_id, scope)
+    return scope
+
+
+def refresh_teacher(db: Session, teacher_id: int) -> None:
+    """Rebuild the scope rows of one teacher. Does not commit."""
+    db.query(models.TeacherClassScope).filter(
+        models.TeacherClassScope.teacher_id == teacher_id
+    ).delete(synchronize_session=False)
+
+    grade_ids = [g for (g,) in db.query(models.TeacherAssignment.grade_id).filter(
+        models.TeacherAssignment.teacher_id == teacher_id,
+        models.TeacherAssignment.grade_id != None
+    ).distinct().all()]
+
+    class_ids = set(c for (c,) in db.query(models.TeacherAssignment.class_id).filter(
+        models.TeacherAssignment.teacher_id == teacher_id,
+        models.TeacherAssignment.class_id != None
+    ).all())
+
+    classes = []
+    if grade_ids or class_ids:
+        whole_grades = [g for (g,) in db.query(models.TeacherAssignment.grade_id).filter(
+            models.TeacherAssignment.teacher_id == teacher_id,
+            models.TeacherAssignment.class_id == None
+        ).distinct().all()]
+        query = db.query(models.Class.id, models.Class.grade_id)
+        if whole_grades:
+            query = query.filter(models.Class.id.in_(class_ids) | models.Class.grade_id.in_(whole_grades))
+        else:
+            query = query.filter(models.Class.id.in_(class_ids))
+        classes = query.all()
+
+    rows = [{"teacher_id": teacher_id, "grade_id": g, "class_id": None} for g in grade_ids]
+    rows += [{"teacher_id": teacher_id, "grade_id": g, "class_id": c} for c, g in classes]
+    if rows:
+        db.bulk_insert_mappings(models.TeacherClassScope, rows)
+    if db.get(models.TeacherScopeBuild, teacher_id) is None:
+        db.add(models.TeacherScopeBuild(teacher_id=teacher_id, built_at=datetime.utcnow()))
+
+
+def refresh_grade(db: Session, grade_id: int) -> List[int]:
+    """Rebuild the scope of every teacher assigned to a grade. Returns their ids."""
+    teacher_ids = [t for (t,) in db.query(models.TeacherAssignment.teacher_id).filter(
+        models.TeacherAssignment.grade_id == grade_id
+    ).distinct().all()]
+    for teacher_id in teacher_ids:
+        refresh_teacher(db, teacher_id)
+    return teacher_ids
+
+
+def drop_class(db: Session, class_id: int) -> List[int]:
+    """Remove a class from all scopes before it is deleted. Returns affected teacher ids."""
+    teacher_ids = [t for (t,) in db.query(models.TeacherClassScope.teacher_id).filter(
+        models.TeacherClassScope.class_id == class_id
+    ).distinct().all()]
+    db.query(models.TeacherClassScope).filter(
+        models.TeacherClassScope.class_id == class_id
+    ).delete(synchronize_session=False)
+    return teacher_ids
+
+
+def invalidate(teacher_ids: Iterable[int]) -> None:
+    """Drop cached scopes. Call after the transaction that changed them has committed."""
+    for teacher_id in teacher_ids:
+        _scope_cache.invalidate(teacher_id)
+
+
+def clear() -> None:
+    _scope_cache.clear()
@@ -0,0 +1,78 @@
+"""
+Teacher dashboard statistics.
+
+Per-class student counts are computed with one grouped aggregate over the
+teacher's materialized scope and kept in a short-TTL per-teacher cache that is
+invalidated when students are created in, or moved between, classes.
+"""
+from typing import Iterable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.services import teacher_scope
+from app.utils.cache import LRUCache
+
+DASHBOARD_CACHE_TTL_SECONDS = 30
+
+# teacher_id -> (frozenset of class ids the stats cover, DashboardStats).
+# A cached entry is only served while it matches the teacher's current scope.
+_dashboard_cache = LRUCache(maxsize=5000, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+
+def get_dashboard_stats(db: Session, teacher_id: int) -> schemas.DashboardStats:
+    scope = teacher_scope.get_scope(db, teacher_id)
+    cached = _dashboard_cache.get(teacher_id)
+    if cached is not None and cached[0] == scope.class_ids:
+        # Scope unchanged since the stats were computed
+        return cached[1]
+
+    rows = []
+    if scope.class_ids:
+        rows = db.query(
+            models.Class.id,
+            models.Class.name,
+            models.Class.section,
+            models.Grade.name,
+            func.count(models.Student.id)
+        ).outerjoin(
+            models.Grade, models.Grade.id == models.Class.grade_id
+        ).outerjoin(
+            models.Student, models.Student.class_id == models.Class.id
+        ).filter(
+            models.Class.id.in_(scope.class_ids)
+        ).group_by(
+            models.Class.id, models.Class.name, models.Class.section, models.Grade.name
+        ).order_by(models.Class.id).all()
+
+    class_stats_list = [
+        schemas.ClassStats(
+            id=class_id,
+            name=name,
+            section=section,
+            student_count=student_count,
+            grade_name=grade_name or "Unknown Grade"
+        )
+        for class_id, name, section, grade_name, student_count in rows
+    ]
+
+    stats = schemas.DashboardStats(
+        total_students=sum(c.student_count for c in class_stats_list),
+        total_classes=len(class_stats_list),
+        classes=class_stats_list
+    )
+    _dashboard_cache.set(teacher_id, (scope.class_ids, stats))
+    return stats
+
+
+def invalidate_classes(class_ids: Iterable[int]) -> None:
+    """Drop cached dashboards covering any of these classes (student created or moved)."""
+    changed = {c for c in class_ids if c is not None}
+    if not changed:
+        return
+    _dashboard_cache.invalidate_where(lambda teacher_id, entry: not changed.isdisjoint(entry[0]))
+
+
+def clear() -> None:
+    _dashboard_cache.clear()
@@ -0,0 +1,54 @@
+"""
+Request-level size limit for upload endpoints.
+
+Starlette parses multipart forms before the endpoint runs and spools every file
+to a temporary file as it goes, so a limit checked in the handler only applies
+after the whole body has been received. This ASGI middleware rejects a request
+with 413 as soon as its Content-Length is over the limit, without reading the
+body, and counts the bytes of bodies sent without one (chunked), failing the
+request once they pass the limit.
+"""
+from typing import Sequence
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Allowance for the multipart boundaries and the small form fields next to the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_bytes: int, path_prefixes: Sequence[str]):
+        self.app = app
+        self.max_bytes = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.path_prefixes = tuple(path_prefixes)
+        self.detail = f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT")
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the form is parsed; FastAPI passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
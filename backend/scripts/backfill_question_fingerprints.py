@@ -0,0 +1,26 @@
+"""
+Fingerprint bank questions that predate near-duplicate detection.
+
+The application does the same in a background thread at startup when
+QUESTION_DEDUP_MODE is not "off"; run this to index the banks ahead of
+enabling it, or to finish a backfill that was interrupted.
+
+Usage (from backend/):
+    python scripts/backfill_question_fingerprints.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database
+from app.services import question_dedup
+
+
+def main():
+    stats = question_dedup.backfill(database.engine)
+    print(f"Fingerprinted {stats['indexed']} bank questions ({stats['skipped']} teachers skipped, rerun to retry)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: the same textbook uploaded by many schools.
+
+Seeds a throwaway SQLite database and storage root, then has S schools
+(default 20) each upload the same N MB PDF (default 50), as
+upload_training_material does. It runs once with the per-school copies stored
+before the blob store (file_storage.stage_upload + commit into
+{school}/{grade}/{subject}/) and once through blob_store.store_upload. Reports
+the first and the average duplicate upload time, and the disk used.
+
+Finally it lays out the per-school copies again as legacy artifacts, runs
+blob_store.migrate_legacy_files over them and reports its time and the disk
+used before and after.
+
+Usage (from backend/):
+    python scripts/benchmark_blob_store.py [school_count] [size_mb]
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_blob_store.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from sqlalchemy import text
+from app import database, models
+from app.services import blob_store, file_storage
+
+MAX_BYTES = 1 << 40
+
+
+def disk_usage(root):
+    return sum(
+        os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files
+    ) / (1024 * 1024)
+
+
+def make_upload(content):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(content)
+    spooled.seek(0)
+    return UploadFile(spooled, size=len(content), filename="textbook.pdf")
+
+
+def seed(school_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (:id, :name)"),
+                     [{"id": s, "name": f"School {s}"} for s in range(1, school_count + 1)])
+
+
+async def store_legacy(db, upload, root, school_id):
+    directory = os.path.join(root, str(school_id), "1", "1")
+    staged = await file_storage.stage_upload(upload, directory, MAX_BYTES)
+    relative_path = os.path.join(str(school_id), "1", "1", "textbook.pdf")
+    file_storage.commit(staged, os.path.join(root, relative_path))
+    return relative_path, staged.sha256
+
+
+async def store_blob(db, upload, root, school_id):
+    blob, _ = await blob_store.store_upload(db, upload, root, "pdf", MAX_BYTES)
+    return blob.relative_path, blob.content_hash
+
+
+async def run(label, store, content, school_count, root):
+    timings = []
+    for school_id in range(1, school_count + 1):
+        upload = make_upload(content)
+        db = database.SessionLocal()
+        try:
+            start = time.perf_counter()
+            relative_path, content_hash = await store(db, upload, root, school_id)
+            db.add(models.FileArtifact(
+                school_id=school_id, original_filename="textbook.pdf", relative_path=relative_path,
+                stored_filename=os.path.basename(relative_path), content_hash=content_hash, file_size=len(content),
+            ))
+            db.commit()
+            timings.append(time.perf_counter() - start)
+        finally:
+            db.close()
+            upload.file.close()
+    duplicates = timings[1:] or timings
+    print(f"  {label:<8} first {timings[0] * 1000:7.1f} ms  duplicate avg {sum(duplicates) / len(duplicates) * 1000:7.1f} ms  "
+          f"disk {disk_usage(root):7.1f} MB")
+
+
+def reset_artifacts():
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM file_artifacts"))
+        conn.execute(text("DELETE FROM file_blobs"))
+
+
+if __name__ == "__main__":
+    school_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    content = b"%PDF-1.4\n" + os.urandom(size_mb * 1024 * 1024)
+    seed(school_count)
+
+    print(f"{school_count} schools uploading the same {size_mb} MB textbook:")
+    for label, store in (("legacy", store_legacy), ("blobs", store_blob)):
+        root = tempfile.mkdtemp()
+        try:
+            asyncio.run(run(label, store, content, school_count, root))
+        finally:
+            shutil.rmtree(root)
+            reset_artifacts()
+
+    print("Background migration of the per-school copies:")
+    root = tempfile.mkdtemp()
+    try:
+        asyncio.run(run("legacy", store_legacy, content, school_count, root))
+        before = disk_usage(root)
+        start = time.perf_counter()
+        stats = blob_store.migrate_legacy_files(database.engine, root)
+        print(f"  migrate  {(time.perf_counter() - start) * 1000:7.1f} ms  disk {before:7.1f} MB -> "
+              f"{disk_usage(root):7.1f} MB  {stats}")
+    finally:
+        shutil.rmtree(root)
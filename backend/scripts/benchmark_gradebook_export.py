@@ -0,0 +1,101 @@
+"""
+Benchmark: streaming gradebook export for a large school.
+
+Seeds a throwaway SQLite database with one school of N students (default
+20,000) and M published assignments (default 50), each graded for every
+student (1M submissions by default), then drains the CSV and XLSX export
+streams like a StreamingResponse would and reports student rows per second,
+output size and peak resident memory growth during each export.
+
+Usage (from backend/):
+    python scripts/benchmark_gradebook_export.py [student_count] [assignment_count]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_gradebook_export.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import database, models
+from app.services import gradebook_export
+
+SCHOOL_ID = 1
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size (Linux), falling back to the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def seed(student_count, assignment_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (1, 'Bench School')"))
+        conn.execute(text("INSERT INTO users (id, username, hashed_password, role, school_id) VALUES (1, 'bench', 'x', 'TEACHER', 1)"))
+        conn.execute(text("INSERT INTO classes (id, name, school_id) VALUES (1, 'Bench class', 1)"))
+        conn.execute(text(
+            "INSERT INTO assignments (id, title, teacher_id, class_id, status) VALUES (:id, :title, 1, 1, 'PUBLISHED')"
+        ), [{"id": a, "title": f"Quiz {a}"} for a in range(1, assignment_count + 1)])
+        conn.execute(text(
+            "INSERT INTO students (id, name, school_id, class_id, active) VALUES (:id, :name, 1, 1, 1)"
+        ), [{"id": s, "name": f"Student {s}"} for s in range(1, student_count + 1)])
+        batch = []
+        for s in range(1, student_count + 1):
+            for a in range(1, assignment_count + 1):
+                batch.append({"a": a, "s": s, "g": str((s * 7 + a * 13) % 11)})
+            if len(batch) >= 50000:
+                conn.execute(text(
+                    "INSERT INTO submissions (assignment_id, student_id, status, grade) VALUES (:a, :s, 'GRADED', :g)"
+                ), batch)
+                batch = []
+        if batch:
+            conn.execute(text(
+                "INSERT INTO submissions (assignment_id, student_id, status, grade) VALUES (:a, :s, 'GRADED', :g)"
+            ), batch)
+
+
+def run(fmt, student_count):
+    db = database.SessionLocal()
+    try:
+        columns = gradebook_export.gradebook_columns(db, SCHOOL_ID)
+    finally:
+        db.close()
+    body, _ = gradebook_export.export(fmt, SCHOOL_ID, columns)
+    baseline = rss_bytes()
+    peak = baseline
+    size = 0
+    start = time.perf_counter()
+    for chunk in body:
+        size += len(chunk)
+        peak = max(peak, rss_bytes())
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {fmt:<5} {student_count / elapsed:9.0f} rows/s  {elapsed:6.1f}s  "
+        f"{size / 2**20:7.1f} MiB out  peak RSS +{(peak - baseline) / 2**20:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    assignment_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    start = time.perf_counter()
+    seed(student_count, assignment_count)
+    print(f"Seeded {student_count} students x {assignment_count} assignments "
+          f"({student_count * assignment_count} submissions) in {time.perf_counter() - start:.1f}s")
+    print(f"Gradebook export, RSS before export {rss_bytes() / 2**20:.0f} MiB:")
+    run("csv", student_count)
+    run("xlsx", student_count)
+    if gradebook_export.parquet_available():
+        run("parquet", student_count)
+    else:
+        print("  parquet skipped (pyarrow not installed)")
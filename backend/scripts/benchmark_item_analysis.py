@@ -0,0 +1,103 @@
+"""
+Benchmark: item analysis for a large assignment.
+
+Seeds a throwaway SQLite database with one assignment of N items (default 100),
+4 options each, answered by M students (default 10,000), then times
+item_analysis.analyze_assignment end to end (answer load + NumPy statistics),
+the pure NumPy part on its own, and a cached repeat (no query). The first call
+also pays for one-time ORM setup, so the uncached time is taken from a second
+call after clearing the report cache; it must stay under BUDGET_MS for
+10,000 x 100 (exit status 1 otherwise).
+
+Usage (from backend/):
+    python scripts/benchmark_item_analysis.py [student_count] [item_count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_item_analysis.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import text
+from app import database, models
+from app.services import item_analysis
+
+OPTIONS_PER_ITEM = 4
+BUDGET_MS = 1000  # uncached report, 10,000 students x 100 items
+
+
+def seed(student_count, item_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = np.random.default_rng(42)
+    ability = rng.random(student_count)
+    easiness = rng.uniform(0.2, 0.9, item_count)
+    correct = rng.random((student_count, item_count)) < (ability[:, None] * 0.6 + easiness[None, :] * 0.4)
+    wrong_choice = rng.integers(1, OPTIONS_PER_ITEM, (student_count, item_count))
+
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO assignments (id, title, teacher_id) VALUES (1, 'Bench', 1)"))
+        conn.execute(text(
+            "INSERT INTO questions (id, text, points, question_type, assignment_id) "
+            "VALUES (:id, 'Item', 1, 'MULTIPLE_CHOICE', 1)"
+        ), [{"id": q + 1} for q in range(item_count)])
+        conn.execute(text(
+            "INSERT INTO question_options (id, text, is_correct, question_id) VALUES (:id, :text, :ok, :qid)"
+        ), [
+            {"id": q * OPTIONS_PER_ITEM + k + 1, "text": "ABCD"[k], "ok": k == 0, "qid": q + 1}
+            for q in range(item_count) for k in range(OPTIONS_PER_ITEM)
+        ])
+        conn.execute(text(
+            "INSERT INTO submissions (id, assignment_id, student_id, status) VALUES (:id, 1, :id, 'GRADED')"
+        ), [{"id": s + 1} for s in range(student_count)])
+        for s0 in range(0, student_count, 1000):
+            batch = []
+            for s in range(s0, min(s0 + 1000, student_count)):
+                for q in range(item_count):
+                    ok = bool(correct[s, q])
+                    option = 0 if ok else int(wrong_choice[s, q])
+                    batch.append({
+                        "sid": s + 1, "qid": q + 1, "ok": ok, "pts": int(ok),
+                        "opt": q * OPTIONS_PER_ITEM + option + 1,
+                    })
+            conn.execute(text(
+                "INSERT INTO student_answers (submission_id, question_id, selected_option_id, is_correct, points_awarded) "
+                "VALUES (:sid, :qid, :opt, :ok, :pts)"
+            ), batch)
+    return correct.astype(np.float64)
+
+
+if __name__ == "__main__":
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    item_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    start = time.perf_counter()
+    matrix = seed(student_count, item_count)
+    print(f"Seeded {student_count} students x {item_count} items in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    item_analysis.analyze_matrix(matrix)
+    print(f"NumPy statistics only:   {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    db = database.SessionLocal()
+    try:
+        start = time.perf_counter()
+        item_analysis.analyze_assignment(db, 1)
+        print(f"analyze_assignment first: {(time.perf_counter() - start) * 1000:7.1f} ms")
+        item_analysis.clear()
+        start = time.perf_counter()
+        report = item_analysis.analyze_assignment(db, 1)
+        uncached_ms = (time.perf_counter() - start) * 1000
+        print(f"analyze_assignment cold: {uncached_ms:8.1f} ms")
+        start = time.perf_counter()
+        item_analysis.analyze_assignment(db, 1)
+        print(f"analyze_assignment warm: {(time.perf_counter() - start) * 1000:8.1f} ms")
+        print(f"Cronbach's alpha: {report['cronbach_alpha']:.3f}, mean score: {report['mean_score']:.1f}")
+    finally:
+        db.close()
+
+    if student_count * item_count <= 10000 * 100 and uncached_ms > BUDGET_MS:
+        print(f"FAIL: uncached report took {uncached_ms:.0f} ms (budget {BUDGET_MS} ms)")
+        sys.exit(1)
@@ -0,0 +1,88 @@
+"""
+Benchmark: typeahead name search over a large school.
+
+Seeds a throwaway SQLite database with one school of N students (default
+100,000; first and last names drawn from a few hundred combinations), spread
+over 200 classes, then times name_search.search_students for typical typeahead
+inputs. Inputs are 1-5 character prefixes, inner substrings and misses. They
+run at school scope (admin) and at a teacher's visibility scope of 5 classes.
+Reports p50 / p95 / max latency per kind of input.
+
+Usage (from backend/):
+    python scripts/benchmark_name_search.py [student_count]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_name_search.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import database, models
+from app.services import name_search
+
+SCHOOL_ID = 1
+CLASS_COUNT = 200
+FIRST = ["Aarav", "Aditi", "Akira", "Amelia", "Ananya", "Arjun", "Benjamin", "Chen", "Chloe", "Daniel",
+         "Diya", "Elena", "Emma", "Farah", "Gabriel", "Hana", "Ishaan", "Isabella", "Jamal", "Kavya",
+         "Liam", "Lucas", "Maya", "Mei", "Mohammed", "Nadia", "Noah", "Olivia", "Priya", "Rahul",
+         "Rohan", "Sakura", "Sofia", "Tariq", "Vihaan", "Wei", "Yusuf", "Zara", "Zoe", "Omar"]
+LAST = ["Sharma", "Patel", "Nguyen", "Kim", "Garcia", "Smith", "Okafor", "Ivanova", "Rossi", "Tanaka",
+        "Khan", "Silva", "Müller", "Cohen", "Haddad", "Mensah", "Novak", "Reddy", "Iyer", "Lopez"]
+QUERIES = {
+    "prefix-1": ["a", "m", "z", "s"],
+    "prefix-2": ["ar", "li", "zo", "pr"],
+    "prefix-3+": ["ana", "moha", "sakur", "benj"],
+    "substring": ["harm", "atel", "kura", "ssi", "nak"],
+    "miss": ["qqq", "xylo", "zzzz"],
+}
+
+
+def seed(student_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = random.Random(42)
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (1, 'Bench School')"))
+        conn.execute(text("INSERT INTO grades (id, name, school_id) VALUES (1, 'Grade 1', 1)"))
+        conn.execute(text("INSERT INTO classes (id, name, section, grade_id, school_id) VALUES (:id, :id, 'A', 1, 1)"),
+                     [{"id": c} for c in range(1, CLASS_COUNT + 1)])
+        conn.execute(text(
+            "INSERT INTO students (id, name, school_id, grade_id, class_id, active) VALUES (:id, :name, 1, 1, :c, 1)"
+        ), [
+            {"id": s, "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}", "c": s % CLASS_COUNT + 1}
+            for s in range(1, student_count + 1)
+        ])
+    # Builds the FTS5 trigram table over the existing rows
+    name_search.ensure_name_search_index(database.engine)
+
+
+def measure(label, class_ids=None, grade_ids=None, repeats=20):
+    db = database.SessionLocal()
+    try:
+        for kind, queries in QUERIES.items():
+            timings = []
+            for _ in range(repeats):
+                for q in queries:
+                    start = time.perf_counter()
+                    name_search.search_students(db, SCHOOL_ID, q, limit=10, class_ids=class_ids, grade_ids=grade_ids)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"  {label:<8} {kind:<10} p50 {statistics.median(timings):6.2f} ms  "
+                  f"p95 {timings[int(len(timings) * 0.95) - 1]:6.2f} ms  max {timings[-1]:6.2f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    start = time.perf_counter()
+    seed(student_count)
+    print(f"Seeded and indexed {student_count} students in {time.perf_counter() - start:.1f}s")
+    print("Typeahead (limit 10):")
+    measure("school")
+    measure("teacher", class_ids=set(range(1, 6)), grade_ids=set())
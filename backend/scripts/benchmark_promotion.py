@@ -0,0 +1,86 @@
+"""
+Benchmark: end-of-year roster promotion for a large school.
+
+Seeds a throwaway SQLite database with one school of G grades (default 12)
+with C classes each (default 8) and N active students (default 10,000) spread
+over the classes, then promotes every grade to the next one (class k of grade g
+to class k of grade g+1, the last grade graduating), first as a dry run and then
+for real, and reports wall time and statement count of each.
+
+Usage (from backend/):
+    python scripts/benchmark_promotion.py [student_count] [grade_count] [classes_per_grade]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_promotion.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, text
+from app import database, models
+from app.services import roster_promotion
+
+SCHOOL_ID = 1
+
+
+def seed(student_count, grade_count, classes_per_grade):
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (1, 'Bench School')"))
+        conn.execute(text("INSERT INTO grades (id, name, school_id) VALUES (:id, :name, 1)"),
+                     [{"id": g, "name": f"Grade {g}"} for g in range(1, grade_count + 1)])
+        conn.execute(text("INSERT INTO classes (id, name, section, grade_id, school_id) VALUES (:id, :name, :s, :g, 1)"), [
+            {"id": (g - 1) * classes_per_grade + k, "name": f"{g}-{k}", "s": str(k), "g": g}
+            for g in range(1, grade_count + 1) for k in range(1, classes_per_grade + 1)
+        ])
+        class_count = grade_count * classes_per_grade
+        conn.execute(text(
+            "INSERT INTO students (id, name, school_id, grade_id, class_id, active) VALUES (:id, :name, 1, :g, :c, 1)"
+        ), [
+            {"id": s, "name": f"Student {s}", "c": s % class_count + 1, "g": (s % class_count) // classes_per_grade + 1}
+            for s in range(1, student_count + 1)
+        ])
+
+
+def run(grade_count, classes_per_grade, dry_run):
+    grade_map = {g: (g + 1 if g < grade_count else None) for g in range(1, grade_count + 1)}
+    class_map = {
+        (g - 1) * classes_per_grade + k: g * classes_per_grade + k
+        for g in range(1, grade_count) for k in range(1, classes_per_grade + 1)
+    }
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(database.engine, "before_cursor_execute", listener)
+    db = database.SessionLocal()
+    try:
+        start = time.perf_counter()
+        report = roster_promotion.promote(db, SCHOOL_ID, grade_map, class_map, dry_run=dry_run)
+        db.commit()
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+        event.remove(database.engine, "before_cursor_execute", listener)
+    label = "dry run" if dry_run else "promote"
+    print(f"  {label:<8} {elapsed * 1000:8.1f} ms  {len(statements):3d} statements  "
+          f"{report.promoted} promoted, {report.graduated} graduated")
+
+
+if __name__ == "__main__":
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    grade_count = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    classes_per_grade = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    start = time.perf_counter()
+    seed(student_count, grade_count, classes_per_grade)
+    print(f"Seeded {student_count} students in {grade_count} grades x {classes_per_grade} classes "
+          f"in {time.perf_counter() - start:.1f}s")
+    print("Roster promotion:")
+    run(grade_count, classes_per_grade, dry_run=True)
+    run(grade_count, classes_per_grade, dry_run=False)
+    db = database.SessionLocal()
+    active = db.query(func.count(models.Student.id)).filter(models.Student.active == True).scalar()
+    top = db.query(func.count(models.Student.id)).filter(models.Student.grade_id == 1).scalar()
+    db.close()
+    print(f"  after: {active} active students, {top} left in grade 1")
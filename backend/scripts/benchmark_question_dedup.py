@@ -0,0 +1,117 @@
+"""
+Benchmark: insert-time overhead of the near-duplicate index on a large bank.
+
+Seeds a throwaway SQLite database with N bank questions (default 100k) for one
+teacher, fingerprints them (the backfill path), then saves 20-question
+generated quizzes with QUESTION_DEDUP_MODE=off and =flag and compares the
+per-quiz time. A quarter of each quiz repeats existing bank questions with
+small edits, so the duplicate path is exercised too.
+
+Usage (from backend/):
+    python scripts/benchmark_question_dedup.py [question_count] [runs]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_question_dedup.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import database, models
+from app.config import settings
+from app.services import question_dedup, quiz_store
+
+VOCABULARY = (
+    "plant cell energy light water photosynthesis atom molecule force motion gravity planet "
+    "solar system river mountain climate history empire war treaty fraction decimal equation "
+    "triangle angle area volume grammar noun verb adjective poem story author democracy "
+    "economy market trade culture language music rhythm algebra geometry probability"
+).split()
+QUIZ_SIZE = 20
+
+
+def question_text(rng):
+    return "Which statement about " + " ".join(rng.sample(VOCABULARY, 7)) + " is correct?"
+
+
+def seed(question_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = random.Random(7)
+    texts = [question_text(rng) for _ in range(question_count)]
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, hashed_password, role) VALUES (1, 'bench', 'x', 'TEACHER')"))
+        conn.execute(text("INSERT INTO assignments (id, title, teacher_id) VALUES (1, 'Bank', 1)"))
+        conn.execute(text(
+            "INSERT INTO questions (id, text, points, question_type, assignment_id, subject_id) "
+            "VALUES (:id, :text, 1, 'MULTIPLE_CHOICE', 1, 1)"
+        ), [{"id": i + 1, "text": t} for i, t in enumerate(texts)])
+    return texts
+
+
+def make_quiz(rng, bank_texts):
+    quiz = []
+    for i in range(QUIZ_SIZE):
+        if i % 4 == 0:
+            # Near-duplicate of an existing question: case and punctuation changes
+            base = rng.choice(bank_texts)
+            q_text = base.upper().replace("?", " ?!")
+        else:
+            q_text = question_text(rng)
+        quiz.append({
+            "text": q_text,
+            "question_type": "MULTIPLE_CHOICE",
+            "points": 1,
+            "options": [{"text": f"Option {k}", "is_correct": k == 0} for k in range(4)],
+        })
+    return quiz
+
+
+def time_quizzes(mode, runs, bank_texts):
+    settings.QUESTION_DEDUP_MODE = mode
+    rng = random.Random(mode)
+    samples = []
+    duplicates = 0
+    for _ in range(runs):
+        quiz = make_quiz(rng, bank_texts)
+        db = database.SessionLocal()
+        try:
+            start = time.perf_counter()
+            assignment = quiz_store.save_generated_quiz(
+                db, models.Assignment(title="Bench", teacher_id=1), quiz, subject_id=1
+            )
+            samples.append((time.perf_counter() - start) * 1000)
+            duplicates += db.query(models.QuestionFingerprint).join(
+                models.Question, models.Question.id == models.QuestionFingerprint.question_id
+            ).filter(
+                models.Question.assignment_id == assignment.id,
+                models.QuestionFingerprint.duplicate_of_id != None
+            ).count()
+        finally:
+            db.close()
+    return statistics.median(samples), duplicates
+
+
+if __name__ == "__main__":
+    question_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    bank_texts = seed(question_count)
+    db = database.SessionLocal()
+    try:
+        start = time.perf_counter()
+        question_dedup.backfill_teacher(db, 1)
+        db.commit()
+        elapsed = time.perf_counter() - start
+        print(f"Fingerprinted {question_count} bank questions in {elapsed:.1f}s ({question_count / elapsed:.0f}/s)")
+    finally:
+        db.close()
+
+    off_ms, _ = time_quizzes("off", runs, bank_texts)
+    flag_ms, duplicates = time_quizzes("flag", runs, bank_texts)
+    print(f"{QUIZ_SIZE}-question quiz save, median of {runs}:")
+    print(f"  dedup off   {off_ms:7.1f} ms")
+    print(f"  dedup flag  {flag_ms:7.1f} ms  (+{flag_ms - off_ms:.1f} ms, {duplicates}/{runs * QUIZ_SIZE // 4} planted near-duplicates flagged)")
@@ -0,0 +1,96 @@
+"""
+Benchmark: ranked full-text question search on a large bank.
+
+Seeds a throwaway SQLite database with N questions (default 500k) for one
+teacher, then compares question_search.search_questions (FTS5 + bm25, facets,
+highlighting) with the old unranked ILIKE '%term%' filter.
+
+Usage (from backend/):
+    python scripts/benchmark_question_search.py [question_count]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_question_search.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import database, models
+from app.services import question_search
+
+VOCABULARY = (
+    "plant cell energy light water photosynthesis atom molecule force motion gravity planet "
+    "solar system river mountain climate history empire war treaty fraction decimal equation "
+    "triangle angle area volume grammar noun verb adjective poem story author democracy "
+    "economy market trade culture language music rhythm algebra geometry probability"
+).split()
+QUERIES = ["photosynthesis", "solar system", "equation", "triangle area", "grammar noun", "plan"]
+
+
+def seed(question_count):
+    models.Base.metadata.create_all(bind=database.engine)
+    question_search.ensure_search_index(database.engine)
+    rng = random.Random(42)
+    with database.engine.begin() as conn:
+        conn.execute(text("INSERT INTO assignments (id, title, teacher_id) VALUES (1, 'Bank', 1)"))
+        batch = []
+        for i in range(1, question_count + 1):
+            words = rng.sample(VOCABULARY, 8)
+            batch.append({
+                "id": i,
+                "text": "Explain the " + " ".join(words) + "?",
+                "subject_id": rng.randint(1, 8),
+                "difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+            })
+            if len(batch) == 10000:
+                conn.execute(text(
+                    "INSERT INTO questions (id, text, points, question_type, assignment_id, subject_id, difficulty_level) "
+                    "VALUES (:id, :text, 1, 'MULTIPLE_CHOICE', 1, :subject_id, :difficulty)"
+                ), batch)
+                batch = []
+        if batch:
+            conn.execute(text(
+                "INSERT INTO questions (id, text, points, question_type, assignment_id, subject_id, difficulty_level) "
+                "VALUES (:id, :text, 1, 'MULTIPLE_CHOICE', 1, :subject_id, :difficulty)"
+            ), batch)
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def ilike_search(db, term):
+    return db.query(models.Question).join(models.Assignment).filter(
+        models.Assignment.teacher_id == 1,
+        models.Question.parent_question_id == None,
+        models.Question.text.ilike(f"%{term}%")
+    ).all()
+
+
+if __name__ == "__main__":
+    question_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    start = time.perf_counter()
+    seed(question_count)
+    print(f"Seeded {question_count} questions (with FTS triggers) in {time.perf_counter() - start:.1f}s")
+
+    db = database.SessionLocal()
+    try:
+        print(f"{'query':<16} {'fts page':>10} {'fts p2':>10} {'ilike all':>10} {'matches':>9}")
+        for term in QUERIES:
+            first = question_search.search_questions(db, term, teacher_id=1, limit=20)
+            fts_ms = timed(lambda: question_search.search_questions(db, term, teacher_id=1, limit=20))
+            fts_p2_ms = timed(lambda: question_search.search_questions(db, term, teacher_id=1, limit=20, cursor=first["next_cursor"])) if first["next_cursor"] else 0.0
+            ilike_ms = timed(lambda: ilike_search(db, term), repeat=1)
+            matches = sum(f["count"] for f in first["facets"]["difficulty"])
+            print(f"{term:<16} {fts_ms:8.1f}ms {fts_p2_ms:8.1f}ms {ilike_ms:8.1f}ms {matches:9d}")
+    finally:
+        db.close()
@@ -0,0 +1,93 @@
+"""
+Benchmark: persisting a 100-question generated quiz.
+
+Compares the old per-question commit loop with quiz_store.save_generated_quiz
+on a throwaway SQLite file database (fsync per commit is what dominates).
+
+Usage (from backend/):
+    python scripts/benchmark_quiz_store.py [question_count] [runs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_quiz_store.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import database, models
+from app.services import quiz_store
+
+models.Base.metadata.create_all(bind=database.engine)
+
+
+def make_questions(count):
+    return [
+        {
+            "text": f"Generated question {i}?",
+            "question_type": "MULTIPLE_CHOICE",
+            "points": 5,
+            "options": [{"text": f"Option {k}", "is_correct": k == 0} for k in range(4)],
+        }
+        for i in range(count)
+    ]
+
+
+def new_assignment():
+    return models.Assignment(title="Bench Quiz", status=models.AssignmentStatus.DRAFT, teacher_id=1, exam_type="Quiz")
+
+
+def legacy_save(db, generated_questions):
+    assignment = new_assignment()
+    db.add(assignment)
+    db.commit()
+    db.refresh(assignment)
+    for q_data in generated_questions:
+        new_q = models.Question(
+            text=q_data["text"],
+            points=q_data["points"],
+            question_type=models.QuestionType(q_data["question_type"]),
+            assignment_id=assignment.id,
+        )
+        db.add(new_q)
+        db.commit()
+        db.refresh(new_q)
+        for opt in q_data["options"]:
+            db.add(models.QuestionOption(text=opt["text"], is_correct=opt["is_correct"], question_id=new_q.id))
+    db.commit()
+
+
+def bulk_save(db, generated_questions):
+    quiz_store.save_generated_quiz(db, new_assignment(), generated_questions, school_id=1, subject_id=1)
+
+
+def measure(label, fn, generated_questions, runs):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    for _ in range(runs):
+        db = database.SessionLocal()
+        try:
+            fn(db, generated_questions)
+        finally:
+            db.close()
+    elapsed = (time.perf_counter() - start) / runs
+    event.remove(database.engine, "before_cursor_execute", count)
+    print(f"{label:<12} {elapsed * 1000:9.1f} ms/quiz   {len(statements) / runs:7.0f} statements/quiz")
+    return elapsed
+
+
+if __name__ == "__main__":
+    question_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    questions = make_questions(question_count)
+
+    print(f"--- Persisting {question_count}-question quizzes ({runs} runs) ---")
+    legacy = measure("per-commit", legacy_save, questions, runs)
+    bulk = measure("quiz_store", bulk_save, questions, runs)
+    print(f"Speedup: {legacy / bulk:.1f}x")
@@ -0,0 +1,101 @@
+"""
+Benchmark: storing a large training-material upload.
+
+Builds an UploadFile over a spooled temp file of N MB (default 200, the size of
+a large scanned textbook) and stores it twice: once the old way (one
+shutil.copyfileobj inside the request coroutine, then os.path.getsize), and
+once through file_storage.stage_upload + commit (chunked, hashed, temp file +
+rename). A ticker task runs on the event loop meanwhile, standing in for the
+other requests the server is handling. Reports wall time, throughput and the
+longest the ticker was kept waiting. Also checks that an upload over the limit
+with no declared size stops after one chunk and leaves no file behind.
+
+Usage (from backend/):
+    python scripts/benchmark_upload.py [size_mb]
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from app.services import file_storage
+
+TICK = 0.005
+
+
+def make_upload(size_mb, declare_size=True):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        spooled.write(block)
+    spooled.seek(0)
+    return UploadFile(spooled, size=size_mb * 1024 * 1024 if declare_size else None, filename="book.pdf")
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def legacy(upload, directory):
+    path = os.path.join(directory, "legacy.pdf")
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+    return os.path.getsize(path)
+
+
+async def streaming(upload, directory):
+    staged = await file_storage.stage_upload(upload, directory, 1 << 40)
+    file_storage.commit(staged, os.path.join(directory, "streamed.pdf"))
+    return staged.size
+
+
+async def measure(label, store, size_mb, directory):
+    upload = make_upload(size_mb)
+    stop, lags = asyncio.Event(), []
+    tick_task = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    size = await store(upload, directory)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    upload.file.close()
+    print(f"  {label:<10} {elapsed * 1000:8.1f} ms  {size / (1024 * 1024) / elapsed:7.1f} MB/s  "
+          f"max loop stall {max(lags) * 1000:7.1f} ms")
+
+
+async def oversized(directory):
+    upload = make_upload(20, declare_size=False)
+    start = time.perf_counter()
+    try:
+        await file_storage.stage_upload(upload, directory, 5 * 1024 * 1024)
+        print("  limit      NOT enforced")
+    except file_storage.UploadTooLarge:
+        read = upload.file.tell() / (1024 * 1024)
+        left = [f for f in os.listdir(directory) if f.startswith(file_storage.TEMP_PREFIX)]
+        print(f"  limit      rejected 20 MB upload against 5 MB limit after reading {read:.0f} MB "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms, {len(left)} temp files left")
+    upload.file.close()
+
+
+async def main(size_mb):
+    directory = tempfile.mkdtemp()
+    try:
+        print(f"Storing a {size_mb} MB upload:")
+        await measure("legacy", legacy, size_mb, directory)
+        await measure("streaming", streaming, size_mb, directory)
+        await oversized(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,29 @@
+"""
+Recompute question_lineage_stats counts from student_answers.
+
+Use it after the question_lineage_stats migration, or when a worker died with
+buffered deltas. The super admin /stats/reconcile endpoint does the same.
+
+Usage (from backend/):
+    python scripts/rebuild_question_stats.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database
+from app.services import question_stats
+
+
+def main():
+    db = database.SessionLocal()
+    try:
+        lineages = question_stats.rebuild(db)
+        print(f"Rebuilt answer statistics for {lineages} question lineages")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import itertools
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# One throwaway SQLite database for the whole run; app.database reads DATABASE_URL at import time,
+# so it has to be set before any test module imports the app
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from app import auth, database, models
+# Importing the app creates the schema and the search indexes
+from app.main import app
+
+# School names and usernames are unique and every module shares the database
+_seed_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(username):
+        return {"Authorization": "Bearer " + auth.create_access_token({"sub": username})}
+    return headers
+
+
+@pytest.fixture
+def seed_school(db):
+    """Factory for a school with one teacher, grade and subject; flushed, the caller commits."""
+    def seed(**school_fields):
+        number = next(_seed_numbers)
+        school = models.School(name=f"Test School {number}", **school_fields)
+        db.add(school)
+        db.flush()
+        teacher = models.User(username=f"test_teacher_{number}", hashed_password="x",
+                              role=models.UserRole.TEACHER, school_id=school.id)
+        grade = models.Grade(name="Grade 1", school_id=school.id)
+        subject = models.Subject(name="Science", school_id=school.id)
+        db.add_all([teacher, grade, subject])
+        db.flush()
+        return SimpleNamespace(school=school, teacher=teacher, grade=grade, subject=subject)
+    return seed
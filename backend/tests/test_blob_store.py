@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+
+from fastapi import UploadFile
+from app import database, models
+from app.services import blob_store
+
+MAX_BYTES = 10 * 1024 * 1024
+
+
+def make_upload(content):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(content)
+    spooled.seek(0)
+    return UploadFile(spooled, size=len(content), filename="textbook.pdf")
+
+
+def upload(db, root, school_id, content):
+    blob, created = asyncio.run(blob_store.store_upload(db, make_upload(content), root, "pdf", MAX_BYTES))
+    artifact = models.FileArtifact(
+        school_id=school_id, original_filename="textbook.pdf", relative_path=blob.relative_path,
+        stored_filename=os.path.basename(blob.relative_path), content_hash=blob.content_hash, file_size=len(content),
+    )
+    db.add(artifact)
+    db.commit()
+    return artifact, created
+
+
+def ref_count(db, content_hash):
+    db.expire_all()
+    blob = db.get(models.FileBlob, content_hash)
+    return blob.ref_count if blob else None
+
+
+def test_identical_uploads_share_one_blob_until_the_last_delete(db, seed_school):
+    root = tempfile.mkdtemp()
+    school_id = seed_school().school.id
+    db.commit()
+    content = b"%PDF-1.4\n" + os.urandom(64 * 1024)
+    first, created_first = upload(db, root, school_id, content)
+    second, created_second = upload(db, root, school_id, content)
+    other, _ = upload(db, root, school_id, b"%PDF-1.4\n" + os.urandom(1024))
+
+    assert (created_first, created_second) == (True, False)
+    assert first.relative_path == second.relative_path != other.relative_path
+    content_hash, other_hash = first.content_hash, other.content_hash
+    assert ref_count(db, content_hash) == 2
+    path = os.path.join(root, first.relative_path)
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+    blob_store.delete_artifact(db, root, first)
+    assert ref_count(db, content_hash) == 1
+    assert os.path.exists(path)
+
+    blob_store.delete_artifact(db, root, db.get(models.FileArtifact, second.id))
+    assert ref_count(db, content_hash) is None
+    assert not os.path.exists(path)
+    assert os.listdir(os.path.dirname(path)) == []
+    assert ref_count(db, other_hash) == 1
+
+
+def test_failed_create_leaves_no_file_but_keeps_shared_ones(db, seed_school):
+    root = tempfile.mkdtemp()
+    school_id = seed_school().school.id
+    db.commit()
+    content = b"%PDF-1.4\n" + os.urandom(32 * 1024)
+    blob, created = asyncio.run(blob_store.store_upload(db, make_upload(content), root, "pdf", MAX_BYTES))
+    content_hash, relative_path = blob.content_hash, blob.relative_path
+    assert created
+    db.rollback()
+    blob_store.discard_unreferenced(database.engine, root, content_hash, relative_path)
+    assert ref_count(db, content_hash) is None
+    assert not os.path.exists(os.path.join(root, relative_path))
+
+    # The file of a blob another artifact references survives a failed upload of the same bytes
+    kept, _ = upload(db, root, school_id, content)
+    asyncio.run(blob_store.store_upload(db, make_upload(content), root, "pdf", MAX_BYTES))
+    db.rollback()
+    blob_store.discard_unreferenced(database.engine, root, kept.content_hash, kept.relative_path)
+    assert ref_count(db, kept.content_hash) == 1
+    assert os.path.exists(os.path.join(root, kept.relative_path))
@@ -0,0 +1,65 @@
+from app import models
+from app.services import bulk_grading
+
+
+def seed_assignment(db, seed_school, grades):
+    """One 2-point and one 0-point question; one submission per entry of `grades`, each with 1 point so far."""
+    seed = seed_school()
+    assignment = models.Assignment(title="Bulk", teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+    db.add(assignment)
+    db.flush()
+    questions = [
+        models.Question(text=f"Bulk question {points}", assignment_id=assignment.id, points=points,
+                        question_type=models.QuestionType.SHORT_ANSWER)
+        for points in (2, 0)
+    ]
+    db.add_all(questions)
+    db.flush()
+    student_ids = []
+    for i, grade in enumerate(grades):
+        student = models.Student(name=f"Bulk Student {i}", school_id=seed.school.id, grade_id=seed.grade.id)
+        db.add(student)
+        db.flush()
+        submission = models.Submission(assignment_id=assignment.id, student_id=student.id, grade=grade)
+        db.add(submission)
+        db.flush()
+        db.add_all([
+            models.StudentAnswer(submission_id=submission.id, question_id=questions[0].id, points_awarded=1, is_correct=False),
+            # Stored as correct by an older grading run
+            models.StudentAnswer(submission_id=submission.id, question_id=questions[1].id, points_awarded=0, is_correct=True),
+        ])
+        student_ids.append(student.id)
+    db.commit()
+    return assignment.id, [q.id for q in questions], student_ids
+
+
+def test_teacher_entered_grades_are_kept_and_computed_ones_follow(db, seed_school):
+    previous = bulk_grading.format_grade(1)
+    assignment_id, question_ids, student_ids = seed_assignment(db, seed_school, [None, previous, "A-", "1.0"])
+
+    result = bulk_grading.grade_matrix(db, assignment_id, student_ids, question_ids, [[2, 0]] * 4)
+
+    # Missing and previously computed grades follow the new total; anything else was typed by the teacher
+    assert [t["grade"] for t in result["totals"]] == ["2", "2", "A-", "1.0"]
+    grades = dict(db.query(models.Submission.student_id, models.Submission.grade).filter(
+        models.Submission.assignment_id == assignment_id
+    ).all())
+    assert [grades[sid] for sid in student_ids] == ["2", "2", "A-", "1.0"]
+    assert all(t["total_points"] == 2 for t in result["totals"])
+
+
+def test_zero_point_questions_are_never_correct(db, seed_school):
+    assignment_id, (full_id, zero_id), student_ids = seed_assignment(db, seed_school, [None, None])
+
+    bulk_grading.grade_matrix(db, assignment_id, student_ids, [full_id, zero_id], [[2, 0], [1, 0]])
+
+    correct = {
+        (submission_student, question_id): is_correct
+        for submission_student, question_id, is_correct in db.query(
+            models.Submission.student_id, models.StudentAnswer.question_id, models.StudentAnswer.is_correct
+        ).join(models.Submission).filter(models.Submission.assignment_id == assignment_id).all()
+    }
+    assert correct[(student_ids[0], full_id)] is True
+    assert correct[(student_ids[0], zero_id)] is False
+    assert correct[(student_ids[1], full_id)] is False
+    assert correct[(student_ids[1], zero_id)] is False
@@ -0,0 +1,49 @@
+from sqlalchemy import event
+from app import database, models
+from app.services import teacher_scope, teacher_stats
+
+
+def seed_teacher_with_classes(db, seed_school, class_count, students_per_class=3):
+    seed = seed_school()
+    school, teacher, grade, subject = seed.school, seed.teacher, seed.grade, seed.subject
+    for i in range(class_count):
+        cls = models.Class(name=f"1-{i}", section=str(i), grade_id=grade.id, school_id=school.id)
+        db.add(cls)
+        db.flush()
+        for j in range(students_per_class):
+            db.add(models.Student(name=f"Student {i}-{j}", school_id=school.id, grade_id=grade.id, class_id=cls.id))
+    # Whole-grade assignment: teacher sees every class of the grade
+    db.add(models.TeacherAssignment(teacher_id=teacher.id, subject_id=subject.id, grade_id=grade.id))
+    db.commit()
+    return teacher.id
+
+
+def count_statements(fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = fn()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", before_cursor_execute)
+    return result, statements
+
+
+def test_dashboard_stats_statement_budget(db, seed_school):
+    for class_count in (2, 25):
+        teacher_id = seed_teacher_with_classes(db, seed_school, class_count)
+        # Warm the materialized scope so only the stats query is measured
+        teacher_scope.get_scope(db, teacher_id)
+        teacher_stats.clear()
+
+        stats, statements = count_statements(lambda: teacher_stats.get_dashboard_stats(db, teacher_id))
+        assert stats.total_classes == class_count
+        assert stats.total_students == class_count * 3
+        assert len(statements) <= 2, statements
+
+        # Served from the per-teacher cache
+        _, statements = count_statements(lambda: teacher_stats.get_dashboard_stats(db, teacher_id))
+        assert len(statements) == 0
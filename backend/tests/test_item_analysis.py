@@ -0,0 +1,127 @@
+import math
+
+import numpy as np
+from app import models
+from app.services import bulk_grading, item_analysis
+
+# 4 students x 3 items; row totals 3, 2, 1, 0
+MATRIX = [
+    [1, 1, 1],
+    [1, 1, 0],
+    [1, 0, 0],
+    [0, 0, 0],
+]
+
+
+def test_statistics_match_hand_computed_values():
+    stats = item_analysis.analyze_matrix(np.array(MATRIX))
+
+    assert np.allclose(stats["difficulty"], [0.75, 0.5, 0.25])
+    # Item 1: item deviations (.25, .25, .25, -.75), rest score (2, 1, 0, 0) -> .75 / sqrt(.75 * 2.75)
+    # Item 2: item deviations (.5, .5, -.5, -.5), rest score (2, 1, 1, 0) -> 1 / sqrt(1 * 2)
+    # Item 3 mirrors item 1
+    assert np.allclose(stats["discrimination"], [math.sqrt(3 / 11), math.sqrt(1 / 2), math.sqrt(3 / 11)])
+    # Item variances .25 + 1/3 + .25, total variance 5/3 -> 3/2 * (1 - (5/6) / (5/3))
+    assert math.isclose(stats["alpha"], 0.75)
+
+
+def test_item_without_variance_has_no_discrimination():
+    stats = item_analysis.analyze_matrix(np.array([[1, 1], [1, 0], [1, 1]]))
+    assert np.allclose(stats["difficulty"], [1.0, 2 / 3])
+    assert math.isnan(stats["discrimination"][0])
+
+
+def seed_assignment(db, seed_school):
+    seed = seed_school()
+    school, teacher, grade, subject = seed.school, seed.teacher, seed.grade, seed.subject
+    assignment = models.Assignment(title="Fractions", teacher_id=teacher.id, grade_id=grade.id, subject_id=subject.id)
+    db.add(assignment)
+    db.flush()
+    questions = [
+        models.Question(text=f"Fraction question {j}", assignment_id=assignment.id, subject_id=subject.id,
+                        question_type=models.QuestionType.SHORT_ANSWER, points=2)
+        for j in range(3)
+    ]
+    db.add_all(questions)
+    db.flush()
+    students = []
+    for i, row in enumerate(MATRIX):
+        student = models.Student(name=f"Item Student {i}", school_id=school.id, grade_id=grade.id)
+        db.add(student)
+        db.flush()
+        submission = models.Submission(assignment_id=assignment.id, student_id=student.id)
+        db.add(submission)
+        db.flush()
+        for question, correct in zip(questions, row):
+            db.add(models.StudentAnswer(submission_id=submission.id, question_id=question.id,
+                                        is_correct=bool(correct), points_awarded=2 * correct))
+        students.append(student.id)
+    db.commit()
+    return assignment.id, [q.id for q in questions], students
+
+
+def test_reports_agree_on_mean_score_and_follow_regrades(db, seed_school):
+    assignment_id, question_ids, student_ids = seed_assignment(db, seed_school)
+
+    report = item_analysis.analyze_assignment(db, assignment_id)
+    assert report["students"] == 4
+    assert [item["difficulty"] for item in report["items"]] == [0.75, 0.5, 0.25]
+    # Mean total points: (6 + 4 + 2 + 0) / 4
+    assert report["mean_score"] == 3.0
+    assert item_analysis.analyze_bank_question(db, question_ids[0])["mean_score"] == 3.0
+
+    # A bulk regrade (no mapper events) still refreshes the cached reports
+    bulk_grading.grade_matrix(db, assignment_id, student_ids[3:], question_ids[:1], [[2]])
+    report = item_analysis.analyze_assignment(db, assignment_id)
+    assert report["items"][0]["difficulty"] == 1.0
+    assert report["mean_score"] == 3.5
+    assert item_analysis.analyze_bank_question(db, question_ids[0])["mean_score"] == 3.5
+
+    # So does an answer written through the ORM
+    answer = db.query(models.StudentAnswer).filter(
+        models.StudentAnswer.question_id == question_ids[2], models.StudentAnswer.is_correct == True
+    ).one()
+    answer.is_correct, answer.points_awarded = False, 0
+    db.commit()
+    assert item_analysis.analyze_assignment(db, assignment_id)["items"][2]["difficulty"] == 0.0
+
+
+def test_distractor_counts_pool_clone_options_by_position(db, seed_school):
+    seed = seed_school()
+    questions = {}
+    for title, parent in (("Source", None), ("Clone", "Source")):
+        assignment = models.Assignment(title=title, teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+        db.add(assignment)
+        db.flush()
+        question = models.Question(text="Pick the prime", assignment_id=assignment.id, subject_id=seed.subject.id,
+                                   parent_question_id=questions[parent].id if parent else None, points=1)
+        question.options = [models.QuestionOption(text=text, is_correct=text == "7") for text in ("4", "7", "9")]
+        db.add(question)
+        db.flush()
+        questions[title] = question
+    # Source picks: 7, 7, 4; clone picks: 9, 7 and one blank answer
+    for title, picks in (("Source", [1, 1, 0]), ("Clone", [2, 1, None])):
+        question = questions[title]
+        for pick in picks:
+            student = models.Student(name=f"Distractor Student {title} {pick}", school_id=seed.school.id, grade_id=seed.grade.id)
+            db.add(student)
+            db.flush()
+            submission = models.Submission(assignment_id=question.assignment_id, student_id=student.id)
+            db.add(submission)
+            db.flush()
+            db.add(models.StudentAnswer(
+                submission_id=submission.id, question_id=question.id,
+                selected_option_id=question.options[pick].id if pick is not None else None,
+                is_correct=pick == 1, points_awarded=int(pick == 1)
+            ))
+    db.commit()
+
+    item = item_analysis.analyze_assignment(db, questions["Source"].assignment_id)["items"][0]
+    assert (item["responses"], item["difficulty"]) == (3, 2 / 3)
+    assert [(d["text"], d["count"]) for d in item["distractors"]] == [("4", 1), ("7", 2), ("9", 0)]
+
+    report = item_analysis.analyze_bank_question(db, questions["Source"].id)
+    item = report["items"][0]
+    assert (report["students"], item["responses"], item["difficulty"]) == (6, 6, 0.5)
+    assert [(d["text"], d["count"]) for d in item["distractors"]] == [("4", 1), ("7", 3), ("9", 1)]
+    assert item["distractors"][1]["share"] == 0.5
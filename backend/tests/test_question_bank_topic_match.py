@@ -0,0 +1,60 @@
+from app import models
+from app.routers import teacher
+from app.services import question_search
+
+
+def seed_bank(db, seed_school):
+    seed = seed_school()
+    assignment = models.Assignment(title="Plants", teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+    db.add(assignment)
+    db.flush()
+    # Every question is full of stopwords, none is about the water cycle
+    parts = ["chlorophyll", "stomata", "sunlight", "glucose", "carbon dioxide", "oxygen",
+             "the cuticle", "xylem vessels", "guard cells", "chloroplasts", "the palisade layer", "starch"]
+    for part in parts:
+        db.add(models.Question(
+            text=f"What is the role of {part} in the leaf during photosynthesis?",
+            assignment_id=assignment.id, subject_id=seed.subject.id, school_id=seed.school.id,
+            question_type=models.QuestionType.SHORT_ANSWER, difficulty_level="Medium", points=1,
+        ))
+    db.commit()
+    return seed
+
+
+def test_topic_match_ignores_stopwords_and_requires_every_term(db, seed_school):
+    seed = seed_bank(db, seed_school)
+    match = lambda topic: question_search.match_question_ids(
+        db, topic, teacher_id=seed.teacher.id, subject_id=seed.subject.id
+    )
+    assert match("the water cycle") == []
+    assert match("What is the") == []
+    assert match("leaf water") == []
+    assert len(match("photosynthesis in the leaf")) == 12
+
+
+def test_unrelated_topic_still_goes_through_generation(db, seed_school, client, auth_headers, monkeypatch):
+    seed = seed_bank(db, seed_school)
+    calls = []
+
+    async def fake_generate_quiz_questions(**kwargs):
+        calls.append(kwargs["topic"])
+        return [
+            {"text": f"Where does evaporation happen? ({i})", "type": "Short Answer", "points": 1, "options": []}
+            for i in range(kwargs["count"])
+        ]
+
+    monkeypatch.setattr(teacher.rag_service, "generate_quiz_questions", fake_generate_quiz_questions)
+    headers = auth_headers(seed.teacher.username)
+    request = dict(grade_level="7", difficulty="Medium", question_count=3,
+                   subject_id=seed.subject.id, grade_id=seed.grade.id)
+
+    response = client.post("/teacher/assignments/ai-generate", headers=headers, json=dict(request, topic="the water cycle"))
+    assert response.status_code == 200, response.text
+    assert calls == ["the water cycle"]
+    assert response.json()["title"] == "AI Quiz: the water cycle"
+
+    # A topic the bank covers is still assembled without the LLM
+    response = client.post("/teacher/assignments/ai-generate", headers=headers, json=dict(request, topic="photosynthesis"))
+    assert response.status_code == 200, response.text
+    assert calls == ["the water cycle"]
+    assert response.json()["title"] == "Quiz: photosynthesis"
@@ -0,0 +1,72 @@
+from app import models
+from app.config import settings
+from app.services import question_dedup
+
+TEXT = "What is the boiling point of water at sea level, in degrees Celsius?"
+
+
+def seed_questions(db, seed_school, texts, other_subject_texts=()):
+    seed = seed_school()
+    other_subject = models.Subject(name="Chemistry", school_id=seed.school.id)
+    db.add(other_subject)
+    db.flush()
+    assignment = models.Assignment(title="Bank", teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+    db.add(assignment)
+    db.flush()
+    questions = [
+        models.Question(text=text, assignment_id=assignment.id, subject_id=subject_id,
+                        question_type=models.QuestionType.SHORT_ANSWER, points=1)
+        for subject_id, batch in ((seed.subject.id, texts), (other_subject.id, other_subject_texts))
+        for text in batch
+    ]
+    db.add_all(questions)
+    db.flush()
+    question_dedup.index_new_questions(db, seed.teacher.id, questions)
+    db.commit()
+    return seed.teacher, [q.id for q in questions]
+
+
+def parents(db, question_ids):
+    db.expire_all()
+    return [db.get(models.Question, q_id).parent_question_id for q_id in question_ids]
+
+
+def duplicate_of(db, question_ids):
+    rows = dict(db.query(models.QuestionFingerprint.question_id, models.QuestionFingerprint.duplicate_of_id).filter(
+        models.QuestionFingerprint.question_id.in_(question_ids)
+    ).all())
+    return [rows.get(q_id) for q_id in question_ids]
+
+
+def test_merge_mode_survives_deleting_the_canonical_question(db, seed_school, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "QUESTION_DEDUP_MODE", "merge")
+    teacher, (first, second, third, other) = seed_questions(
+        db, seed_school, [TEXT, TEXT.upper(), TEXT.replace(",", "")], other_subject_texts=[TEXT]
+    )
+    # The same text in another subject is not a duplicate
+    assert parents(db, [first, second, third, other]) == [None, first, first, None]
+
+    response = client.delete(f"/teacher/questions/{first}", headers=auth_headers(teacher.username))
+    assert response.status_code == 200
+    assert parents(db, [second, third, other]) == [None, second, None]
+    assert duplicate_of(db, [second, third]) == [None, second]
+
+
+def test_edited_text_is_fingerprinted_again(db, seed_school, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "QUESTION_DEDUP_MODE", "merge")
+    teacher, (first, second) = seed_questions(db, seed_school, [TEXT, TEXT.lower()])
+    headers = auth_headers(teacher.username)
+    assert parents(db, [second]) == [first]
+
+    response = client.put(f"/teacher/questions/{second}", headers=headers,
+                          json={"text": "Name the process by which plants turn sunlight into chemical energy."})
+    assert response.status_code == 200, response.text
+    assert parents(db, [first, second]) == [None, None]
+    assert duplicate_of(db, [first, second]) == [None, None]
+
+    # Editing the canonical to match the other question hands it the canonical role
+    response = client.put(f"/teacher/questions/{first}", headers=headers,
+                          json={"text": "Name the process by which plants turn sunlight into chemical energy!"})
+    assert response.status_code == 200, response.text
+    assert parents(db, [first, second]) == [second, None]
+    assert duplicate_of(db, [first, second]) == [second, None]
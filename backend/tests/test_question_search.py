@@ -0,0 +1,47 @@
+import base64
+
+from app import models
+
+
+def seed_bank(db, seed_school, texts):
+    seed = seed_school()
+    assignment = models.Assignment(title="Search", teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+    db.add(assignment)
+    db.flush()
+    db.add_all([
+        models.Question(text=text, assignment_id=assignment.id, subject_id=seed.subject.id, school_id=seed.school.id,
+                        question_type=models.QuestionType.SHORT_ANSWER, difficulty_level="Easy", points=1)
+        for text in texts
+    ])
+    db.commit()
+    return seed.teacher
+
+
+def test_highlight_escapes_question_text(db, seed_school, client, auth_headers):
+    teacher = seed_bank(db, seed_school, ['Why is <img src=x onerror="alert(1)"> volcano ash & lava hot?'])
+    response = client.get("/teacher/questions/search", params={"q": "volcano"}, headers=auth_headers(teacher.username))
+    assert response.status_code == 200, response.text
+    highlight = response.json()["items"][0]["highlight"]
+    assert highlight == 'Why is &lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>volcano</mark> ash &amp; lava hot?'
+
+
+def test_cursor_pages_through_tied_scores_and_rejects_garbage(db, seed_school, client, auth_headers):
+    # Identical texts tie on score, so paging relies on the (score, id) cursor
+    teacher = seed_bank(db, seed_school, ["Describe a glacier and its valley."] * 7)
+    headers = auth_headers(teacher.username)
+    seen, cursor = [], None
+    while True:
+        params = {"q": "glacier", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/teacher/questions/search", params=params, headers=headers).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == 7 and seen == sorted(set(seen))
+
+    for garbage in ("%%%", "abc", base64.urlsafe_b64encode(b"{}").decode(), base64.urlsafe_b64encode(b'["a", 1]').decode(),
+                    base64.urlsafe_b64encode(b"[NaN, 1]").decode()):
+        response = client.get("/teacher/questions/search", params={"q": "glacier", "cursor": garbage}, headers=headers)
+        assert response.status_code == 400, garbage
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from app import database, models
+from app.services import quiz_assembly
+
+
+def seed_bank(db, seed_school, count):
+    seed = seed_school()
+    assignment = models.Assignment(title="Bank", teacher_id=seed.teacher.id, grade_id=seed.grade.id, subject_id=seed.subject.id)
+    db.add(assignment)
+    db.flush()
+    questions = [
+        models.Question(text=f"Cache question {i}", assignment_id=assignment.id, subject_id=seed.subject.id,
+                        question_type=models.QuestionType.MULTIPLE_CHOICE, difficulty_level="Easy", points=1)
+        for i in range(count)
+    ]
+    db.add_all(questions)
+    db.commit()
+    return seed.teacher, seed.subject.id, [q.id for q in questions]
+
+
+def test_quiz_index_is_invalidated_by_bank_writes(db, seed_school, client, auth_headers):
+    teacher, subject_id, question_ids = seed_bank(db, seed_school, 5)
+    assert quiz_assembly.get_index(db, teacher.id).size == 5
+
+    response = client.delete(f"/teacher/questions/{question_ids[0]}", headers=auth_headers(teacher.username))
+    assert response.status_code == 200
+    assert quiz_assembly.get_index(db, teacher.id).size == 4
+
+    quiz = quiz_assembly.assemble(db, teacher.id, subject_id, 5)
+    assert sorted(quiz.question_ids) == question_ids[1:]
+
+
+def test_quiz_assembly_drops_questions_deleted_by_another_worker(db, seed_school):
+    teacher, subject_id, question_ids = seed_bank(db, seed_school, 5)
+    assert len(quiz_assembly.assemble(db, teacher.id, subject_id, 5).question_ids) == 5
+
+    # A raw delete bypasses this process's invalidation, like a write in another worker
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM questions WHERE id = :id"), {"id": question_ids[0]})
+    quiz = quiz_assembly.assemble(db, teacher.id, subject_id, 5)
+    assert sorted(quiz.question_ids) == question_ids[1:]
+    assert quiz.shortfall == 1
@@ -0,0 +1,82 @@
+import pytest
+from app import models
+from app.services import roster_promotion
+
+
+def seed_roster(db, seed_school, name):
+    seed = seed_school()
+    school = seed.school
+    grades = [seed.grade] + [models.Grade(name=f"Grade {i}", school_id=school.id) for i in (2, 3)]
+    db.add_all(grades)
+    db.flush()
+    classes = {
+        label: models.Class(name=label, section=label[-1], grade_id=grade.id, school_id=school.id)
+        for label, grade in (("1-A", grades[0]), ("1-B", grades[0]), ("2-A", grades[1]))
+    }
+    db.add_all(classes.values())
+    db.flush()
+
+    def student(label, grade, cls=None, active=True):
+        row = models.Student(name=f"{name} {label}", school_id=school.id, grade_id=grade.id,
+                             class_id=cls.id if cls else None, active=active)
+        db.add(row)
+        return row
+
+    students = {
+        "in 1-A": student("in 1-A", grades[0], classes["1-A"]),
+        "also in 1-A": student("also in 1-A", grades[0], classes["1-A"]),
+        "in 1-B": student("in 1-B", grades[0], classes["1-B"]),
+        "in 2-A": student("in 2-A", grades[1], classes["2-A"]),
+        "in grade 3": student("in grade 3", grades[2]),
+        "inactive": student("inactive", grades[0], classes["1-A"], active=False),
+    }
+    db.commit()
+    return school.id, [g.id for g in grades], {k: c.id for k, c in classes.items()}, {k: s.id for k, s in students.items()}
+
+
+def placement(db, student_ids):
+    rows = db.query(models.Student.id, models.Student.grade_id, models.Student.class_id, models.Student.active).filter(
+        models.Student.id.in_(student_ids.values())
+    ).all()
+    by_id = {row.id: (row.grade_id, row.class_id, row.active) for row in rows}
+    return {label: by_id[sid] for label, sid in student_ids.items()}
+
+
+def test_promotion_follows_class_then_grade_mapping(db, seed_school):
+    school_id, (g1, g2, g3), classes, students = seed_roster(db, seed_school, "mapping")
+    # A chain 1 -> 2 -> 3 -> graduated in one statement
+    grade_map = {g1: g2, g2: g3, g3: None}
+    class_map = {classes["1-A"]: classes["2-A"]}
+    before = placement(db, students)
+
+    report = roster_promotion.promote(db, school_id, grade_map, class_map, dry_run=True)
+    assert (report.students, report.promoted, report.graduated) == (5, 4, 1)
+    moves = {(m.from_grade_id, m.from_class_id): (m.to_grade_id, m.to_class_id, m.graduated, m.count) for m in report.moves}
+    assert moves == {
+        (g1, classes["1-A"]): (g2, classes["2-A"], False, 2),
+        (g1, classes["1-B"]): (g2, None, False, 1),
+        (g2, classes["2-A"]): (g3, None, False, 1),
+        (g3, None): (g3, None, True, 1),
+    }
+    assert placement(db, students) == before
+
+    report = roster_promotion.promote(db, school_id, grade_map, class_map)
+    db.commit()
+    assert not report.dry_run
+    assert placement(db, students) == {
+        "in 1-A": (g2, classes["2-A"], True),
+        "also in 1-A": (g2, classes["2-A"], True),
+        "in 1-B": (g2, None, True),
+        "in 2-A": (g3, None, True),
+        "in grade 3": (g3, None, False),
+        "inactive": (g1, classes["1-A"], False),
+    }
+
+
+def test_promotion_rejects_ids_of_another_school(db, seed_school):
+    school_id, (g1, _, _), _, _ = seed_roster(db, seed_school, "own")
+    _, (other_grade, _, _), _, _ = seed_roster(db, seed_school, "other")
+    with pytest.raises(ValueError):
+        roster_promotion.promote(db, school_id, {g1: other_grade}, {})
+    with pytest.raises(ValueError):
+        roster_promotion.promote(db, school_id, {}, {})
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from app import database, models
+from app.services import school_quota
+
+
+def student_count(school_id):
+    db = database.SessionLocal()
+    try:
+        return db.query(models.School.student_count).filter(models.School.id == school_id).scalar()
+    finally:
+        db.close()
+
+
+def test_concurrent_reservations_cannot_overshoot(db, seed_school):
+    school_id = seed_school(max_students=5).school.id
+    db.commit()
+    attempts = 12
+    barrier = threading.Barrier(attempts)
+    results = []
+
+    def reserve_one():
+        db = database.SessionLocal()
+        try:
+            barrier.wait()
+            school_quota.reserve(db, school_id, school_quota.STUDENTS)
+            db.commit()
+            results.append(True)
+        except school_quota.QuotaExceeded:
+            db.rollback()
+            results.append(False)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=reserve_one) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert results.count(False) == attempts - 5
+    assert student_count(school_id) == 5
+
+
+def test_bulk_reservation_over_the_limit_leaves_usage_untouched(db, seed_school):
+    school_id = seed_school(max_students=4).school.id
+    db.commit()
+    school_quota.reserve(db, school_id, school_quota.STUDENTS, count=3)
+    db.commit()
+    with pytest.raises(school_quota.QuotaExceeded):
+        school_quota.reserve(db, school_id, school_quota.STUDENTS, count=2)
+    db.rollback()
+    assert student_count(school_id) == 3
+
+    # A rolled back create gives its slot back
+    school_quota.reserve(db, school_id, school_quota.STUDENTS)
+    db.rollback()
+    assert student_count(school_id) == 3
+
+    school_quota.release(db, school_id, school_quota.STUDENTS, count=5)
+    db.commit()
+    assert student_count(school_id) == 0
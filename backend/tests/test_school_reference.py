@@ -0,0 +1,34 @@
+from sqlalchemy import text
+from app import database, models
+from app.services import school_reference
+
+
+def test_school_reference_follows_writes_and_verifies_stale_hits(db, seed_school):
+    seed = seed_school()
+    school, grade = seed.school, seed.grade
+    cls = models.Class(name="3-A", section="A", grade_id=grade.id, school_id=school.id)
+    db.add(cls)
+    db.commit()
+    assert school_reference.find_class(db, school.id, cls.id)["grade_id"] == grade.id
+
+    # ORM writes drop the snapshot on commit
+    new_grade = models.Grade(name="Grade 4", school_id=school.id)
+    db.add(new_grade)
+    db.commit()
+    assert new_grade.id in school_reference.get_reference(db, school.id).grades
+
+    # A grade created elsewhere is found by the rebuild on a miss
+    with database.engine.begin() as conn:
+        other_id = conn.execute(
+            text("INSERT INTO grades (name, school_id) VALUES ('Grade 5', :school)"), {"school": school.id}
+        ).lastrowid
+    assert school_reference.find_grade(db, school.id, other_id) is not None
+
+    # A grade deleted and a class moved elsewhere still hit the snapshot, until verified
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM grades WHERE id = :id"), {"id": other_id})
+        conn.execute(text("UPDATE classes SET grade_id = :grade WHERE id = :id"), {"grade": new_grade.id, "id": cls.id})
+    assert school_reference.find_grade(db, school.id, other_id) is not None
+    assert school_reference.find_grade(db, school.id, other_id, verify=True) is None
+    assert school_reference.find_grade(db, school.id, other_id) is None
+    assert school_reference.find_class(db, school.id, cls.id, verify=True)["grade_id"] == new_grade.id
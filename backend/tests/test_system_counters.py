@@ -0,0 +1,102 @@
+from app import database, models
+from app.services import system_counters
+
+
+def counters(db):
+    db.expire_all()
+    return {
+        row.school_id: {c: getattr(row, c) for c in system_counters.COUNTERS}
+        for row in db.query(models.SystemCounter).all()
+    }
+
+
+def assert_matches_reconcile(db):
+    maintained = counters(db)
+    system_counters.reconcile(database.engine)
+    assert maintained == counters(db)
+    return maintained
+
+
+def test_orm_writes_keep_counters_equal_to_reconcile(db, seed_school):
+    # Other modules write with Core statements; start from reconciled rows
+    system_counters.reconcile(database.engine)
+    first, second = seed_school(), seed_school()
+    students = [
+        models.Student(name=f"Counter Student {i}", school_id=first.school.id, grade_id=first.grade.id, active=i != 2)
+        for i in range(3)
+    ]
+    assignment = models.Assignment(title="Counted", teacher_id=first.teacher.id, grade_id=first.grade.id, subject_id=first.subject.id)
+    db.add_all(students + [assignment, models.Class(name="1-A", section="A", grade_id=first.grade.id, school_id=first.school.id)])
+    db.commit()
+    totals = assert_matches_reconcile(db)
+    assert totals[first.school.id] == {
+        "schools": 1, "active_students": 2, "active_users": 1, "teachers": 1,
+        "classes": 1, "assignments": 1, "quizzes": 0,
+    }
+
+    # Active <-> inactive
+    students[0].active, students[2].active, first.teacher.active = False, True, False
+    db.commit()
+    totals = assert_matches_reconcile(db)
+    assert (totals[first.school.id]["active_students"], totals[first.school.id]["active_users"]) == (2, 0)
+
+    # Moves between schools, including the teacher (and so their assignment)
+    students[1].school_id = second.school.id
+    first.teacher.school_id, first.teacher.active = second.school.id, True
+    db.commit()
+    totals = assert_matches_reconcile(db)
+    assert totals[first.school.id]["teachers"] == 0
+    assert (totals[second.school.id]["teachers"], totals[second.school.id]["active_students"]) == (2, 1)
+
+    # An assignment becomes a quiz with its first question, and stops being one with its last
+    questions = [models.Question(text=f"Counted question {i}", assignment_id=assignment.id, points=1) for i in range(2)]
+    db.add(questions[0])
+    db.commit()
+    assert assert_matches_reconcile(db)[second.school.id]["quizzes"] == 1
+    db.add(questions[1])
+    db.commit()
+    assert assert_matches_reconcile(db)[second.school.id]["quizzes"] == 1
+    for question in questions:
+        db.delete(question)
+    db.commit()
+    assert assert_matches_reconcile(db)[second.school.id]["quizzes"] == 0
+
+    db.delete(students[2])
+    db.commit()
+    assert assert_matches_reconcile(db)[first.school.id]["active_students"] == 0
+
+
+def test_rolled_back_writes_leave_counters_untouched(db, seed_school):
+    seed = seed_school()
+    db.commit()
+    before = assert_matches_reconcile(db)
+
+    db.add(models.Student(name="Rolled Back Student", school_id=seed.school.id, grade_id=seed.grade.id))
+    seed.teacher.active = False
+    db.flush()
+    db.rollback()
+    # A later commit in the same session must not carry the discarded deltas
+    db.add(models.Class(name="2-B", section="B", grade_id=seed.grade.id, school_id=seed.school.id))
+    db.commit()
+
+    after = assert_matches_reconcile(db)
+    assert after[seed.school.id] == dict(before[seed.school.id], classes=before[seed.school.id]["classes"] + 1)
+
+
+def test_missing_rows_are_reconciled_lazily(db, seed_school):
+    seed = seed_school()
+    db.commit()
+    school_id = seed.school.id
+    with database.engine.begin() as conn:
+        conn.execute(models.SystemCounter.__table__.delete())
+
+    # A write before the system row exists reconciles instead of applying a delta
+    db.add(models.Student(name="Lazy Student", school_id=school_id, grade_id=seed.grade.id))
+    db.commit()
+    totals = assert_matches_reconcile(db)
+    assert totals[school_id]["active_students"] == 1
+
+    with database.engine.begin() as conn:
+        conn.execute(models.SystemCounter.__table__.delete().where(models.SystemCounter.school_id == school_id))
+    assert system_counters.get_totals(db, school_id).active_students == 1
+    assert_matches_reconcile(db)